@@ -1,28 +1,14 @@
-import pyodbc
 import os
 import sys
 import random
-from datetime import datetime
+from evo_db import establish_connection
+import run_context
+import task_files
+import runlog
 
 # === Setup logging ===
-log_dir = r"C:\Python Log"
-os.makedirs(log_dir, exist_ok=True)
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
-
-def log(msg):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{now}] {msg}\n")
-
-def establish_connection():
-    server = 'LOCALHOST\\HAMILTON'
-    db = 'EvoYeast'
-    return pyodbc.connect(
-        f"DRIVER={{ODBC Driver 11 for SQL Server}};"
-        f"SERVER={server};DATABASE={db};UID=Hamilton;PWD=mkdpw:V43;Trust_Connection=no;"
-    )
+log = runlog.logger(script_name)
 
 try:
     log("=== Script started ===")
@@ -31,13 +17,13 @@ try:
     log("Database connection established.")
 
     # === Get latest RunGUID ===
-    cursor.execute("SELECT TOP 1 RunGUID FROM HamiltonVectorDB.dbo.HxRun ORDER BY StartTime DESC")
-    row = cursor.fetchone()
-    if not row:
+    try:
+        ctx = run_context.load(cursor)
+    except run_context.RunContextError:
         log("ERROR: No RunGUID found. Exiting.")
         sys.exit(1)
-    run_id = row[0]
-    log(f"Latest RunGUID: {run_id}")
+    run_id = ctx.run_id
+    log(f"Latest RunGUID: {run_id} (from {ctx.source})")
 
     # === Step 1: Get ancestor PlateID ===
     log("Retrieving ancestor PlateID...")
@@ -99,21 +85,19 @@ try:
         sys.exit(1)
 
     # === Step 7: Write the result file with SP output ===
-    task_dir = r"C:\EvoTaskFiles"
-    os.makedirs(task_dir, exist_ok=True)
-    result_path = os.path.join(task_dir, f"{run_id}_AddPlate.txt")
+    os.makedirs(ctx.task_dir, exist_ok=True)
+    result_path = ctx.task_file("AddPlate.txt")
 
     try:
-        with open(result_path, "w") as f:
-            if sp_result:
-                # Convert each row to comma-separated text
-                for row in sp_result:
-                    f.write(",".join([str(x) if x is not None else "" for x in row]) + "\n")
-                log(f"Result file written with {len(sp_result)} rows: {result_path}")
-            else:
-                # If no result set, still log and write the barcode for traceability
-                f.write(new_bc)
-                log(f"Stored procedure returned no data; only barcode written to {result_path}")
+        if sp_result:
+            # Convert each row to comma-separated text
+            task_files.write_atomic(result_path, "".join(
+                ",".join([str(x) if x is not None else "" for x in row]) + "\n" for row in sp_result))
+            log(f"Result file written with {len(sp_result)} rows: {result_path}")
+        else:
+            # If no result set, still log and write the barcode for traceability
+            task_files.write_atomic(result_path, new_bc)
+            log(f"Stored procedure returned no data; only barcode written to {result_path}")
     except Exception as file_e:
         log(f"ERROR writing result file: {file_e}")
         sys.exit(1)
@@ -1,139 +1,72 @@
-import pyodbc
 import os
 import sys
-import pandas as pd
-import random
+import numpy as np
 import argparse
-import subprocess
-from datetime import datetime
+from evo_db import establish_connection
+import bulk_load
+import plate_array
+import plate_simulation
+import run_context
+import telemetry
+import runlog
 
 # === Logging Setup ===
-log_dir = r"C:\Python Log"
-os.makedirs(log_dir, exist_ok=True)
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
-
-def log(msg):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{now}] {msg}\n")
+log = runlog.logger(script_name)
 
 # === Parse Arguments ===
 parser = argparse.ArgumentParser()
 parser.add_argument("PlateBarcode", type=str, help="Plate Barcode Identifier")
 args = parser.parse_args()
 PlateBarcode = args.PlateBarcode
+telemetry.set_tags(barcode=PlateBarcode)
 
-# === Database Connection ===
-def establish_connection():
-    try:
-        conn_str = (
-            "DRIVER={ODBC Driver 11 for SQL Server};"
-            "SERVER=LOCALHOST\\HAMILTON;"
-            "DATABASE=EvoYeast;"
-            "UID=Hamilton;"
-            "PWD=mkdpw:V43;"
-            "Trust_Connection=no;"
-        )
-        return pyodbc.connect(conn_str)
-    except Exception as e:
-        log(f"ERROR: DB connection failed: {e}")
-        sys.exit(1)
+# Set CHAMPIONS_SIM_SEED to reproduce a simulated run.
+SEED = int(os.environ["CHAMPIONS_SIM_SEED"]) if os.environ.get("CHAMPIONS_SIM_SEED") else None
 
 # === Get Latest RunID ===
-def get_runID():
+def get_runID(cursor):
     try:
-        conn = establish_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT TOP 1 RunGUID FROM HamiltonVectorDB.dbo.HxRun ORDER BY StartTime DESC")
-        row = cursor.fetchone()
-        conn.close()
-        if not row:
-            log("ERROR: No RunGUID found.")
-            sys.exit(1)
-        run_id = row[0]
-        log(f"Retrieved RunGUID: {run_id}")
-        return run_id
+        ctx = run_context.load(cursor)
+        log(f"Retrieved RunGUID: {ctx.run_id} (from {ctx.source})")
+        return ctx
+    except run_context.RunContextError:
+        log("ERROR: No RunGUID found.")
+        sys.exit(1)
     except Exception as e:
         log(f"ERROR retrieving RunGUID: {e}")
         sys.exit(1)
 
 # === Generate Random Fluorescence Data ===
-def generate_two_dfs(plate_id, run_id):
-    rows = ["A", "B", "C", "D", "E", "F", "G", "H"]
-    cols = range(1, 13)
-    well_ids = [f"{r}{c}" for c in cols for r in rows]
-
-    def rand_vol():
-        return round(random.uniform(0, 550), 6)
-
-    df1 = pd.DataFrame({
-        "PlateID": plate_id,
-        "WellID": well_ids,
-        "FlEx482Em510": [rand_vol() for _ in well_ids],
-        "RunID": run_id
-    })
-    df2 = pd.DataFrame({
-        "PlateID": plate_id,
-        "WellID": well_ids,
-        "FlEx587Em611": [rand_vol() for _ in well_ids],
-        "RunID": run_id
-    })
-    log(f"Generated random fluorescence data for {len(well_ids)} wells.")
-    return df1, df2
-
-# === Write DF to BCP-Compatible File ===
-def write_bcp_file(df, file_path):
-    try:
-        df.to_csv(file_path, sep="\t", header=False, index=False)
-        log(f"BCP input file written: {file_path}")
-    except Exception as e:
-        log(f"ERROR writing BCP file {file_path}: {e}")
-        sys.exit(1)
-
-# === Execute BCP Silently ===
-def run_bcp(table_name, file_path):
-    bcp_cmd = [
-        "bcp",
-        f"EvoYeast.dbo.{table_name}",
-        "in", file_path,
-        "-T", "-c",
-        "-S", "HAMILTON-PC\\HAMILTON"
-    ]
+def generate_two_plates(cursor, plate_id, n_wells=None):
+    culture, media = plate_simulation.fetch_pattern(cursor, plate_id, n_wells)
+    n_wells = len(culture)
+    sim = plate_simulation.simulate(1, n_wells, seed=SEED, culture=culture, media=media)
+    plate1 = plate_array.PlateArray(np.round(sim["GFP"][0], 6), n_wells)
+    plate2 = plate_array.PlateArray(np.round(sim["RFP"][0], 6), n_wells)
+    log(f"Generated random fluorescence data for {int(plate1.filled().sum())} wells (seed {SEED}).")
+    return plate1, plate2
+
+# === Bulk Load Fluorescence Data ===
+def upload(conn, table_name, rows, task_dir):
     try:
-        log(f"Executing BCP silently: {' '.join(bcp_cmd)}")
-        result = subprocess.run(
-            bcp_cmd,
-            capture_output=True,
-            text=True,
-            creationflags=subprocess.CREATE_NO_WINDOW  # ✅ Hide CMD window
-        )
-        if result.returncode != 0:
-            log(f"BCP FAILED: {result.stderr}")
-            sys.exit(1)
-        log(f"BCP upload to {table_name} successful. Output: {result.stdout}")
+        loaded, method = bulk_load.load(conn, table_name, rows, task_dir=task_dir)
+        log(f"Upload to {table_name} successful: {loaded} rows ({method}).")
     except Exception as e:
-        log(f"ERROR executing BCP for table {table_name}: {e}")
+        log(f"ERROR uploading to table {table_name}: {e}")
         sys.exit(1)
 
-# === Delete Temporary BCP File ===
-def delete_file(file_path):
-    try:
-        os.remove(file_path)
-        log(f"Deleted temporary file: {file_path}")
-    except Exception as e:
-        log(f"WARNING: Failed to delete {file_path}: {e}")
-
 # === Main Workflow ===
 def main():
     try:
+        conn = establish_connection()
+        cursor = conn.cursor()
+
         # Step 1: Get RunID
-        run_id = get_runID()
+        ctx = get_runID(cursor)
+        run_id = ctx.run_id
 
         # Step 2: Retrieve PlateID
-        conn = establish_connection()
-        cursor = conn.cursor()
         cursor.execute("SELECT PlateID FROM Plates WHERE BarCode = ?", (PlateBarcode,))
         row = cursor.fetchone()
         if not row:
@@ -141,28 +74,14 @@ def main():
             sys.exit(1)
         plate_id = row[0]
         log(f"Retrieved PlateID: {plate_id}")
-        conn.close()
 
         # Step 3: Generate fluorescence data
-        EM510, EM611 = generate_two_dfs(plate_id, run_id)
+        EM510, EM611 = generate_two_plates(cursor, plate_id)
 
-        # Step 4: Define temp file paths
-        task_dir = r"C:\EvoTaskFiles"
-        os.makedirs(task_dir, exist_ok=True)
-        file_510 = os.path.join(task_dir, f"{run_id}_FlEx482Em510.txt")
-        file_611 = os.path.join(task_dir, f"{run_id}_FlEx587Em611.txt")
-
-        # Step 5: Write data to BCP files
-        write_bcp_file(EM510, file_510)
-        write_bcp_file(EM611, file_611)
-
-        # Step 6: Perform BCP upload
-        run_bcp("ImportFlEx482Em510", file_510)
-        run_bcp("ImportFlEx587Em611", file_611)
-
-        # Step 7: Delete temporary files
-        delete_file(file_510)
-        delete_file(file_611)
+        # Step 4: Bulk load straight from memory
+        upload(conn, "ImportFlEx482Em510", EM510.records(plate_id, run_id), ctx.task_dir)
+        upload(conn, "ImportFlEx587Em611", EM611.records(plate_id, run_id), ctx.task_dir)
+        conn.close()
 
         log("=== Fluorescence data upload completed successfully ===")
         sys.exit(0)
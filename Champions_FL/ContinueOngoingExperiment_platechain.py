@@ -1,23 +1,19 @@
-import pyodbc
 import sys
 import argparse
-import csv
 import os
-import subprocess
-from datetime import datetime
-
-# === Setup dynamic log file ===
-log_dir = r"C:\Python Log"
-os.makedirs(log_dir, exist_ok=True)
-
+from evo_db import establish_connection
+import bulk_load
+import experiment_parameters
+import plate_chain
+import propagation_planner
+import run_context
+import task_files
+import telemetry
+import runlog
+
+# === Setup logging ===
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
-
-def log(message):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{now}] {message}\n")
+log = runlog.logger(script_name)
 
 # === Parse arguments ===
 parser = argparse.ArgumentParser()
@@ -29,24 +25,12 @@ args = parser.parse_args()
 PlateChainBarcode = args.PlateChainBarcode
 SpatialEvoPlate = args.SpatialEvoPlateID
 SpillOverPlate = args.SpillOverPlateID
+telemetry.set_tags(barcode=PlateChainBarcode)
 
-# === Constants for Hamilton formatting ===
-LAYOUT_PATH = r"C:\PROGRAM FILES\HAMILTON\METHODS\LABPROTOCOLS\EXPERIMENTS\DECKS\SPATIALEVOLUTION3OD384WELL.LAY"
-
-def establish_connection():
-    server_name = 'LOCALHOST\\HAMILTON'
-    database_name = 'EvoYeast'
-    username = 'Hamilton'
-    password = 'mkdpw:V43'
-    connection_string = (
-        f"DRIVER={{ODBC Driver 11 for SQL Server}};"
-        f"SERVER={server_name};"
-        f"DATABASE={database_name};"
-        f"UID={username};"
-        f"PWD={password};"
-        f"Trust_Connection=no;"
-    )
-    return pyodbc.connect(connection_string)
+# Set CHAMPIONS_REUSE_CULTURES=0 to always re-run Competition_SelectCultures.
+REUSE_CULTURES = os.environ.get("CHAMPIONS_REUSE_CULTURES", "1") != "0"
+# Set CHAMPIONS_PLANNER_PARITY=1 to diff the local planner against the SP result.
+PLANNER_PARITY = os.environ.get("CHAMPIONS_PLANNER_PARITY", "0") == "1"
 
 try:
     log("=== Script started ===")
@@ -55,70 +39,44 @@ try:
     cursor = conn.cursor()
 
     # === Get latest RunGUID ===
-    log("Fetching latest RunGUID...")
-    cursor.execute("SELECT TOP 1 RunGUID FROM HamiltonVectorDB.dbo.HxRun ORDER BY StartTime DESC")
-    run_id = cursor.fetchone()[0]
-    log(f"Latest RunGUID retrieved: {run_id}")
+    log("Loading run context...")
+    ctx = run_context.load(cursor)
+    run_id = ctx.run_id
+    log(f"Latest RunGUID retrieved: {run_id} (from {ctx.source})")
 
     # === Call stored procedure: Competition_SelectCultures ===
-    log("Executing stored procedure: Competition_SelectCultures")
     try:
-        cursor.execute("EXEC dbo.Competition_SelectCultures @Barcode = ?, @RunID = ?", [PlateChainBarcode, run_id])
-        culture_result = cursor.fetchall()
+        culture_result = plate_chain.load_cultures(ctx, PlateChainBarcode) if REUSE_CULTURES else None
+        if culture_result:
+            log("Reusing Competition_SelectCultures rows cached by the ConditionCheck step.")
+        else:
+            log("Executing stored procedure: Competition_SelectCultures")
+            cursor.execute("EXEC dbo.Competition_SelectCultures @Barcode = ?, @RunID = ?", [PlateChainBarcode, run_id])
+            culture_result = cursor.fetchall()
         if not culture_result:
             log("No data returned from Competition_SelectCultures. Exiting with code 1.")
             sys.exit(1)
 
         log(f"Retrieved {len(culture_result)} rows from Competition_SelectCultures.")
-        Output_Temp_ImportSpatialEvoODSubset_Path = f"C:\\EvoTaskFiles\\{run_id}_subset.txt"
-
-        generated_rows = [[row[0], run_id, row[1], 1] for row in culture_result]
-        log("Writing temporary subset file for BCP import...")
-        with open(Output_Temp_ImportSpatialEvoODSubset_Path, "w", newline="") as f:
-            writer = csv.writer(f, delimiter="\t")
-            writer.writerows(generated_rows)
-        log(f"Subset file written: {Output_Temp_ImportSpatialEvoODSubset_Path}")
-
-        # === Run BCP import (hidden window) ===
-        startupinfo = subprocess.STARTUPINFO()
-        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW  # ✅ hide the console window
-
-        bcp_command = [
-            "bcp",
-            "EvoYeast.dbo.ImportSpatialEvoODSubset",
-            "in", Output_Temp_ImportSpatialEvoODSubset_Path,
-            "-T", "-c",
-            "-S", "HAMILTON-PC\\HAMILTON"
-        ]
-
-        log("Starting BCP import (hidden window)...")
-        result = subprocess.run(bcp_command, capture_output=True, text=True, startupinfo=startupinfo)
-        if result.returncode != 0:
-            log(f"BCP failed with error: {result.stderr}")
-            sys.exit(1)
-        log("BCP import completed successfully.")
+        generated_rows = [(row[0], run_id, row[1], 1) for row in culture_result]
+        log("Bulk loading subset into ImportSpatialEvoODSubset...")
+        loaded, method = bulk_load.load(conn, "ImportSpatialEvoODSubset", generated_rows, task_dir=ctx.task_dir)
+        log(f"Loaded {loaded} rows into ImportSpatialEvoODSubset ({method}).")
 
     except Exception as e:
-        log(f"ERROR during Competition_SelectCultures or BCP phase: {e}")
+        log(f"ERROR during Competition_SelectCultures or bulk load phase: {e}")
         sys.exit(1)
 
     # === Extract experiment parameters ===
     log("Loading experiment parameters...")
     parameters = ["TargetWellVolume", "InoculationOD", "TopFractionToPropagate", "V_OD_Sample"]
-    experiment_params = {}
-
+    try:
+        experiment_params = experiment_parameters.load(cursor, ctx, required=parameters)
+    except Exception as e:
+        log(f"ERROR retrieving parameters: {e}")
+        sys.exit(1)
     for param in parameters:
-        try:
-            cursor.execute("SELECT dbo.ReadExperimentParameter(NULL, ?)", (param,))
-            res = cursor.fetchone()
-            if not res or res[0] is None:
-                log(f"ERROR: Parameter {param} missing.")
-                sys.exit(1)
-            experiment_params[param] = res[0]
-            log(f"Parameter loaded: {param} = {res[0]}")
-        except Exception as e:
-            log(f"ERROR retrieving parameter {param}: {e}")
-            sys.exit(1)
+        log(f"Parameter loaded: {param} = {experiment_params[param]}")
 
     # === Call Champions_CommencePropagationFl ===
     log("Executing Champions_CommencePropagationFl stored procedure...")
@@ -140,6 +98,28 @@ try:
 
     log(f"Retrieved {len(selection_result)} propagation records. Generating output files...")
 
+    # === Optional parity check of the local propagation planner ===
+    if PLANNER_PARITY:
+        try:
+            plate_id = culture_result[0][0]
+            ods = propagation_planner.fetch_plate_ods(cursor, plate_id, run_id)
+            scores = propagation_planner.fetch_plate_scores(cursor, plate_id, run_id, ods.geometry)
+            valid = ods.geometry.mask(str(row[1]).strip() for row in culture_result)
+            if scores is None:
+                log(f"Planner parity: no fluorescence reading of plate {plate_id} in this run; skipped.")
+            else:
+                plan = propagation_planner.plan_plates(ods.values, experiment_params, scores,
+                                                       valid=valid, wells=ods.geometry.names)
+                diffs = propagation_planner.compare(plan, selection_result)
+                if diffs:
+                    log(f"Planner parity: {len(diffs)} difference(s) from Champions_CommencePropagationFl:")
+                    for diff in diffs:
+                        log(f"  {diff}")
+                else:
+                    log("Planner parity: local plan matches Champions_CommencePropagationFl.")
+        except Exception as e:
+            log(f"WARNING: planner parity check failed: {e}")
+
     # === Prepare data ===
     cytomat_pos = [str(row[0]) for row in selection_result if row[0] is not None]
     spill_positions = [row[2] for row in selection_result]
@@ -147,38 +127,15 @@ try:
     culture_vol = [str(row[4]) for row in selection_result]
     media_vol = [str(row[5]) for row in selection_result]
 
-    # Define file paths
-    CytoPos_path = f"C:\\EvoTaskFiles\\{run_id}_CytomatPos.txt"
-    CultureVol_path = f"C:\\EvoTaskFiles\\{run_id}_CultureVol.txt"
-    MediaVol_path = f"C:\\EvoTaskFiles\\{run_id}_MediaVol.txt"
-    SpillOverPlateSeq_path = f"C:\\EvoTaskFiles\\{run_id}_SpillOverPlate_Positions.txt"
-    SpatialOverPlateSeq_path = f"C:\\EvoTaskFiles\\{run_id}_SpatialOverPlate_Positions.txt"
-
-    # Write CytomatPos
-    log("Writing CytomatPos.txt...")
-    with open(CytoPos_path, "w") as f:
-        f.write("\n".join(cytomat_pos))
-
-    # Helper for Hamilton-format files
-    def write_hamilton_format(filename, positions, labware, sequence):
-        with open(filename, "w", newline="") as f:
-            f.write('Id,Layout,Sequence,Labware,Position\n')
-            for i, pos in enumerate(positions, 1):
-                f.write(f'{i},{LAYOUT_PATH},{sequence},{labware},{pos}\n')
-        log(f"File generated: {filename}")
-
-    # Write Hamilton-formatted files
-    write_hamilton_format(SpillOverPlateSeq_path, spill_positions, SpillOverPlate, "seqSpillOverPlate")
-    write_hamilton_format(SpatialOverPlateSeq_path, well_positions, SpatialEvoPlate, "seqEvoSrcPlate")
-
-    # Write volumes
-    log("Writing CultureVol.txt...")
-    with open(CultureVol_path, "w") as f:
-        f.write("\n".join(culture_vol))
-
-    log("Writing MediaVol.txt...")
-    with open(MediaVol_path, "w") as f:
-        f.write("\n".join(media_vol))
+    # Buffer all outputs and write them together
+    out = task_files.TaskFileWriter(ctx, step="platechain")
+    out.add_lines("CytomatPos.txt", cytomat_pos)
+    out.add_sequence("SpillOverPlate_Positions.txt", spill_positions, SpillOverPlate, "seqSpillOverPlate")
+    out.add_sequence("SpatialOverPlate_Positions.txt", well_positions, SpatialEvoPlate, "seqEvoSrcPlate")
+    out.add_lines("CultureVol.txt", culture_vol)
+    out.add_lines("MediaVol.txt", media_vol)
+    for path in out.commit().values():
+        log(f"File generated: {path}")
 
     # Close connection
     conn.close()
@@ -1,23 +1,28 @@
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog
-from datetime import datetime
-import pyodbc
 import os
-import pandas as pd
 import argparse
 import sys
+from evo_db import establish_connection
+import experiment_parameters
+import new_experiment
+import run_context
+import task_files
+import plate_pattern
+import runlog
+
+# tkinter is imported once the arguments are valid, numpy (plate_array) when
+# a workbook is validated, so a bad call fails and the GUI appears fast.
+tk = ttk = messagebox = filedialog = None
+
+def load_tk():
+    global tk, ttk, messagebox, filedialog
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog
 
 # === Setup logging ===
-log_dir = r"C:\Python Log"
-os.makedirs(log_dir, exist_ok=True)
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
+log = runlog.logger(script_name)
 
-def log(message):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{now}] {message}\n")
+OUTPUT_HEADER = ("plateid", "wellID", "runid", "WellAssign")
 
 # === Parse CLI Arguments ===
 def parse_args():
@@ -36,22 +41,7 @@ class InputForm:
 
         self.excel_path = tk.StringVar()
 
-        self.parameter_defaults = {
-            'BackgroundOD': 0.036,
-            'InoculationOD': 0.03,
-            'MaxIteration': 20,
-            'ODConversionFactor': 2.52,
-            'FreezeVolume': 0.5,
-            'TargetWellVolume': 700,
-            'V_OD_Sample': 150,
-            'TopFractionToPropagate': 1,
-            'FreezeGeneration': 1,
-            'UseFluorescence': 1,
-            'GFP_scale': 4669.1,
-            'GFP_RFPdamping': 773.1,
-            'RFP_scale': 2262.3,
-            'RFP_GFPdamping': 305.0
-        }
+        self.parameter_defaults = dict(experiment_parameters.DEFAULTS)
 
         self.frame = ttk.Frame(root, padding="10")
         self.frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -85,7 +75,8 @@ class InputForm:
             col = i % 2 * 2
             ttk.Label(param_frame, text=f"{param}:").grid(row=row, column=col, sticky=tk.W, padx=5)
             if param == 'TopFractionToPropagate':
-                entry = ttk.Combobox(param_frame, values=["0.25", "0.5", "0.75", "1"], state="readonly", width=18)
+                entry = ttk.Combobox(param_frame, values=[str(f) for f in experiment_parameters.TOP_FRACTIONS],
+                                     state="readonly", width=18)
                 entry.set(str(default))
             else:
                 entry = ttk.Entry(param_frame, width=20)
@@ -105,135 +96,77 @@ class InputForm:
             self.excel_path.set(filename)
             log(f"Excel file selected: {filename}")
 
-    def establish_connection(self):
-        log("Establishing database connection...")
-        conn = pyodbc.connect(
-            "DRIVER={ODBC Driver 11 for SQL Server};"
-            "SERVER=LOCALHOST\\HAMILTON;"
-            "DATABASE=EvoYeast;"
-            "UID=Hamilton;"
-            "PWD=mkdpw:V43;"
-            "Trust_Connection=no;"
-        )
-        log("Database connection established.")
-        return conn
-
-    def get_runID(self):
-        conn = self.establish_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT TOP 1 RunGUID FROM HamiltonVectorDB.dbo.HxRun ORDER BY StartTime DESC")
-        run_id = cursor.fetchone()[0]
-        log(f"Retrieved RunGUID: {run_id}")
-        conn.commit()
-        conn.close()
-        return run_id
-
-    def process_excel_to_well_assignment(self, excel_file, runid, plateid):
-        df = pd.read_excel(excel_file, header=1).dropna(subset=["Destination", "Source"])
-        if not {"Destination", "Source", "Vol"}.issubset(df.columns):
-            raise ValueError("Excel file missing required columns")
-
-        df["Destination"] = df["Destination"].astype(str).str.strip()
-        df["Source"] = df["Source"].astype(str).str.strip()
-
-        log(f"Processing {len(df)} rows from Excel.")
-        return pd.DataFrame({
-            "plateid": plateid,
-            "wellID": df["Destination"],
-            "runid": runid,
-            "WellAssign": df["Source"].apply(lambda x: "MediaCtrl" if x == "T" else "Cells")
-        })
+    def get_run_context(self, cursor):
+        ctx = run_context.load(cursor)
+        log(f"Retrieved RunGUID: {ctx.run_id} (from {ctx.source})")
+        return ctx
 
     def validate_and_submit(self):
         try:
-            user_id = self.user_id.get().strip()
-            if not user_id:
-                raise ValueError("UserDefinedID is required")
-            note = self.note.get().strip()
-            schedule = self.schedule.get().strip() or "0"
-
             excel_file = self.excel_path.get()
             if not os.path.exists(excel_file):
                 raise FileNotFoundError("Excel file not selected or does not exist")
 
-            parameters = {}
-            for param, entry in self.param_entries.items():
-                value = float(entry.get().strip())
-                parameters[param] = value
-
-            conn = self.establish_connection()
+            # Validate the well assignment before anything is written to the database
+            pattern = plate_pattern.load(excel_file)
+            log(f"Well assignment {pattern.source_file}: {len(pattern)} wells, "
+                f"{pattern.n_wells}-well plate (sha256 {pattern.digest[:12]})")
+
+            parameters = {param: entry.get().strip() for param, entry in self.param_entries.items()}
+            spec = new_experiment.NewExperiment(self.user_id.get(), self.barcode1, self.barcode2, pattern,
+                                                parameters, note=self.note.get(),
+                                                schedule=self.schedule.get())
+            problems = spec.problems()
+            if problems:
+                raise ValueError("; ".join(problems))
+
+            log("Establishing database connection...")
+            conn = establish_connection()
             cursor = conn.cursor()
+            log("Database connection established.")
 
-            cursor.execute("INSERT INTO Experiments (UserDefinedID, Note, ScheduledToRun) VALUES (?, ?, ?)",
-                           (user_id, note, schedule))
-            log(f"Inserted Experiment: {user_id}, Schedule={schedule}")
-
-            cursor.execute("SELECT ExperimentID FROM Experiments WHERE UserDefinedID = ?", (user_id,))
-            experiment_id = cursor.fetchone()[0]
+            ctx = self.get_run_context(cursor)
+            run_id = ctx.run_id
 
-            for param_name, param_value in parameters.items():
-                cursor.execute("INSERT INTO ExperimentParameters (ExperimentID, ParameterName, ParamValueTxt) VALUES (?, ?, ?)",
-                               (experiment_id, param_name, param_value))
-
-            cursor.execute("EXEC SpatialEvo_NewExperiment @UserExpID = ?, @NewPlateBC = ?, @ExpandPlateBC = ?",
-                           user_id, self.barcode1, self.barcode2)
-            result = cursor.fetchone()
-            if result and "DATABASE ERROR" in str(result[0]):
-                log(f"Stored proc error: {result[0]}")
+            # Experiment, parameters, plates and pattern in one transaction
+            try:
+                result = new_experiment.create(conn, spec, run_id)
+            except new_experiment.ExperimentError as e:
+                log(f"Stored proc error: {e}")
                 sys.exit(1)
-
-            plate_id, cytomat_pos = result
+            plate_id = result["PlateID"]
+            cytomat_pos = result["CytomatPos"]
+            expansion_plate_cytomatPos = result["ExpansionCytomatPos"]
+            log(f"Inserted Experiment: {spec.user_id} (ExperimentID {result['ExperimentID']}), "
+                f"Schedule={spec.schedule}, {len(spec.parameters)} parameters")
             log(f"PlateID: {plate_id}, Cytomat Position: {cytomat_pos}")
-
-            # Fixed SQL query - barcode2 should use self.barcode2
-            cursor.execute("SELECT dbo.QueryCytomatPosition(?)", (self.barcode2,))
-            expansion_plate_cytomatPos_result = cursor.fetchone()
-            # Handle potential None result and extract just the position value
-            if expansion_plate_cytomatPos_result:
-                # The result is (2,) so we need the first element
-                expansion_plate_cytomatPos = expansion_plate_cytomatPos_result[0]
+            if expansion_plate_cytomatPos is not None:
                 log(f"Expansion plate cytomat position: {expansion_plate_cytomatPos}")
             else:
                 log("Warning: No expansion plate cytomat position found")
-                expansion_plate_cytomatPos = None
-
-            run_id = self.get_runID()
+            log(f"Inserted {result['PatternRows']} rows into ImportPlatePattern")
 
             # Write values to files
             try:
-                # Write PlateID to file
-                plate_id_path = f"C:\\EvoTaskFiles\\{run_id}_PlateID.txt"
-                with open(plate_id_path, 'w') as f:
-                    f.write(str(plate_id))
-                log(f"Written PlateID to {plate_id_path}")
-
-                # Write cytomat_pos to file
-                cytomat_pos_path = f"C:\\EvoTaskFiles\\{run_id}_CytomatPos.txt"
-                with open(cytomat_pos_path, 'w') as f:
-                    f.write(str(cytomat_pos))
-                log(f"Written Cytomat Position to {cytomat_pos_path}")
-
-                # Write expansion_plate_cytomatPos to file
+                out = task_files.TaskFileWriter(ctx, step="NewExperiment")
+                out.add("PlateID.txt", str(plate_id))
+                out.add("CytomatPos.txt", str(cytomat_pos))
                 if expansion_plate_cytomatPos is not None:
-                    expansion_cytomat_path = f"C:\\EvoTaskFiles\\{run_id}_ExpansionCytomatPos.txt"
-                    with open(expansion_cytomat_path, 'w') as f:
-                        f.write(str(expansion_plate_cytomatPos))
-                    log(f"Written Expansion Cytomat Position to {expansion_cytomat_path}")
+                    out.add("ExpansionCytomatPos.txt", str(expansion_plate_cytomatPos))
                 else:
                     log("Skipping expansion cytomat position file write - value is None")
+                out.add("FluidPattern.csv", pattern.fluid_pattern_csv())
+                for path in out.commit().values():
+                    log(f"Written {path}")
 
             except IOError as e:
                 log(f"Error writing to EvoTaskFiles: {e}")
                 sys.exit(1)
 
-            processed_df = self.process_excel_to_well_assignment(excel_file, run_id, plate_id)
-            data = list(processed_df.itertuples(index=False, name=None))
-            cursor.executemany(
-                "INSERT INTO ImportPlatePattern (PlateID, WellID, RunID, WellAssign) VALUES (?, ?, ?, ?)", data)
-            log(f"Inserted {len(data)} rows into ImportPlatePattern")
-
-            processed_df.to_csv("output.txt", sep="\t", index=False)
-            log(f"Wrote output.txt with {len(processed_df)} rows.")
+            data = pattern.well_assignments(plate_id, run_id)
+            task_files.write_atomic("output.txt", "".join(
+                "\t".join(map(str, row)) + "\n" for row in [OUTPUT_HEADER] + data))
+            log(f"Wrote output.txt with {len(data)} rows.")
 
             conn.commit()
             conn.close()
@@ -254,9 +187,18 @@ if __name__ == "__main__":
         barcode1 = args.barcode1
         barcode2 = args.barcode2
 
+        load_tk()
         root = tk.Tk()
-        app = InputForm(root, barcode1, barcode2)
-        root.mainloop()
+        try:
+            app = InputForm(root, barcode1, barcode2)
+            root.mainloop()
+        finally:
+            # sys.exit() in a callback leaves mainloop with the window still up;
+            # under champions_service the process (and the window) would live on.
+            try:
+                root.destroy()
+            except tk.TclError:
+                pass  # already destroyed after a successful submit
 
     except Exception as e:
         log(f"Unhandled exception: {e}")
@@ -1,34 +1,11 @@
-import pyodbc
 import os
 import sys
-from datetime import datetime
+from evo_db import ProgrammingError, establish_connection
+import runlog
 
-# === Set up log file ===
-log_dir = r"C:\Python Log"
-os.makedirs(log_dir, exist_ok=True)
+# === Setup logging ===
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
-
-def log(message):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(log_file, "a") as f:
-        f.write(f"[{now}] {message}\n")
-
-def establish_connection():
-    server_name = 'LOCALHOST\\HAMILTON'
-    database_name = 'EvoYeast'
-    username = 'Hamilton'
-    password = 'mkdpw:V43'
-    connection_string = (
-        f"DRIVER={{ODBC Driver 11 for SQL Server}};"
-        f"SERVER={server_name};"
-        f"DATABASE={database_name};"
-        f"UID={username};"
-        f"PWD={password};"
-        f"Trust_Connection=no;"
-    )
-    return pyodbc.connect(connection_string)
+log = runlog.logger(script_name)
 
 def main():
     try:
@@ -46,7 +23,7 @@ def main():
         cursor.execute("EXEC SpatialEvo_CommenceExperimentFl @PlateID = ?", plateID)
         try:
             result = cursor.fetchone()
-        except pyodbc.ProgrammingError:
+        except ProgrammingError:
             result = None
             log("No result returned from stored procedure.")
 
@@ -0,0 +1,210 @@
+"""Headless creation of many experiments from a CSV or JSON manifest.
+
+    StartNewExperiment_Batch.py manifest.csv [--dry-run] [--skip-existing]
+                                [--keep-going] [--run-id GUID] [--out results.csv]
+
+CSV: one experiment per row. JSON: a list of experiments, or
+``{"parameters": {...}, "experiments": [...]}`` where ``parameters`` are
+defaults for the whole batch. Fields:
+
+- ``UserDefinedID``, ``NewPlateBarcode``, ``ExpansionPlateBarcode``, ``Workbook``
+  (relative to the manifest) are required,
+- ``Note`` and ``ScheduleToRun`` (0/1) are optional,
+- any other column (or a JSON ``parameters`` object) sets ExperimentParameters;
+  names that are not in ``experiment_parameters.DEFAULTS`` are rejected and
+  missing ones take the form's defaults.
+
+All experiments and workbooks are validated, and UserDefinedIDs and barcodes
+checked against EvoYeast, before the first write. Each experiment is then
+created in its own transaction (see ``new_experiment.create``).
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+
+from evo_db import establish_connection
+import new_experiment
+import plate_pattern
+import run_context
+import runlog
+import task_files
+
+# === Setup logging ===
+script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+log = runlog.logger(script_name)
+
+FIELDS = ("UserDefinedID", "NewPlateBarcode", "ExpansionPlateBarcode", "Workbook", "Note", "ScheduleToRun")
+REQUIRED = FIELDS[:4]
+RESULT_COLUMNS = ("UserDefinedID", "Status", "ExperimentID", "PlateID", "CytomatPos",
+                  "ExpansionCytomatPos", "PatternRows", "Message")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create experiments from a manifest without the GUI.")
+    parser.add_argument("manifest", help="CSV or JSON manifest")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="skip experiments whose UserDefinedID already exists")
+    parser.add_argument("--keep-going", action="store_true",
+                        help="continue with the next experiment when one fails")
+    parser.add_argument("--run-id", help="RunGUID for ImportPlatePattern (default: latest HxRun)")
+    parser.add_argument("--out", help="write one result row per experiment to this CSV")
+    return parser.parse_args()
+
+
+# === Manifest ===
+def read_manifest(path):
+    """Experiments of the manifest as ``{field: value, "parameters": {...}}`` dicts."""
+    if path.lower().endswith(".json"):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        defaults = {}
+        if isinstance(data, dict):
+            defaults = data.get("parameters", {})
+            data = data.get("experiments", [])
+        entries = []
+        for item in data:
+            item = dict(item)
+            parameters = dict(defaults, **item.pop("parameters", {}))
+            parameters.update({k: item.pop(k) for k in list(item) if k not in FIELDS})
+            entries.append(dict(item, parameters=parameters))
+        return entries
+
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        entries = []
+        for row in csv.DictReader(f):
+            row = {k.strip(): (v or "").strip() for k, v in row.items() if k}
+            parameters = {k: v for k, v in row.items() if k not in FIELDS and v != ""}
+            entries.append(dict({k: row.get(k, "") for k in FIELDS}, parameters=parameters))
+        return entries
+
+
+def build(entries, base_dir):
+    """``(specs, problems)``: one NewExperiment per entry and every problem found."""
+    specs, problems, patterns = [], [], {}
+    for n, entry in enumerate(entries, start=1):
+        label = f"#{n} {entry.get('UserDefinedID') or '(no UserDefinedID)'}"
+        missing = [k for k in REQUIRED if not str(entry.get(k) or "").strip()]
+        if missing:
+            problems.append(f"{label}: missing {', '.join(missing)}")
+            continue
+        workbook = os.path.join(base_dir, str(entry["Workbook"]).strip())
+        if workbook not in patterns:
+            try:
+                patterns[workbook] = plate_pattern.load(workbook)
+            except (OSError, plate_pattern.PatternError) as e:
+                patterns[workbook] = None
+                problems.append(f"{label}: workbook {entry['Workbook']}: {e}")
+        spec = new_experiment.NewExperiment(
+            entry["UserDefinedID"], entry["NewPlateBarcode"], entry["ExpansionPlateBarcode"],
+            patterns[workbook], entry.get("parameters"), note=entry.get("Note"),
+            schedule=entry.get("ScheduleToRun"))
+        problems += [f"{label}: {p}" for p in spec.problems() if p != "no well-assignment workbook"]
+        specs.append(spec)
+
+    def repeated(values):
+        seen = set()
+        return sorted({v for v in values if v in seen or seen.add(v)})
+
+    for user_id in repeated(s.user_id for s in specs):
+        problems.append(f"UserDefinedID {user_id} appears more than once")
+    for barcode in repeated(b for s in specs for b in (s.barcode1, s.barcode2)):
+        problems.append(f"barcode {barcode} appears more than once")
+    scheduled = [s.user_id for s in specs if s.schedule == "1"]
+    if len(scheduled) > 1:
+        problems.append(f"only one experiment can be scheduled to run, got {', '.join(scheduled)}")
+    return specs, problems
+
+
+def check_database(cursor, specs, skip_existing):
+    """Drop or reject experiments that already exist; reject barcodes in use."""
+    problems = []
+    present = new_experiment.existing_experiments(cursor, [s.user_id for s in specs])
+    if present and not skip_existing:
+        problems.append(f"UserDefinedID already in Experiments: {', '.join(sorted(present))}")
+    todo = [s for s in specs if s.user_id not in present]
+    in_use = new_experiment.existing_barcodes(cursor, [b for s in todo for b in (s.barcode1, s.barcode2)])
+    if in_use:
+        problems.append(f"barcode already in Plates: {', '.join(sorted(in_use))}")
+    return todo, sorted(present), problems
+
+
+def write_results(path, results):
+    lines = ["\t".join(RESULT_COLUMNS)]
+    lines += ["\t".join("" if r.get(c) is None else str(r.get(c)) for c in RESULT_COLUMNS) for r in results]
+    task_files.write_atomic(path, "\n".join(lines) + "\n")
+
+
+def main():
+    args = parse_args()
+    log(f"=== Batch from {args.manifest} ===")
+    try:
+        entries = read_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        log(f"ERROR: cannot read manifest: {e}")
+        print(f"ERROR: cannot read manifest: {e}")
+        sys.exit(1)
+
+    specs, problems = build(entries, os.path.dirname(os.path.abspath(args.manifest)))
+    if not specs and not problems:
+        problems.append("manifest has no experiments")
+
+    conn = establish_connection()
+    cursor = conn.cursor()
+    skipped = []
+    if not problems:
+        specs, skipped, problems = check_database(cursor, specs, args.skip_existing)
+    if problems:
+        for p in problems:
+            log(f"INVALID: {p}")
+            print(f"INVALID: {p}")
+        conn.close()
+        sys.exit(1)
+
+    log(f"Validated {len(specs)} experiment(s); skipping {len(skipped)} existing.")
+    if args.dry_run:
+        for s in specs:
+            print(f"OK {s.user_id}: {s.barcode1}/{s.barcode2}, {len(s.pattern)} wells, schedule {s.schedule}")
+        conn.close()
+        sys.exit(0)
+
+    run_id = args.run_id or run_context.load(cursor).run_id
+    results = [{"UserDefinedID": u, "Status": "skipped", "Message": "already exists"} for u in skipped]
+    failed = False
+    for spec in specs:
+        if failed and not args.keep_going:
+            results.append({"UserDefinedID": spec.user_id, "Status": "not run"})
+            continue
+        try:
+            result = new_experiment.create(conn, spec, run_id)
+            conn.commit()
+        except Exception as e:
+            conn.rollback()
+            failed = True
+            log(f"ERROR: {spec.user_id}: {e}")
+            results.append({"UserDefinedID": spec.user_id, "Status": "failed", "Message": str(e)})
+            continue
+        log(f"Created {spec.user_id}: ExperimentID {result['ExperimentID']}, PlateID {result['PlateID']}, "
+            f"CytomatPos {result['CytomatPos']}, {result['PatternRows']} pattern rows")
+        results.append(dict(result, UserDefinedID=spec.user_id, Status="created"))
+    conn.close()
+
+    for r in results:
+        print(f"{r['Status']:8} {r['UserDefinedID']} {r.get('PlateID') or r.get('Message') or ''}")
+    if args.out:
+        write_results(args.out, results)
+        log(f"Wrote results to {args.out}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except SystemExit:
+        raise
+    except Exception as e:
+        log(f"Unhandled exception: {e}")
+        print(f"ERROR: {e}")
+        sys.exit(1)
@@ -0,0 +1,500 @@
+"""Per-stage benchmark of the Champions_FL scripts.
+
+Runs the VENUS sequence of scripts as separate processes, the way VENUS
+starts them, against synthetic plate chains of increasing size and records
+where each step spends its time::
+
+    python benchmark.py --plates 1 10 50 100 200 --wells 96 384 --repeat 3 --out bench.jsonl
+
+Each script runs under a small harness that times these phases:
+
+=============  ==============================================================
+startup        process launch until the harness runs (interpreter / exe load)
+imports        module imports
+connect        opening database connections (ODBC login)
+hxrun          queries against HamiltonVectorDB.dbo.HxRun
+procedure      ``EXEC`` of stored procedures, including fetching their rows
+query          all other SQL
+bulk_insert    ``executemany`` bulk loads
+bcp            the bcp subprocess
+file_write     EvoTaskFiles writes
+other          the rest of the wall time (Python work, logging)
+=============  ==============================================================
+
+One JSON object per script run is written to ``--out`` (JSON lines); a
+median summary goes to stderr. ``--baseline old.jsonl`` compares the medians
+against an earlier run and exits with 1 when a step got slower than
+``--threshold``.
+
+The default ``offline`` backend seeds a fresh ``evoyeast_offline`` database
+per scenario. With ``--backend pyodbc`` the same seeding runs against a test
+EvoYeast instance given with ``--connection-string`` (or
+``EVOYEAST_CONNECTION_STRING``); the production default is refused. The run
+id is handed over through ``CHAMPIONS_RUN_ID``, the test database must have
+no other active experiment, and the seeded rows are deleted again after each
+scenario. ``--exe-dir`` runs the frozen executables
+instead; only wall time is recorded then.
+"""
+import time
+
+_LAUNCHED_NS = time.time_ns()
+
+import argparse
+import builtins
+import json
+import os
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+PHASES = ("startup", "imports", "connect", "hxrun", "procedure", "query",
+          "bulk_insert", "bcp", "file_write", "other")
+
+PARAMETERS = {
+    "TargetWellVolume": 700,
+    "InoculationOD": 0.05,
+    "TopFractionToPropagate": 0.5,
+    "V_OD_Sample": 20,
+    "BackgroundOD": 0.04,
+    "ODConversionFactor": 1.0,
+    "MaxIteration": 10,
+}
+
+
+# === Child side: one script under the phase timers ===
+class PhaseTimer:
+    """Accumulates nanoseconds per phase; nested spans count for the outermost only."""
+
+    def __init__(self):
+        self.ns = dict.fromkeys(PHASES, 0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        self._active = False
+
+    @contextmanager
+    def span(self, phase):
+        if self._active:
+            yield
+            return
+        self._active = True
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.ns[phase] += time.perf_counter_ns() - start
+            self.counts[phase] += 1
+            self._active = False
+
+
+class TimedCursor:
+    """Cursor proxy that books execute/fetch time on the statement's phase."""
+
+    def __init__(self, cursor, timer, kind):
+        self._cursor = cursor
+        self._timer = timer
+        self._kind = kind
+        self._phase = "query"
+
+    def execute(self, sql, *params):
+        self._phase = self._kind(sql)
+        with self._timer.span(self._phase):
+            self._cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql, rows):
+        with self._timer.span("bulk_insert"):
+            return self._cursor.executemany(sql, rows)
+
+    def _timed(self, name, *args):
+        with self._timer.span(self._phase):
+            return getattr(self._cursor, name)(*args)
+
+    def fetchone(self):
+        return self._timed("fetchone")
+
+    def fetchall(self):
+        return self._timed("fetchall")
+
+    def nextset(self):
+        return self._timed("nextset")
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+
+def _wrap(timer, phase, func):
+    def wrapper(*args, **kwargs):
+        with timer.span(phase):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _timed_execute(timer, kind, raw_execute, conn, sql, params):
+    with timer.span(kind(sql)):
+        return raw_execute(conn, sql, params)
+
+
+def instrument(timer):
+    """Patch imports, the connection pool, bcp and task-file writes with timers."""
+    original_import = builtins.__import__
+    builtins.__import__ = _wrap(timer, "imports", original_import)
+
+    import bulk_load
+    import evo_db
+    import task_files
+
+    kind = evo_db.statement_kind
+    evo_db.ConnectionPool._connect = _wrap(timer, "connect", evo_db.ConnectionPool._connect)
+    raw_cursor = evo_db.PooledConnection.cursor
+    raw_execute = evo_db.PooledConnection.execute
+    evo_db.PooledConnection.cursor = lambda self: TimedCursor(raw_cursor(self), timer, kind)
+    evo_db.PooledConnection.execute = lambda self, sql, params=(): _timed_execute(
+        timer, kind, raw_execute, self, sql, params)
+    bulk_load.run_bcp = _wrap(timer, "bcp", bulk_load.run_bcp)
+    task_files.write_atomic = _wrap(timer, "file_write", task_files.write_atomic)
+
+
+def run_child(script, args, out_path):
+    start_ns = time.perf_counter_ns()
+    timer = PhaseTimer()
+    launched = int(os.environ.get("CHAMPIONS_BENCH_T0", _LAUNCHED_NS))
+    timer.ns["startup"] = max(time.time_ns() - launched, 0)
+    sys.path.insert(0, HERE)
+    instrument(timer)
+
+    exit_code = 0
+    path = os.path.join(HERE, script + ".py")
+    sys.argv = [path] + list(args)
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except SystemExit as e:
+        exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception as e:
+        print(f"{script} raised {e!r}", file=sys.stderr)
+        exit_code = 1
+
+    measured = sum(v for k, v in timer.ns.items() if k != "startup")
+    timer.ns["other"] = max(time.perf_counter_ns() - start_ns - measured, 0)
+    with open(out_path, "w") as f:
+        json.dump({"exit_code": exit_code, "phases_ns": timer.ns, "counts": timer.counts}, f)
+    sys.exit(exit_code)
+
+
+# === Scenario seeding ===
+def scenario_tag(plates, wells, seed):
+    return f"BENCH{seed:04d}{plates:03d}{wells:04d}"
+
+
+def seed_scenario(conn, plates, wells, seed, offline=True, run_id=None):
+    """Create an active experiment with a chain of ``plates`` plates and OD data.
+
+    Offline the run is added to HxRun; otherwise ``run_id`` (a new RunGUID
+    when None) is used, as VENUS would pass it in ``CHAMPIONS_RUN_ID``.
+
+    Returns:
+        Tuple ``(run_id, barcodes)`` with the chain's barcodes in order
+    """
+    import bulk_load
+    import evoyeast_offline
+    import experiment_parameters
+    import plate_array
+    import plate_simulation
+
+    cursor = conn.cursor()
+    tag = scenario_tag(plates, wells, seed)
+    run_id = evoyeast_offline.start_run(conn) if offline else (run_id or str(uuid.uuid4()))
+    if not offline:
+        cursor.execute("SELECT UserDefinedID FROM Experiments WHERE ScheduledToRun = 1 AND UserDefinedID <> ?",
+                       (tag,))
+        active = [row[0] for row in cursor.fetchall()]
+        if active:
+            raise RuntimeError(f"Test database already has an active experiment: {', '.join(active)}")
+        # Rows left by an interrupted run would collide on UserDefinedID.
+        cleanup_scenario(conn, tag)
+
+    cursor.execute("INSERT INTO Experiments (UserDefinedID, Note, ScheduledToRun) VALUES (?, ?, ?)",
+                   (tag, "benchmark", 1))
+    cursor.execute("SELECT ExperimentID FROM Experiments WHERE UserDefinedID = ?", (tag,))
+    experiment_id = cursor.fetchone()[0]
+    experiment_parameters.insert_parameters(cursor, experiment_id, PARAMETERS)
+
+    barcodes = [f"{tag}P{i:03d}" for i in range(max(plates, 2))]
+    cursor.execute("EXEC SpatialEvo_NewExperiment @UserExpID = ?, @NewPlateBC = ?, @ExpandPlateBC = ?",
+                   tag, barcodes[0], barcodes[1])
+    ancestor = cursor.fetchone()[0]
+    for barcode in barcodes[2:]:
+        cursor.execute("EXEC dbo.AddExpansionPlateToActiveExperiment @Barcode = ?", (barcode,))
+        cursor.fetchall()
+    conn.commit()
+    barcodes = barcodes[:plates]
+
+    geometry = plate_array.geometry(wells)
+    media = geometry.cols == geometry.n_cols - 1
+    pattern = [(ancestor, w, run_id, "MediaCtrl" if m else "Cells") for w, m in zip(geometry.names, media)]
+    bulk_load.load(conn, "ImportPlatePattern", pattern)
+
+    placeholders = ",".join("?" * len(barcodes))
+    cursor.execute(f"SELECT BarCode, PlateID FROM Plates WHERE BarCode IN ({placeholders})", barcodes)
+    plate_ids = dict(cursor.fetchall())
+    sim = plate_simulation.simulate(len(barcodes), wells, seed=seed, culture=~media, media=media)
+    ods = []
+    for i, barcode in enumerate(barcodes):
+        plate = plate_array.PlateArray(sim["OD"][i], geometry)
+        ods += [(plate_ids[barcode], w, od, run_id) for w, od in zip(*plate.select())]
+    bulk_load.load(conn, "ImportSpatialEvoOD", ods)
+    return run_id, barcodes
+
+
+CLEANUP_PLATE_TABLES = ("ImportSpatialEvoOD", "ImportSpatialEvoODSubset", "ImportFlEx482Em510",
+                        "ImportFlEx587Em611", "ImportPlatePattern", "AncestPlatesInExperiments")
+
+
+def cleanup_scenario(conn, tag, run_id=None):
+    """Delete the experiment ``tag`` with its parameters, plates (and their descendants) and imports.
+
+    With ``run_id`` every import row of that run goes as well, including rows
+    the scripts wrote for plates outside the scenario.
+    """
+    cursor = conn.cursor()
+    if run_id:
+        for table in CLEANUP_PLATE_TABLES:
+            if table.startswith("Import"):
+                cursor.execute(f"DELETE FROM {table} WHERE RunID = ?", (run_id,))
+    cursor.execute("SELECT ExperimentID FROM Experiments WHERE UserDefinedID = ?", (tag,))
+    experiment_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT PlateID FROM Plates WHERE BarCode LIKE ?", (tag + "%",))
+    plate_ids = {row[0] for row in cursor.fetchall()}
+    for experiment_id in experiment_ids:
+        cursor.execute("SELECT PlateID FROM AncestPlatesInExperiments WHERE ExperimentID = ?", (experiment_id,))
+        plate_ids.update(row[0] for row in cursor.fetchall())
+    frontier = set(plate_ids)
+    while frontier:
+        marks = ",".join("?" * len(frontier))
+        cursor.execute(f"SELECT PlateID FROM Plates WHERE ParentPlateID IN ({marks})", list(frontier))
+        frontier = {row[0] for row in cursor.fetchall()} - plate_ids
+        plate_ids |= frontier
+
+    plate_ids = sorted(plate_ids)
+    for start in range(0, len(plate_ids), 1000):
+        chunk = plate_ids[start:start + 1000]
+        marks = ",".join("?" * len(chunk))
+        for table in CLEANUP_PLATE_TABLES:
+            cursor.execute(f"DELETE FROM {table} WHERE PlateID IN ({marks})", chunk)
+        # Children before parents
+        cursor.execute(f"UPDATE Plates SET ParentPlateID = NULL WHERE PlateID IN ({marks})", chunk)
+    for start in range(0, len(plate_ids), 1000):
+        chunk = plate_ids[start:start + 1000]
+        cursor.execute(f"DELETE FROM Plates WHERE PlateID IN ({','.join('?' * len(chunk))})", chunk)
+    for experiment_id in experiment_ids:
+        cursor.execute("DELETE FROM AncestPlatesInExperiments WHERE ExperimentID = ?", (experiment_id,))
+        cursor.execute("DELETE FROM ExperimentParameters WHERE ExperimentID = ?", (experiment_id,))
+        cursor.execute("DELETE FROM Experiments WHERE ExperimentID = ?", (experiment_id,))
+    conn.commit()
+
+
+def steps(barcodes):
+    """The scripts of one new-experiment plus continue-experiment cycle, in VENUS order."""
+    return [
+        ("StartNewExperiment_2", []),
+        ("StartNewExperiment_SimulationFlourscent", []),
+        ("ContinueOnGoingExperiment_ConditionCheck", []),
+        ("ContinueOngoingExperiment_platechain", [barcodes[-1], "SpatialEvoPlate", "SpillOverPlate"]),
+        ("ContinueOnGoingExperiment_SimulationFlourscent", [barcodes[-1]]),
+        ("ContinueOnGoingExperiment_PurgeRetirePlate", []),
+    ]
+
+
+# === Parent side ===
+def run_step(script, args, env, workdir, python=sys.executable, exe_dir=None):
+    out_path = os.path.join(workdir, "phases.json")
+    if exe_dir:
+        command = [os.path.join(exe_dir, script + ".exe")] + args
+    else:
+        command = [python, os.path.abspath(__file__), "--child", script, "--"] + args
+    env = dict(env, CHAMPIONS_BENCH_T0=str(time.time_ns()), CHAMPIONS_BENCH_OUT=out_path)
+    start = time.perf_counter_ns()
+    proc = subprocess.run(command, env=env, cwd=workdir, capture_output=True, text=True)
+    wall_ns = time.perf_counter_ns() - start
+
+    record = {"script": script, "exit_code": proc.returncode, "wall_ms": wall_ns / 1e6}
+    if not exe_dir and os.path.exists(out_path):
+        with open(out_path) as f:
+            child = json.load(f)
+        os.remove(out_path)
+        record["phases_ms"] = {k: v / 1e6 for k, v in child["phases_ns"].items()}
+        record["counts"] = child["counts"]
+    if proc.returncode != 0:
+        record["stderr"] = proc.stderr[-2000:]
+    return record
+
+
+def test_connection_string(args):
+    """Connection string of the test EvoYeast for a non-offline backend, or None if none is safe."""
+    import evo_db
+
+    connection_string = args.connection_string or os.environ.get("EVOYEAST_CONNECTION_STRING")
+    if not connection_string or connection_string.strip() == evo_db.DEFAULT_CONNECTION_STRING:
+        return None
+    return connection_string
+
+
+def run_scenario(args, plates, wells, repeat):
+    import evo_db
+    import evoyeast_offline
+
+    workdir = tempfile.mkdtemp(prefix=f"champions_bench_{plates}_{wells}_")
+    env = dict(os.environ, EVO_TASK_DIR=os.path.join(workdir, "EvoTaskFiles"),
+               EVOYEAST_BACKEND=args.backend, CHAMPIONS_SIM_SEED=str(args.seed))
+    offline = args.backend == "offline"
+    if offline:
+        env["EVOYEAST_SQLITE_PATH"] = os.path.join(workdir, "EvoYeast.sqlite")
+        env.setdefault("CHAMPIONS_BCP_COMMAND", f'"{sys.executable}" "{os.path.join(HERE, "bulk_load.py")}"')
+        backend = evoyeast_offline.OfflineBackend(env["EVOYEAST_SQLITE_PATH"])
+    else:
+        env["EVOYEAST_CONNECTION_STRING"] = test_connection_string(args)
+        if args.backend == "pyodbc":
+            backend = evo_db.PyodbcBackend(env["EVOYEAST_CONNECTION_STRING"])
+        else:
+            backend = evo_db.create_backend(args.backend)
+
+    # bulk_load.load takes a second connection for its own session.
+    pool = evo_db.ConnectionPool(backend, max_size=2)
+    seed = args.seed + repeat
+    records = []
+    # Known before seeding, so a failed seed is cleaned up by RunID too.
+    run_id = None if offline else str(uuid.uuid4())
+    try:
+        conn = pool.acquire()
+        try:
+            run_id, barcodes = seed_scenario(conn, plates, wells, seed, offline, run_id)
+        finally:
+            conn.close()
+        if not offline:
+            env["CHAMPIONS_RUN_ID"] = run_id
+
+        for script, script_args in steps(barcodes):
+            record = run_step(script, script_args, env, workdir, args.python, args.exe_dir)
+            record.update(plates=plates, wells=wells, repeat=repeat, backend=args.backend)
+            records.append(record)
+    finally:
+        if not offline:
+            conn = pool.acquire()
+            try:
+                cleanup_scenario(conn, scenario_tag(plates, wells, seed), run_id)
+            finally:
+                conn.close()
+        pool.close_all()
+    return records
+
+
+def summarize(records):
+    """Median wall and phase times per (script, plates, wells)."""
+    groups = {}
+    for r in records:
+        groups.setdefault((r["script"], r["plates"], r["wells"]), []).append(r)
+    summary = {}
+    for key, runs in groups.items():
+        entry = {"wall_ms": statistics.median(r["wall_ms"] for r in runs),
+                 "failures": sum(1 for r in runs if r["exit_code"] != 0)}
+        if all("phases_ms" in r for r in runs):
+            entry["phases_ms"] = {p: statistics.median(r["phases_ms"][p] for r in runs) for p in PHASES}
+        summary[key] = entry
+    return summary
+
+
+def read_records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(summary, baseline, threshold):
+    """Steps whose median wall time grew by more than ``threshold`` (a ratio)."""
+    regressions = []
+    for key, entry in summary.items():
+        old = baseline.get(key)
+        if old and old["wall_ms"] > 0 and entry["wall_ms"] / old["wall_ms"] > threshold:
+            regressions.append((key, old["wall_ms"], entry["wall_ms"]))
+    return regressions
+
+
+def print_summary(summary, stream=sys.stderr):
+    shown = ("startup", "imports", "connect", "hxrun", "procedure", "query", "bulk_insert", "file_write", "other")
+    print(f"{'script':48} {'plates':>6} {'wells':>5} {'wall':>9}  " + " ".join(f"{p[:9]:>9}" for p in shown),
+          file=stream)
+    for (script, plates, wells), entry in sorted(summary.items(), key=lambda kv: (kv[0][1], kv[0][2], kv[0][0])):
+        phases = entry.get("phases_ms", {})
+        cells = " ".join(f"{phases[p]:9.1f}" if p in phases else f"{'-':>9}" for p in shown)
+        flag = f"  ({entry['failures']} failed)" if entry["failures"] else ""
+        print(f"{script:48} {plates:6d} {wells:5d} {entry['wall_ms']:9.1f}  {cells}{flag}", file=stream)
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--child":
+        args = sys.argv[3:]
+        if args[:1] == ["--"]:
+            args = args[1:]
+        run_child(sys.argv[2], args, os.environ["CHAMPIONS_BENCH_OUT"])
+
+    parser = argparse.ArgumentParser(description="Per-stage benchmark of the Champions_FL scripts.")
+    parser.add_argument("--plates", type=int, nargs="+", default=[1, 10, 50, 100, 200])
+    parser.add_argument("--wells", type=int, nargs="+", default=[96, 384])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backend", default="offline", help="EVOYEAST_BACKEND for the scripts")
+    parser.add_argument("--connection-string",
+                        help="test EvoYeast for a non-offline backend (default EVOYEAST_CONNECTION_STRING)")
+    parser.add_argument("--python", default=sys.executable, help="Interpreter that runs the scripts")
+    parser.add_argument("--exe-dir", help="Run the frozen executables from this folder instead")
+    parser.add_argument("--out", help="JSON-lines result file (default: stdout)")
+    parser.add_argument("--baseline", help="Earlier result file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+    sys.path.insert(0, HERE)
+    if args.backend != "offline" and test_connection_string(args) is None:
+        parser.error(f"--backend {args.backend} seeds and deletes data: give a test database with "
+                     "--connection-string or EVOYEAST_CONNECTION_STRING (the production default is refused)")
+
+    out = open(args.out, "w") if args.out else sys.stdout
+    records = []
+    try:
+        for wells in args.wells:
+            for plates in args.plates:
+                for repeat in range(args.repeat):
+                    for record in run_scenario(args, plates, wells, repeat):
+                        records.append(record)
+                        out.write(json.dumps(record) + "\n")
+                        out.flush()
+    finally:
+        if args.out:
+            out.close()
+
+    summary = summarize(records)
+    print_summary(summary)
+    failures = sum(entry["failures"] for entry in summary.values())
+    if args.baseline:
+        regressions = compare(summary, summarize(read_records(args.baseline)), args.threshold)
+        for (script, plates, wells), old, new in regressions:
+            print(f"REGRESSION {script} plates={plates} wells={wells}: {old:.1f} ms -> {new:.1f} ms",
+                  file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""In-process bulk loading into the EvoYeast Import* tables.
+
+Rows go straight from memory into the table over the pooled connection with
+pyodbc ``fast_executemany`` (plain ``executemany`` on other backends), in
+batches of ``BATCH_SIZE``. ``bcp`` is kept as a fallback: if the in-process
+load fails, the batch is rolled back and the rows are written to a temp file
+and loaded with ``bcp ... -T -c`` as before::
+
+    loaded, method = bulk_load.load(conn, "ImportSpatialEvoODSubset", rows)
+
+Like bcp, the load runs in a session of its own (a second connection from
+``conn``'s pool) and is committed immediately; whatever the caller has pending
+on ``conn`` is neither committed nor rolled back.
+
+The module also runs as a bcp stand-in for the VENUS method, reading the same
+tab-separated file::
+
+    bulk_load.py EvoYeast.dbo.ImportSpatialEvoOD in C:\\EvoTaskFiles\\<run>_OD.txt
+"""
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+from evo_db import establish_connection
+
+METHOD = os.environ.get("CHAMPIONS_BULK_METHOD", "executemany")
+BATCH_SIZE = int(os.environ.get("CHAMPIONS_BULK_BATCH_SIZE", "1000"))
+BCP_FALLBACK = os.environ.get("CHAMPIONS_BCP_FALLBACK", "1") != "0"
+BCP_SERVER = os.environ.get("CHAMPIONS_BCP_SERVER", "HAMILTON-PC\\HAMILTON")
+# Command line of the bcp binary; "python bulk_load.py" works as a stand-in.
+BCP_COMMAND = shlex.split(os.environ.get("CHAMPIONS_BCP_COMMAND", "bcp"), posix=(os.name != "nt"))
+DATABASE = "EvoYeast"
+
+# Column lists for the tables whose layout the scripts know. Tables without an
+# entry are loaded positionally, exactly like bcp -c does.
+TABLE_COLUMNS = {
+    "ImportFlEx482Em510": ("PlateID", "WellID", "FlEx482Em510", "RunID"),
+    "ImportFlEx587Em611": ("PlateID", "WellID", "FlEx587Em611", "RunID"),
+    "ImportPlatePattern": ("PlateID", "WellID", "RunID", "WellAssign"),
+    "ImportSpatialEvoOD": None,
+    "ImportSpatialEvoODSubset": None,
+}
+
+
+class BulkLoadError(Exception):
+    """Raised when neither the in-process load nor bcp succeeded."""
+
+
+def _table_name(table):
+    # Accept "EvoYeast.dbo.ImportX" as bcp does.
+    return table.split(".")[-1]
+
+
+def insert_sql(table, width):
+    name = _table_name(table)
+    columns = TABLE_COLUMNS.get(name)
+    placeholders = ", ".join(["?"] * width)
+    if columns:
+        return f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({placeholders})"
+    return f"INSERT INTO {name} VALUES ({placeholders})"
+
+
+def load_executemany(conn, table, rows, batch_size=None):
+    """Insert ``rows`` in batches on ``conn``; returns the row count. Does not commit."""
+    rows = [tuple(row) for row in rows]
+    if not rows:
+        return 0
+    batch_size = batch_size or BATCH_SIZE
+    sql = insert_sql(table, len(rows[0]))
+    cursor = conn.cursor()
+    if hasattr(cursor, "fast_executemany"):
+        cursor.fast_executemany = True
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+    return len(rows)
+
+
+def _bcp_field(value):
+    return "" if value is None else str(value)
+
+
+def write_bcp_file(rows, file_path):
+    """Write rows in bcp character format (tab-separated, one row per line)."""
+    with open(file_path, "w", newline="") as f:
+        f.write("".join("\t".join(_bcp_field(v) for v in row) + "\n" for row in rows))
+
+
+def run_bcp(table, file_path):
+    """Load ``file_path`` with the bcp binary; returns bcp's stdout."""
+    bcp_command = BCP_COMMAND + [
+        f"{DATABASE}.dbo.{_table_name(table)}",
+        "in", file_path,
+        "-T", "-c",
+        "-S", BCP_SERVER,
+    ]
+    with telemetry.span("bcp", table=_table_name(table)):
+        result = subprocess.run(
+            bcp_command,
+            capture_output=True,
+            text=True,
+            creationflags=getattr(subprocess, "CREATE_NO_WINDOW", 0)  # hide the console window
+        )
+    if result.returncode != 0:
+        raise BulkLoadError(f"bcp into {table} failed: {result.stderr or result.stdout}")
+    return result.stdout
+
+
+def load_bcp(table, rows, task_dir=None):
+    """Fallback path: temp file plus bcp subprocess."""
+    rows = list(rows)
+    fd, file_path = tempfile.mkstemp(dir=task_dir, prefix=f"{_table_name(table)}_", suffix=".txt")
+    os.close(fd)
+    try:
+        write_bcp_file(rows, file_path)
+        run_bcp(table, file_path)
+    finally:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+    return len(rows)
+
+
+def load(conn, table, rows, batch_size=None, method=None, fallback=None, task_dir=None):
+    """Bulk-load ``rows`` into ``table`` and commit.
+
+    Args:
+        conn: pooled EvoYeast connection
+        table: target table, e.g. ``ImportSpatialEvoOD`` or ``EvoYeast.dbo.ImportSpatialEvoOD``
+        rows: sequence of tuples in the table's column order
+        batch_size: rows per executemany call
+        method: ``executemany`` or ``bcp``; defaults to ``CHAMPIONS_BULK_METHOD``
+        fallback: retry with bcp if the in-process load fails; defaults to ``CHAMPIONS_BCP_FALLBACK``
+        task_dir: folder for the bcp temp file
+
+    Returns:
+        Tuple ``(row_count, method_used)``
+    """
+    rows = list(rows)
+    with telemetry.span("bulk_load", table=_table_name(table)):
+        count, used = _load(conn, table, rows, batch_size, method, fallback, task_dir)
+    telemetry.count("bulk.rows_loaded", count, table=_table_name(table), method=used)
+    return count, used
+
+
+def _load(conn, table, rows, batch_size, method, fallback, task_dir):
+    method = method or METHOD
+    fallback = BCP_FALLBACK if fallback is None else fallback
+    if method == "bcp":
+        return load_bcp(table, rows, task_dir), "bcp"
+    try:
+        session = conn.pool.acquire()
+        try:
+            count = load_executemany(session, table, rows, batch_size)
+            session.commit()
+        finally:
+            # Returning it to the pool rolls back an unfinished batch.
+            session.close()
+        return count, "executemany"
+    except Exception as e:
+        if not fallback:
+            raise BulkLoadError(f"Bulk load into {table} failed: {e}")
+        return load_bcp(table, rows, task_dir), "bcp"
+
+
+def read_bcp_file(file_path):
+    """Rows of a bcp character-format file; empty fields become NULL."""
+    with open(file_path, newline="") as f:
+        return [tuple(v if v != "" else None for v in line.rstrip("\r\n").split("\t"))
+                for line in f if line.strip()]
+
+
+def main():
+    # bcp-compatible: <db.dbo.table> in <file> [-T] [-c] [-S server]
+    if len(sys.argv) < 4 or sys.argv[2].lower() != "in":
+        print("Usage: bulk_load.py EvoYeast.dbo.Table in data_file [-T -c -S server]")
+        sys.exit(1)
+    table, file_path = sys.argv[1], sys.argv[3]
+    try:
+        rows = read_bcp_file(file_path)
+        conn = establish_connection()
+        # Never hand the rows back to bcp, which may be this script.
+        count, method = load(conn, table, rows, method="executemany", fallback=False)
+        conn.close()
+        print(f"{count} rows copied ({method}).")
+        sys.exit(0)
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
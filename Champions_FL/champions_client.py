@@ -0,0 +1,73 @@
+import json
+import os
+import socket
+import sys
+
+# Kept import-light on purpose: this is what VENUS launches for every step,
+# so it must start in milliseconds. Heavy work happens in champions_service.
+
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("CHAMPIONS_FL_PORT", "50707"))
+SCRIPT_DIR = os.environ.get("CHAMPIONS_FL_DIR", os.path.dirname(os.path.abspath(__file__)))
+PYTHON = os.environ.get("CHAMPIONS_FL_PYTHON", "python")
+CONNECT_TIMEOUT = 1.0
+# Settings the scripts read; the service applies them per request (see PER_CALL_ENV there).
+ENV_PREFIXES = ("CHAMPIONS_", "EVOYEAST_", "EVO_")
+
+
+def script_name(argv0):
+    """The client is frozen once per VENUS step, named after the script it replaces."""
+    return os.path.splitext(os.path.basename(argv0))[0]
+
+
+def forward(script, argv):
+    """Send one request to the service.
+
+    Returns the exit code, or None when the script has to run locally: the
+    service is not running, or it was started with settings that differ from
+    this process's environment.
+    """
+    try:
+        sock = socket.create_connection((HOST, PORT), timeout=CONNECT_TIMEOUT)
+    except OSError:
+        return None
+    with sock:
+        # Scripts may legitimately run for minutes (GUI input), so no read timeout.
+        sock.settimeout(None)
+        env = {k: v for k, v in os.environ.items() if k.upper().startswith(ENV_PREFIXES)}
+        request = {"script": script, "argv": argv, "cwd": os.getcwd(), "env": env}
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        reply = sock.makefile("rb").readline()
+    if not reply:
+        return 1
+    reply = json.loads(reply.decode("utf-8"))
+    if reply.get("run_locally"):
+        return None
+    return int(reply.get("exit_code", 1))
+
+
+def run_locally(script, argv):
+    """Fallback when the service is down: run the script in a fresh interpreter as before."""
+    import subprocess
+    path = os.path.join(SCRIPT_DIR, f"{script}.py")
+    return subprocess.call([PYTHON, path] + argv)
+
+
+def main():
+    args = sys.argv[1:]
+    script = script_name(sys.argv[0])
+    # Unfrozen use: champions_client.py <ScriptName> [args...]
+    if script == "champions_client":
+        if not args:
+            print("Usage: champions_client.py ScriptName [args ...]")
+            sys.exit(1)
+        script, args = args[0], args[1:]
+
+    exit_code = forward(script, args)
+    if exit_code is None:
+        exit_code = run_locally(script, args)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import os
+import re
+import runpy
+import socketserver
+import sys
+import threading
+import time
+
+import evo_db
+import common_path  # noqa: F401  (shared modules)
+import runlog
+import telemetry
+
+# === Service configuration ===
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("CHAMPIONS_FL_PORT", "50707"))
+SCRIPT_DIR = os.environ.get("CHAMPIONS_FL_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Scripts VENUS launches through Util::SyncShell / Shell. The client forwards
+# the executable name, so only these can be run by the service.
+SCRIPTS = (
+    "StartNewExperiment_1",
+    "StartNewExperiment_2",
+    "StartNewExperiment_SimulationFlourscent",
+    "ContinueOnGoingExperiment_ConditionCheck",
+    "ContinueOngoingExperiment_platechain",
+    "ContinueOnGoingExperiment_PurgeRetirePlate",
+    "ContinueOnGoingExperiment_SimulationFlourscent",
+    "bulk_load",
+    "fluorescence",
+    "od_ingest",
+)
+
+# Settings a script reads each time it runs (run_context.load, the scripts'
+# own module level), so they can be applied per request. Every other
+# CHAMPIONS_/EVOYEAST_/EVO_ setting is read once when a shared module is
+# imported; a request that needs a different value runs in a fresh process.
+PER_CALL_ENV = (
+    "CHAMPIONS_RUN_ID",
+    "CHAMPIONS_SIM_SEED",
+    "CHAMPIONS_REUSE_CULTURES",
+    "CHAMPIONS_PLANNER_PARITY",
+)
+ENV_PREFIXES = ("CHAMPIONS_", "EVOYEAST_", "EVO_")
+# Addressing of the client/service pair itself, and benchmark bookkeeping
+ENV_IGNORED = ("CHAMPIONS_FL_", "CHAMPIONS_BENCH_")
+
+# Modules every script imports; loading them once is the point of the service.
+WARM_MODULES = ("pyodbc", "numpy", "tkinter", "xlsx_reader", "csv", "argparse", "subprocess")
+
+# === Setup logging ===
+# The service outlives many VENUS runs, so its own lines are never held.
+log = runlog.logger("champions_service", hold=False)
+
+
+# === Warm-up ===
+def warm_up():
+    """Import the heavy modules and open the shared EvoYeast pool once."""
+    for name in WARM_MODULES:
+        start = time.perf_counter()
+        try:
+            __import__(name)
+            log(f"Preloaded {name} in {time.perf_counter() - start:.3f}s")
+        except ImportError as e:
+            log(f"WARNING: could not preload {name}: {e}")
+
+    # Scripts run in this process import the same evo_db module, so the
+    # connections opened here are the ones they get from establish_connection().
+    try:
+        evo_db.get_pool().warm()
+        log("EvoYeast connection pool warmed.")
+    except Exception as e:
+        log(f"WARNING: could not warm connection pool: {e}")
+
+
+# === Script execution ===
+_run_lock = threading.Lock()
+
+_SCRIPTS_BY_NAME = {name.lower(): name for name in SCRIPTS}
+
+
+def resolve_script(name):
+    """Canonical script name for ``name`` (an exe or script name, any case), or None.
+
+    Windows file names are case-insensitive: VENUS starts
+    ``ContinueOnGoingExperiment_platechain.exe`` for
+    ``ContinueOngoingExperiment_platechain.py``.
+    """
+    base = os.path.basename(name.replace("\\", "/"))
+    if base.lower().endswith((".exe", ".py")):
+        base = os.path.splitext(base)[0]
+    return _SCRIPTS_BY_NAME.get(base.lower())
+
+
+def _relevant_env(env):
+    return {k: v for k, v in env.items()
+            if k.upper().startswith(ENV_PREFIXES) and not k.upper().startswith(ENV_IGNORED)}
+
+
+def env_conflicts(env):
+    """Import-time settings in which the request's environment differs from the service's."""
+    if env is None:
+        return []
+    requested, own = _relevant_env(env), _relevant_env(os.environ)
+    return sorted(k for k in set(requested) | set(own)
+                  if k not in PER_CALL_ENV and requested.get(k) != own.get(k))
+
+
+def _apply_env(env):
+    """Set the per-call settings of a request; returns what to restore."""
+    saved = {k: os.environ.get(k) for k in PER_CALL_ENV}
+    if env is not None:
+        for k in PER_CALL_ENV:
+            if env.get(k) is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = env[k]
+    return saved
+
+
+def _restore_env(saved):
+    for k, v in saved.items():
+        if v is None:
+            os.environ.pop(k, None)
+        else:
+            os.environ[k] = v
+
+
+def run_script(script, argv, cwd=None, env=None):
+    """Run one Champions_FL script in-process and return its exit code.
+
+    Args:
+        script: script or exe name (matched case-insensitively)
+        argv: the script's arguments
+        cwd: working directory of the caller
+        env: the caller's environment (``None``: use the service's)
+    """
+    name = resolve_script(script)
+    if name is None:
+        log(f"ERROR: unknown script requested: {script}")
+        return 1
+    script = name
+
+    path = os.path.join(SCRIPT_DIR, f"{script}.py")
+    saved_argv, saved_cwd = sys.argv, os.getcwd()
+    # VENUS calls are synchronous, so one script at a time keeps the scripts'
+    # module-level state (sys.argv, cwd, environment, log file) exactly as in a
+    # fresh process.
+    with _run_lock:
+        saved_env = _apply_env(env)
+        sys.argv = [path] + list(argv)
+        telemetry.set_tags(script=script, run_id=None, barcode=None, plate_id=None)
+        runlog.set_run(None)
+        start = time.perf_counter()
+        try:
+            if cwd:
+                os.chdir(cwd)
+            runpy.run_path(path, run_name="__main__")
+            exit_code = 0
+        except SystemExit as e:
+            if e.code is None:
+                exit_code = 0
+            elif isinstance(e.code, int):
+                exit_code = e.code
+            else:
+                exit_code = 1
+        except Exception as e:
+            log(f"ERROR: {script} raised {type(e).__name__}: {e}")
+            exit_code = 1
+        finally:
+            sys.argv = saved_argv
+            os.chdir(saved_cwd)
+            _restore_env(saved_env)
+            leftover = evo_db.get_pool().reclaim()
+            if leftover:
+                log(f"Reclaimed {leftover} connection(s) left open by {script}.")
+            telemetry.flush()
+        log(f"{script} {' '.join(argv)} -> exit {exit_code} in {time.perf_counter() - start:.3f}s")
+    return exit_code
+
+
+# === Socket server ===
+class ScriptRequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        reply = {}
+        try:
+            request = json.loads(line.decode("utf-8"))
+            conflicts = env_conflicts(request.get("env"))
+            if conflicts:
+                # The shared modules hold the service's values; a fresh process is needed.
+                log(f"{request['script']}: caller's {', '.join(conflicts)} differ from the service's; "
+                    f"asking the client to run it locally.")
+                reply = {"exit_code": None, "run_locally": conflicts}
+            else:
+                exit_code = run_script(request["script"], request.get("argv", []), request.get("cwd"),
+                                       request.get("env"))
+                reply = {"exit_code": exit_code}
+        except (ValueError, KeyError) as e:
+            log(f"ERROR: malformed request {line!r}: {e}")
+            reply = {"exit_code": 1}
+        self.wfile.write((json.dumps(reply) + "\n").encode("utf-8"))
+
+
+class ChampionsServer(socketserver.TCPServer):
+    allow_reuse_address = True
+
+
+def check_sub(path):
+    """Executables the VENUS submethod file at ``path`` starts that the service cannot run."""
+    with open(path, encoding="latin-1") as f:
+        text = f.read()
+    exes = sorted(set(re.findall(r"(\w+)\.exe", text, re.IGNORECASE)))
+    return [exe for exe in exes if resolve_script(exe) is None
+            or not os.path.exists(os.path.join(SCRIPT_DIR, f"{resolve_script(exe)}.py"))]
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] == "--check-sub":
+        missing = [exe for sub in sys.argv[2:] for exe in check_sub(sub)]
+        for exe in missing:
+            print(f"UNRESOLVED: {exe}.exe")
+        print(f"{len(missing)} executable(s) the service cannot run" if missing else "All executables resolve.")
+        sys.exit(1 if missing else 0)
+    try:
+        log("=== Champions_FL service starting ===")
+        warm_up()
+        with ChampionsServer((HOST, PORT), ScriptRequestHandler) as server:
+            log(f"Listening on {HOST}:{PORT}, scripts from {SCRIPT_DIR}")
+            # Requests are served on the main thread so the tkinter GUI in
+            # StartNewExperiment_1 keeps running where Tk expects it.
+            server.serve_forever()
+    except KeyboardInterrupt:
+        log("Service stopped by user.")
+    except Exception as e:
+        log(f"Fatal error: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
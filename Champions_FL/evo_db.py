@@ -0,0 +1,441 @@
+"""Shared EvoYeast data access for the Champions_FL scripts.
+
+All scripts get their connection from one bounded pool instead of calling
+``pyodbc.connect`` themselves::
+
+    from evo_db import establish_connection
+
+    conn = establish_connection()
+    cursor = conn.cursor()
+    ...
+    conn.commit()
+    conn.close()  # returns the connection to the pool
+
+The backend is chosen with ``EVOYEAST_BACKEND`` (``pyodbc`` by default,
+``sqlite`` for a plain local database, ``offline`` for the EvoYeast stand-in
+in ``evoyeast_offline``) so the same code runs away from the robot PC.
+"""
+import atexit
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+
+
+def __getattr__(name):
+    # ``from evo_db import ProgrammingError`` imports pyodbc on first use, so
+    # scripts that never reach the database do not load the ODBC stack.
+    if name == "ProgrammingError":
+        try:
+            from pyodbc import ProgrammingError
+        except ImportError:
+            from sqlite3 import ProgrammingError
+        globals()["ProgrammingError"] = ProgrammingError
+        return ProgrammingError
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# The production EvoYeast database on the robot PC.
+DEFAULT_CONNECTION_STRING = (
+    "DRIVER={ODBC Driver 11 for SQL Server};"
+    "SERVER=LOCALHOST\\HAMILTON;"
+    "DATABASE=EvoYeast;"
+    "UID=Hamilton;"
+    "PWD=mkdpw:V43;"
+    "Trust_Connection=no;"
+)
+CONNECTION_STRING = os.environ.get("EVOYEAST_CONNECTION_STRING", DEFAULT_CONNECTION_STRING)
+
+
+class PoolError(Exception):
+    """Raised when no connection can be handed out."""
+
+
+# === Backends ===
+class PyodbcBackend:
+    """SQL Server through the Hamilton ODBC driver."""
+
+    name = "pyodbc"
+
+    def __init__(self, connection_string=None):
+        self.connection_string = connection_string or CONNECTION_STRING
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.connection_string)
+
+
+class SQLiteBackend:
+    """Local SQLite file, used as an offline stand-in for EvoYeast."""
+
+    name = "sqlite"
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("EVOYEAST_SQLITE_PATH", "EvoYeast.sqlite")
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+
+def _offline_backend():
+    # Imported on demand; the stand-in is never needed on the robot PC.
+    from evoyeast_offline import OfflineBackend
+    return OfflineBackend()
+
+
+_BACKENDS = {
+    "pyodbc": PyodbcBackend,
+    "sqlite": SQLiteBackend,
+    "offline": _offline_backend,
+}
+
+def register_backend(name, factory):
+    """Make a backend selectable through ``EVOYEAST_BACKEND``."""
+    _BACKENDS[name] = factory
+
+def create_backend(name=None):
+    name = name or os.environ.get("EVOYEAST_BACKEND", "pyodbc")
+    try:
+        return _BACKENDS[name]()
+    except KeyError:
+        raise PoolError(f"Unknown EvoYeast backend: {name}")
+
+
+# === Telemetry ===
+def statement_kind(sql):
+    """``hxrun``, ``procedure`` or ``query``: how a statement is reported."""
+    if re.search(r"\bHxRun\b", sql, re.IGNORECASE):
+        return "hxrun"
+    if re.search(r"\bEXEC(UTE)?\s", sql, re.IGNORECASE):
+        return "procedure"
+    return "query"
+
+
+class MeteredCursor:
+    """Cursor proxy that reports statement spans and row counts to telemetry."""
+
+    def __init__(self, cursor):
+        object.__setattr__(self, "_cursor", cursor)
+
+    def execute(self, sql, *params):
+        with telemetry.span("db.execute", kind=statement_kind(sql)):
+            self._cursor.execute(sql, *params)
+        return self
+
+    def executemany(self, sql, rows):
+        # Counted up front: a generator is empty once the driver has read it.
+        rows = rows if hasattr(rows, "__len__") else list(rows)
+        with telemetry.span("db.executemany"):
+            self._cursor.executemany(sql, rows)
+        telemetry.count("db.rows_written", len(rows))
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            telemetry.count("db.rows_read")
+        return row
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        telemetry.count("db.rows_read", len(rows))
+        return rows
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany
+        setattr(self._cursor, name, value)
+
+
+def _metered(cursor):
+    return MeteredCursor(cursor) if telemetry.enabled() else cursor
+
+
+class StatementCursor:
+    """Cursor returned by :meth:`PooledConnection.execute`.
+
+    ``close()`` (or leaving a ``with`` block) hands the cursor back to the
+    connection's statement cache instead of closing it.
+    """
+
+    def __init__(self, conn, sql, raw_cursor):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_sql", sql)
+        object.__setattr__(self, "_raw_cursor", raw_cursor)
+        object.__setattr__(self, "_cursor", _metered(raw_cursor))
+
+    def close(self):
+        raw_cursor = self._raw_cursor
+        if raw_cursor is not None:
+            object.__setattr__(self, "_raw_cursor", None)
+            self._conn._statement_done(self._sql, raw_cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+# === Pooled connection ===
+class PooledConnection:
+    """Connection checked out of a :class:`ConnectionPool`.
+
+    ``close()`` hands the connection back instead of logging out. Statements
+    run through :meth:`execute` keep a dedicated cursor per SQL text, so the
+    driver reuses the prepared statement on repeated calls::
+
+        with conn.execute(sql, params) as cursor:
+            rows = cursor.fetchall()
+
+    A cursor goes back to the cache only when it is closed, so a nested
+    ``execute`` of the same SQL while its rows are still being read gets a
+    cursor of its own.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+        self._statements = OrderedDict()
+        self.last_used = time.monotonic()
+        self.closed = False
+
+    @property
+    def raw(self):
+        return self._raw
+
+    @property
+    def pool(self):
+        return self._pool
+
+    def cursor(self):
+        return _metered(self._raw.cursor())
+
+    def execute(self, sql, params=()):
+        """Execute ``sql`` on a cached cursor; close the returned cursor when done with its rows."""
+        cursor = StatementCursor(self, sql, self._statements.pop(sql, None) or self._raw.cursor())
+        try:
+            cursor.execute(sql, params)
+        except Exception:
+            cursor.close()
+            raise
+        return cursor
+
+    def _statement_done(self, sql, cursor):
+        if self.closed or sql in self._statements:
+            _close_quietly(cursor)
+            return
+        if len(self._statements) >= self._pool.statement_cache_size:
+            _, oldest = self._statements.popitem(last=False)
+            _close_quietly(oldest)
+        self._statements[sql] = cursor
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self._pool.release(self)
+
+    def discard(self):
+        """Close the underlying connection, e.g. after a broken transaction."""
+        if not self.closed:
+            self.closed = True
+            self._pool.release(self, broken=True)
+
+    def _close_raw(self):
+        for cursor in self._statements.values():
+            _close_quietly(cursor)
+        self._statements.clear()
+        _close_quietly(self._raw)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+def _close_quietly(obj):
+    try:
+        obj.close()
+    except Exception:
+        pass
+
+
+# === Pool ===
+class ConnectionPool:
+    """Bounded pool of EvoYeast connections.
+
+    Args:
+        backend: object with a ``connect()`` method returning a DB-API connection
+        max_size: most connections open at once
+        acquire_timeout: seconds to wait for a free connection
+        health_check_after: idle seconds after which a connection is pinged before reuse
+        connect_retries: reconnect attempts before giving up
+        backoff: first retry delay in seconds, doubled on each attempt
+        statement_cache_size: prepared statements kept per connection
+    """
+
+    def __init__(self, backend=None, max_size=4, acquire_timeout=30.0,
+                 health_check_after=30.0, connect_retries=3, backoff=0.5,
+                 statement_cache_size=32):
+        self.backend = backend or create_backend()
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.connect_retries = connect_retries
+        self.backoff = backoff
+        self.statement_cache_size = statement_cache_size
+        self._idle = []
+        self._in_use = set()
+        self._open = 0
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        delay = self.backoff
+        for attempt in range(self.connect_retries + 1):
+            try:
+                with telemetry.span("db.connect", backend=getattr(self.backend, "name", "")):
+                    return self.backend.connect()
+            except Exception as e:
+                if attempt == self.connect_retries:
+                    raise PoolError(f"Could not connect after {attempt + 1} attempts: {e}")
+                time.sleep(delay)
+                delay *= 2
+
+    def _is_healthy(self, conn):
+        # Called without the pool lock: the ping is a server round trip.
+        if time.monotonic() - conn.last_used < self.health_check_after:
+            return True
+        try:
+            cursor = conn.raw.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.max_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolError(f"No free connection within {self.acquire_timeout}s")
+                    self._cond.wait(remaining)
+                if not self._idle:
+                    self._open += 1
+                    break
+                conn = self._idle.pop()
+            # Popped under the lock, pinged outside it.
+            if self._is_healthy(conn):
+                with self._cond:
+                    conn.closed = False
+                    self._in_use.add(conn)
+                return conn
+            conn._close_raw()
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+        try:
+            conn = PooledConnection(self, self._connect())
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._in_use.add(conn)
+        return conn
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                # Uncommitted work never leaks into the next script.
+                conn.raw.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            self._in_use.discard(conn)
+            if broken:
+                conn._close_raw()
+                self._open -= 1
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def warm(self, count=1):
+        """Open ``count`` connections up front so the first script skips the login."""
+        conns = [self.acquire() for _ in range(min(count, self.max_size))]
+        for conn in conns:
+            conn.close()
+
+    def reclaim(self):
+        """Return connections a script left checked out, e.g. after ``sys.exit``."""
+        with self._cond:
+            leftover = list(self._in_use)
+        for conn in leftover:
+            conn.close()
+        return len(leftover)
+
+    def close_all(self):
+        with self._cond:
+            for conn in self._idle:
+                conn._close_raw()
+            self._open -= len(self._idle)
+            self._idle = []
+
+
+# === Module-level pool ===
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool()
+            atexit.register(_pool.close_all)
+        return _pool
+
+def set_pool(pool):
+    """Replace the shared pool, e.g. with one on a stand-in backend."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close_all()
+        _pool = pool
+
+def establish_connection():
+    return get_pool().acquire()
@@ -0,0 +1,492 @@
+"""Offline stand-in for EvoYeast: SQLite schema, procedure emulation and a bcp shim.
+
+Selected with ``EVOYEAST_BACKEND=offline``; the database file is
+``EVOYEAST_SQLITE_PATH`` (created on first use). The scripts then run
+unchanged away from the robot PC:
+
+- T-SQL the scripts send is translated for SQLite (``TOP n``, ``dbo.``,
+  ``HamiltonVectorDB.dbo.HxRun``, ``CHECKSUM``/``CHECKSUM_AGG``,
+  ``dbo.Descendants(?)``, ``OUTPUT INSERTED.<col>``), and batches of several statements return several
+  result sets like pyodbc does.
+- ``EXEC`` of the procedures in ``PROCEDURES`` and ``SELECT dbo.<function>(...)``
+  of the scalar functions in ``FUNCTIONS`` run Python emulations.
+- bcp: set ``CHAMPIONS_BCP_COMMAND`` to ``python bulk_load.py`` and the bcp
+  fallback loads through this backend too.
+
+The emulations reproduce what the scripts rely on (result-set shapes and
+column order), not every detail of the production procedures::
+
+    EVOYEAST_BACKEND=offline EVOYEAST_SQLITE_PATH=/tmp/evo.sqlite python StartNewExperiment_2.py
+"""
+import os
+import re
+import sqlite3
+import threading
+import uuid
+import zlib
+from datetime import datetime
+
+from evo_db import ProgrammingError
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Experiments (
+    ExperimentID INTEGER PRIMARY KEY AUTOINCREMENT,
+    UserDefinedID TEXT UNIQUE,
+    Note TEXT,
+    ScheduledToRun INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS ExperimentParameters (
+    ExperimentID INTEGER,
+    ParameterName TEXT,
+    ParamValueTxt TEXT
+);
+CREATE TABLE IF NOT EXISTS Plates (
+    PlateID INTEGER PRIMARY KEY AUTOINCREMENT,
+    BarCode TEXT UNIQUE,
+    ParentPlateID INTEGER,
+    ExperimentID INTEGER,
+    CytomatPos INTEGER,
+    Retired INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS AncestPlatesInExperiments (
+    ExperimentID INTEGER,
+    PlateID INTEGER
+);
+CREATE TABLE IF NOT EXISTS ImportPlatePattern (
+    PlateID INTEGER, WellID TEXT, RunID TEXT, WellAssign TEXT
+);
+CREATE TABLE IF NOT EXISTS ImportSpatialEvoOD (
+    PlateID INTEGER, WellID TEXT, OD REAL, RunID TEXT
+);
+CREATE TABLE IF NOT EXISTS ImportSpatialEvoODSubset (
+    PlateID INTEGER, RunID TEXT, WellID TEXT, CorrectionFactor REAL
+);
+CREATE TABLE IF NOT EXISTS ImportFlEx482Em510 (
+    PlateID INTEGER, WellID TEXT, FlEx482Em510 REAL, RunID TEXT
+);
+CREATE TABLE IF NOT EXISTS ImportFlEx587Em611 (
+    PlateID INTEGER, WellID TEXT, FlEx587Em611 REAL, RunID TEXT
+);
+CREATE TABLE IF NOT EXISTS HxRun (
+    RunGUID TEXT, StartTime TEXT
+);
+CREATE INDEX IF NOT EXISTS IX_Plates_Parent ON Plates (ParentPlateID);
+CREATE INDEX IF NOT EXISTS IX_OD_Plate ON ImportSpatialEvoOD (PlateID, RunID);
+CREATE INDEX IF NOT EXISTS IX_Subset_Run ON ImportSpatialEvoODSubset (RunID, PlateID);
+"""
+
+DESCENDANTS_SQL = ("(WITH RECURSIVE Tree(DescPlateID) AS ("
+                   "SELECT PlateID FROM Plates WHERE ParentPlateID = ? "
+                   "UNION SELECT Plates.PlateID FROM Plates JOIN Tree ON Plates.ParentPlateID = Tree.DescPlateID) "
+                   "SELECT DescPlateID FROM Tree)")
+
+_EXEC = re.compile(r"^\s*EXEC(?:UTE)?\s+(?:\w+\.)*(\w+)\s*(.*)$", re.IGNORECASE | re.DOTALL)
+_FUNCTION = re.compile(r"^\s*SELECT\s+(?:dbo\.)?(\w+)\s*\((.*)\)\s*$", re.IGNORECASE | re.DOTALL)
+_TOP = re.compile(r"^(\s*SELECT\s+(?:DISTINCT\s+)?)TOP\s*\(?\s*(\d+)\s*\)?\s+", re.IGNORECASE)
+_OUTPUT = re.compile(r"\s+OUTPUT\s+(INSERTED\.\w+(?:\s*,\s*INSERTED\.\w+)*)", re.IGNORECASE)
+_NOCOUNT = re.compile(r"^\s*SET\s+NOCOUNT\s+(ON|OFF)\s*$", re.IGNORECASE)
+
+
+# === T-SQL translation ===
+def split_statements(sql, params):
+    """Split a batch on ``;`` outside string literals; hand each statement its parameters."""
+    statements, current, quoted = [], [], False
+    for ch in sql:
+        if ch == "'":
+            quoted = not quoted
+        if ch == ";" and not quoted:
+            statements.append("".join(current))
+            current = []
+        else:
+            current.append(ch)
+    statements.append("".join(current))
+
+    result, offset = [], 0
+    for statement in statements:
+        if not statement.strip():
+            continue
+        n = _count_placeholders(statement)
+        result.append((statement, list(params[offset:offset + n])))
+        offset += n
+    return result
+
+
+def _count_placeholders(sql):
+    count, quoted = 0, False
+    for ch in sql:
+        if ch == "'":
+            quoted = not quoted
+        elif ch == "?" and not quoted:
+            count += 1
+    return count
+
+
+def translate(sql):
+    """Rewrite the T-SQL the scripts use into SQLite."""
+    sql = re.sub(r"HamiltonVectorDB\.dbo\.HxRun", "HxRun", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\b(?:dbo\.)?Descendants\s*\(\s*\?\s*\)", DESCENDANTS_SQL, sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bEvoYeast\.dbo\.", "", sql, flags=re.IGNORECASE)
+    sql = re.sub(r"\bdbo\.", "", sql, flags=re.IGNORECASE)
+    top = _TOP.match(sql)
+    if top:
+        sql = top.group(1) + sql[top.end():].rstrip() + f" LIMIT {top.group(2)}"
+    output = _OUTPUT.search(sql)
+    if output:
+        columns = ", ".join(c.strip()[len("INSERTED."):] for c in output.group(1).split(","))
+        sql = sql[:output.start()] + sql[output.end():].rstrip().rstrip(";") + f" RETURNING {columns}"
+    return sql
+
+
+def _checksum(*values):
+    value = zlib.crc32("\x1f".join("" if v is None else str(v) for v in values).encode())
+    return value - (1 << 32) if value >= (1 << 31) else value
+
+
+class _ChecksumAgg:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= value
+
+    def finalize(self):
+        return self.value
+
+
+# === Cursor / connection ===
+class _ResultSet:
+    def __init__(self, columns, rows):
+        self.description = tuple((name, None, None, None, None, None, None) for name in columns)
+        self.rows = [tuple(r) for r in rows]
+        self.pos = 0
+
+
+class OfflineCursor:
+    """pyodbc-like cursor: multiple result sets, ``nextset`` and procedure calls."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._raw = connection.raw.cursor()
+        self._pending = []
+        self._current = None
+        self.rowcount = -1
+        self.fast_executemany = False
+
+    @property
+    def description(self):
+        return self._current.description if self._current else None
+
+    def execute(self, sql, *params):
+        if len(params) == 1 and isinstance(params[0], (list, tuple)):
+            params = params[0]
+        results = []
+        for statement, statement_params in split_statements(sql, params):
+            results.extend(self._run(statement, statement_params))
+        self._pending = results
+        self._current = self._pending.pop(0) if self._pending else None
+        return self
+
+    def _run(self, statement, params):
+        if _NOCOUNT.match(statement):
+            return []
+        call = _EXEC.match(statement)
+        if call:
+            return self.connection.call_procedure(call.group(1), call.group(2), params)
+        function = _FUNCTION.match(statement)
+        if function and function.group(1).lower() in FUNCTIONS:
+            value = self.connection.call_function(function.group(1), function.group(2), params)
+            return [_ResultSet([""], [(value,)])]
+        self._raw.execute(translate(statement), params)
+        self.rowcount = self._raw.rowcount
+        if self._raw.description is None:
+            return []
+        return [_ResultSet([d[0] for d in self._raw.description], self._raw.fetchall())]
+
+    def executemany(self, sql, seq_of_params):
+        self._raw.executemany(translate(sql), seq_of_params)
+        self.rowcount = self._raw.rowcount
+        self._pending, self._current = [], None
+
+    def _require_results(self):
+        if self._current is None:
+            raise ProgrammingError("No results.  Previous SQL was not a query.")
+        return self._current
+
+    def fetchone(self):
+        result = self._require_results()
+        if result.pos >= len(result.rows):
+            return None
+        result.pos += 1
+        return result.rows[result.pos - 1]
+
+    def fetchall(self):
+        result = self._require_results()
+        rows = result.rows[result.pos:]
+        result.pos = len(result.rows)
+        return rows
+
+    def nextset(self):
+        if not self._pending:
+            self._current = None
+            return None
+        self._current = self._pending.pop(0)
+        return True
+
+    def close(self):
+        self._raw.close()
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+
+class OfflineConnection:
+    """Wraps a SQLite connection and runs the procedure emulations on it."""
+
+    def __init__(self, raw):
+        self.raw = raw
+
+    def cursor(self):
+        return OfflineCursor(self)
+
+    def commit(self):
+        self.raw.commit()
+
+    def rollback(self):
+        self.raw.rollback()
+
+    def close(self):
+        self.raw.close()
+
+    def query(self, sql, params=()):
+        return self.raw.execute(sql, params).fetchall()
+
+    def scalar(self, sql, params=()):
+        row = self.raw.execute(sql, params).fetchone()
+        return row[0] if row else None
+
+    def call_procedure(self, name, arg_text, params):
+        proc = PROCEDURES.get(name.lower())
+        if proc is None:
+            raise ProgrammingError(f"Could not find stored procedure '{name}'.")
+        args, kwargs = _bind_arguments(arg_text, params)
+        return [_ResultSet(columns, rows) for columns, rows in proc(self, *args, **kwargs)]
+
+    def call_function(self, name, arg_text, params):
+        args, _ = _bind_arguments(arg_text, params)
+        return FUNCTIONS[name.lower()](self, *args)
+
+
+def _bind_arguments(arg_text, params):
+    """Split ``@Name = ?, ?, NULL, 'x'`` into positional and (lower-case) named values."""
+    params = list(params)
+    args, kwargs = [], {}
+    for part in (p.strip() for p in arg_text.split(",")):
+        if not part:
+            continue
+        name, _, value = part.rpartition("=")
+        value = value.strip()
+        if value == "?":
+            value = params.pop(0)
+        elif value.upper() == "NULL":
+            value = None
+        else:
+            value = value.strip("'")
+        if name.strip():
+            kwargs[name.strip().lstrip("@").lower()] = value
+        else:
+            args.append(value)
+    return args, kwargs
+
+
+class OfflineBackend:
+    """``EVOYEAST_BACKEND=offline``: SQLite file with the EvoYeast stand-in schema."""
+
+    name = "offline"
+    _initialised = set()
+    _lock = threading.Lock()
+
+    def __init__(self, path=None):
+        self.path = path or os.environ.get("EVOYEAST_SQLITE_PATH", "EvoYeast_offline.sqlite")
+
+    def connect(self):
+        raw = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        raw.create_function("CHECKSUM", -1, _checksum)
+        raw.create_aggregate("CHECKSUM_AGG", 1, _ChecksumAgg)
+        with self._lock:
+            if self.path not in self._initialised or self.path == ":memory:":
+                raw.executescript(SCHEMA)
+                self._initialised.add(self.path)
+        return OfflineConnection(raw)
+
+
+# === Helpers ===
+def _active_experiment(db):
+    return db.scalar("SELECT ExperimentID FROM Experiments WHERE ScheduledToRun = 1 "
+                     "ORDER BY ExperimentID DESC LIMIT 1")
+
+
+def _ancestor(db, experiment_id):
+    return db.scalar("SELECT PlateID FROM AncestPlatesInExperiments WHERE ExperimentID = ? "
+                     "ORDER BY PlateID LIMIT 1", (experiment_id,))
+
+
+def _descendants(db, plate_id, include_retired=False):
+    sql = f"SELECT DescPlateID FROM {DESCENDANTS_SQL} AS D JOIN Plates ON Plates.PlateID = D.DescPlateID"
+    if not include_retired:
+        sql += " WHERE Plates.Retired = 0"
+    return [r[0] for r in db.query(sql + " ORDER BY DescPlateID", (plate_id,))]
+
+
+def _free_cytomat_pos(db):
+    used = {r[0] for r in db.query("SELECT CytomatPos FROM Plates WHERE Retired = 0 AND CytomatPos IS NOT NULL")}
+    pos = 1
+    while pos in used:
+        pos += 1
+    return pos
+
+
+def _new_plate(db, barcode, parent_id, experiment_id):
+    pos = _free_cytomat_pos(db)
+    cursor = db.raw.execute("INSERT INTO Plates (BarCode, ParentPlateID, ExperimentID, CytomatPos) "
+                            "VALUES (?, ?, ?, ?)", (barcode, parent_id, experiment_id, pos))
+    return cursor.lastrowid, pos
+
+
+def start_run(conn, run_id=None, start_time=None):
+    """Add a run to the stand-in HxRun table, as VENUS does at method start."""
+    run_id = run_id or str(uuid.uuid4()).upper()
+    start_time = start_time or datetime.now().isoformat(sep=" ", timespec="milliseconds")
+    conn.cursor().execute("INSERT INTO HxRun (RunGUID, StartTime) VALUES (?, ?)", (run_id, start_time))
+    conn.commit()
+    return run_id
+
+
+# === Procedure emulations ===
+# Each takes the connection plus the bound @parameters (lower-case) and returns
+# a list of (columns, rows) result sets.
+def spatialevo_new_experiment(db, userexpid, newplatebc, expandplatebc=None):
+    experiment_id = db.scalar("SELECT ExperimentID FROM Experiments WHERE UserDefinedID = ?", (userexpid,))
+    if experiment_id is None:
+        return [(["Result"], [(f"DATABASE ERROR: unknown experiment {userexpid}",)])]
+    if db.scalar("SELECT COUNT(*) FROM Plates WHERE BarCode IN (?, ?)", (newplatebc, expandplatebc)):
+        return [(["Result"], [("DATABASE ERROR: barcode already in use",)])]
+    plate_id, pos = _new_plate(db, newplatebc, None, experiment_id)
+    db.raw.execute("INSERT INTO AncestPlatesInExperiments (ExperimentID, PlateID) VALUES (?, ?)",
+                   (experiment_id, plate_id))
+    if expandplatebc:
+        _new_plate(db, expandplatebc, plate_id, experiment_id)
+    return [(["PlateID", "CytomatPos"], [(plate_id, pos)])]
+
+
+def spatialevo_commence_experiment_fl(db, plateid):
+    # Production marks the experiment as started; nothing the scripts read back.
+    return []
+
+
+def evo_retrieve_plate_chain(db):
+    experiment_id = _active_experiment(db)
+    ancestor = _ancestor(db, experiment_id) if experiment_id is not None else None
+    if ancestor is None:
+        return [(["BarCode", "CytomatPos"], [])]
+    columns = ["BarCode", "CytomatPos"]
+    first = db.query("SELECT BarCode, CytomatPos FROM Plates WHERE PlateID = ?", (ancestor,))
+    descendants = _descendants(db, ancestor)
+    rest = []
+    if descendants:
+        placeholders = ",".join("?" * len(descendants))
+        rest = db.query(f"SELECT BarCode, CytomatPos FROM Plates WHERE PlateID IN ({placeholders}) "
+                        "ORDER BY PlateID", descendants)
+    return [(columns, first), (columns, rest)]
+
+
+def competition_select_cultures(db, barcode, runid):
+    columns = ["PlateID", "WellID", "OD"]
+    plate_id = db.scalar("SELECT PlateID FROM Plates WHERE BarCode = ?", (barcode,))
+    if plate_id is None:
+        return [(columns, [])]
+    ancestor = _ancestor(db, _active_experiment(db))
+    rows = db.query(
+        "SELECT PlateID, WellID, OD FROM ImportSpatialEvoOD WHERE PlateID = ? AND RunID = ? "
+        "AND WellID NOT IN (SELECT WellID FROM ImportPlatePattern WHERE PlateID = ? AND WellAssign = 'MediaCtrl') "
+        "ORDER BY rowid", (plate_id, runid, ancestor))
+    return [(columns, rows)]
+
+
+def champions_commence_propagation_fl(db, targetvol, runid, inoculationod, topfractiontopropagate,
+                                      odsamplevol=0):
+    # The local planner is the reference for the production procedure's volumes.
+    import numpy as np
+    import propagation_planner
+    from plate_array import PlateArray
+
+    params = {"TargetWellVolume": targetvol, "InoculationOD": inoculationod,
+              "TopFractionToPropagate": topfractiontopropagate, "V_OD_Sample": odsamplevol}
+    rows = []
+    spill = 0
+    for (plate_id,) in db.query("SELECT DISTINCT PlateID FROM ImportSpatialEvoODSubset WHERE RunID = ? "
+                                "ORDER BY PlateID", (runid,)):
+        ods_rows = db.query("SELECT WellID, OD FROM ImportSpatialEvoOD WHERE PlateID = ? AND RunID = ?",
+                            (plate_id, runid))
+        if not ods_rows:
+            continue
+        ods = PlateArray.from_records([r[0] for r in ods_rows], [float(r[1]) for r in ods_rows])
+        subset = db.query("SELECT WellID, CorrectionFactor FROM ImportSpatialEvoODSubset "
+                          "WHERE PlateID = ? AND RunID = ?", (plate_id, runid))
+        geometry = ods.geometry
+        correction = np.ones(geometry.n_wells)
+        correction[geometry.indices(r[0] for r in subset)] = [float(r[1] or 1) for r in subset]
+        scores = np.full(geometry.n_wells, np.nan)
+        score_rows = db.query(propagation_planner.PLATE_SCORES_SQL, (plate_id, runid))
+        if score_rows:
+            scores[geometry.indices(r[0] for r in score_rows)] = [float(r[1]) for r in score_rows]
+        else:
+            # No fluorescence read for the plate offline: rank by OD instead.
+            scores = ods.values
+        plan = propagation_planner.plan_plates(ods.values, params, scores,
+                                               valid=geometry.mask(r[0] for r in subset),
+                                               correction=correction, wells=geometry.names)
+        cytomat = db.scalar("SELECT CytomatPos FROM Plates WHERE PlateID = ?", (plate_id,))
+        for well, culture, media in plan.rows():
+            rows.append((cytomat, plate_id, geometry.names[spill % geometry.n_wells], well,
+                         round(culture, 2), round(media, 2)))
+            spill += 1
+    return [(["CytomatPos", "PlateID", "SpillOverPosition", "WellPosition", "CultureVol", "MediaVol"], rows)]
+
+
+def add_expansion_plate_to_active_experiment(db, barcode):
+    experiment_id = _active_experiment(db)
+    ancestor = _ancestor(db, experiment_id) if experiment_id is not None else None
+    if ancestor is None:
+        return [(["Result"], [("DATABASE ERROR: no active experiment",)])]
+    parent = ([ancestor] + _descendants(db, ancestor))[-1]
+    plate_id, pos = _new_plate(db, barcode, parent, experiment_id)
+    return [(["PlateID", "BarCode", "CytomatPos"], [(plate_id, barcode, pos)])]
+
+
+PROCEDURES = {
+    "spatialevo_newexperiment": spatialevo_new_experiment,
+    "spatialevo_commenceexperimentfl": spatialevo_commence_experiment_fl,
+    "evo_retrieveplatechain": evo_retrieve_plate_chain,
+    "competition_selectcultures": competition_select_cultures,
+    "champions_commencepropagationfl": champions_commence_propagation_fl,
+    "addexpansionplatetoactiveexperiment": add_expansion_plate_to_active_experiment,
+}
+
+
+# === Scalar functions ===
+def query_cytomat_position(db, barcode):
+    return db.scalar("SELECT CytomatPos FROM Plates WHERE BarCode = ?", (barcode,))
+
+
+def read_experiment_parameter(db, experiment_id, name):
+    if experiment_id is None:
+        experiment_id = _active_experiment(db)
+    return db.scalar("SELECT ParamValueTxt FROM ExperimentParameters WHERE ExperimentID = ? "
+                     "AND ParameterName = ?", (experiment_id, name))
+
+
+FUNCTIONS = {
+    "querycytomatposition": query_cytomat_position,
+    "readexperimentparameter": read_experiment_parameter,
+}
@@ -0,0 +1,171 @@
+"""Typed, cached access to the ExperimentParameters of the active experiment.
+
+``load`` reads every parameter of the active experiment (``ScheduledToRun = 1``)
+in one query instead of one ``dbo.ReadExperimentParameter`` call per name and
+keeps the result in the run context. Later scripts of the same VENUS run
+trust the cached set after one aggregate query (active ExperimentID, row
+count and checksum of its parameters), so an edit from SSMS or the GUI, or a
+different active experiment, is picked up. ``insert_parameters`` (and so
+``new_experiment.create``) also drops the cached set through ``invalidate``.
+With more than one active experiment the values are read name by name with
+``dbo.ReadExperimentParameter`` as before::
+
+    params = experiment_parameters.load(cursor, ctx)
+    params["TargetWellVolume"]   # 700.0, not '700'
+
+``insert_parameters`` writes a whole parameter set with one multi-row INSERT.
+"""
+import run_context
+
+# Parameters whose value is a count or flag; everything else is a float.
+INT_PARAMETERS = {"MaxIteration", "FreezeGeneration", "UseFluorescence"}
+
+# Parameter set of a new experiment and its defaults (StartNewExperiment_1 form).
+DEFAULTS = {
+    'BackgroundOD': 0.036,
+    'InoculationOD': 0.03,
+    'MaxIteration': 20,
+    'ODConversionFactor': 2.52,
+    'FreezeVolume': 0.5,
+    'TargetWellVolume': 700,
+    'V_OD_Sample': 150,
+    'TopFractionToPropagate': 1,
+    'FreezeGeneration': 1,
+    'UseFluorescence': 1,
+    'GFP_scale': 4669.1,
+    'GFP_RFPdamping': 773.1,
+    'RFP_scale': 2262.3,
+    'RFP_GFPdamping': 305.0
+}
+TOP_FRACTIONS = (0.25, 0.5, 0.75, 1)
+
+ACTIVE_PARAMETERS_SQL = """
+    SELECT ExperimentParameters.ExperimentID, ExperimentParameters.ParameterName, ExperimentParameters.ParamValueTxt
+    FROM ExperimentParameters
+    INNER JOIN Experiments ON ExperimentParameters.ExperimentID = Experiments.ExperimentID
+    WHERE Experiments.ScheduledToRun = 1
+"""
+# One row per active experiment; cheaper than reading the parameters themselves.
+FINGERPRINT_SQL = """
+    SELECT Experiments.ExperimentID, COUNT(ExperimentParameters.ParameterName),
+           CHECKSUM_AGG(CHECKSUM(ExperimentParameters.ParameterName, ExperimentParameters.ParamValueTxt))
+    FROM Experiments
+    LEFT JOIN ExperimentParameters ON ExperimentParameters.ExperimentID = Experiments.ExperimentID
+    WHERE Experiments.ScheduledToRun = 1
+    GROUP BY Experiments.ExperimentID
+    ORDER BY Experiments.ExperimentID
+"""
+READ_PARAMETER_SQL = "SELECT dbo.ReadExperimentParameter(NULL, ?)"
+
+# SQL Server takes at most 2100 parameters per statement (3 per row).
+MAX_INSERT_ROWS = 700
+
+CACHE_KEY = "parameters"
+
+
+class ParameterError(Exception):
+    """Raised when a required parameter is missing or cannot be converted."""
+
+
+def to_value(name, text):
+    """Convert a ``ParamValueTxt`` to the parameter's Python type."""
+    if text is None:
+        return None
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return str(text).strip()
+    if name in INT_PARAMETERS and value.is_integer():
+        return int(value)
+    return value
+
+
+def to_text(value):
+    """Format a value for ``ParamValueTxt`` without float noise (20.0 -> '20')."""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def fingerprint(cursor):
+    """``[[ExperimentID, count, checksum], ...]`` of the active experiment(s)."""
+    cursor.execute(FINGERPRINT_SQL)
+    return [[row[0], row[1], row[2]] for row in cursor.fetchall()]
+
+
+def fetch_by_name(cursor, names):
+    """``{name: value}`` through ``dbo.ReadExperimentParameter``, one call per name."""
+    params = {}
+    for name in names:
+        cursor.execute(READ_PARAMETER_SQL, (name,))
+        row = cursor.fetchone()
+        if row and row[0] is not None:
+            params[name] = to_value(name, row[0])
+    return params
+
+
+def fetch_active(cursor):
+    """Return ``(experiment_id, {name: value})`` for the active experiment in one query."""
+    cursor.execute(ACTIVE_PARAMETERS_SQL)
+    rows = cursor.fetchall()
+    experiment_ids = {row[0] for row in rows}
+    if len(experiment_ids) > 1:
+        raise ParameterError(f"More than one active experiment: {sorted(experiment_ids)}")
+    params = {str(name): to_value(str(name), text) for _, name, text in rows}
+    return (rows[0][0] if rows else None), params
+
+
+def load(cursor, ctx=None, required=()):
+    """Return ``{name: value}`` for the active experiment.
+
+    Args:
+        cursor: open EvoYeast cursor
+        ctx: RunContext to cache the parameters in for the run; None disables caching
+        required: names that must be present
+
+    Returns:
+        dict of typed parameter values
+    """
+    fp = fingerprint(cursor)
+    cached = ctx.extra.get(CACHE_KEY) if ctx is not None else None
+    if cached and cached.get("run_id") == ctx.run_id and cached.get("fingerprint") == fp:
+        params = dict(cached["values"])
+    elif len(fp) > 1:
+        # Which experiment wins is up to the SQL function, as before; nothing is cached.
+        params = fetch_by_name(cursor, list(DEFAULTS) + [n for n in required if n not in DEFAULTS])
+    else:
+        experiment_id, params = fetch_active(cursor)
+        if ctx is not None:
+            ctx.extra[CACHE_KEY] = {"run_id": ctx.run_id, "fingerprint": fp, "experiment_id": experiment_id,
+                                    "values": dict(params)}
+            ctx.save()
+
+    missing = [name for name in required if params.get(name) is None]
+    for name in missing:
+        # Not stored for the experiment; the SQL function may still supply a default.
+        cursor.execute(READ_PARAMETER_SQL, (name,))
+        row = cursor.fetchone()
+        if not row or row[0] is None:
+            raise ParameterError(f"Parameter {name} missing.")
+        params[name] = to_value(name, row[0])
+    return params
+
+
+def invalidate(ctx=None):
+    """Drop the cached parameters of ``ctx`` (default: the persisted context of the current run)."""
+    ctx = ctx if ctx is not None else run_context.read_cached()
+    if ctx is not None and ctx.extra.pop(CACHE_KEY, None) is not None:
+        ctx.save()
+
+
+def insert_parameters(cursor, experiment_id, parameters, ctx=None):
+    """Insert ``{name: value}`` for ``experiment_id`` with one set-based INSERT per 700 rows."""
+    rows = [(experiment_id, name, to_text(value)) for name, value in parameters.items()]
+    for start in range(0, len(rows), MAX_INSERT_ROWS):
+        chunk = rows[start:start + MAX_INSERT_ROWS]
+        values = ", ".join(["(?, ?, ?)"] * len(chunk))
+        cursor.execute(
+            f"INSERT INTO ExperimentParameters (ExperimentID, ParameterName, ParamValueTxt) VALUES {values}",
+            [v for row in chunk for v in row])
+    invalidate(ctx)
+    return len(rows)
@@ -0,0 +1,161 @@
+"""Gen5 fluorescence export ingestion with crosstalk compensation.
+
+Parses the reader exports written by ``SHOU_READFLUOESCENCE::ReadGFPandRFP``
+(one ``<well>\\t<value>`` record per line after the header lines) straight
+into NumPy arrays, bulk-loads the raw values into ImportFlEx482Em510 /
+ImportFlEx587Em611 and unmixes the channels with one matrix solve per plate.
+
+The mixing matrix is built from the experiment parameters: ``<F>_scale`` is
+fluorophore F's signal in its own channel and ``<F>_<C>damping`` its signal in
+channel C. For GFP/RFP that is::
+
+    [[GFP_scale,       RFP_GFPdamping],     measured GFP channel
+     [GFP_RFPdamping,  RFP_scale     ]]     measured RFP channel
+
+A third fluorophore (e.g. mOrange from ReadGFPandmOrange) only adds a
+``CHANNELS`` entry and its parameters; the matrix grows, the code does not.
+
+Usage from VENUS::
+
+    fluorescence.py PlateBarcode GFP=<export file> RFP=<export file>
+"""
+import os
+import sys
+
+import numpy as np
+
+import bulk_load
+import experiment_parameters
+import plate_array
+import run_context
+import runlog
+import telemetry
+from evo_db import establish_connection
+from plate_reader import ExportFormatError, read_export
+
+# Channel -> raw import table and its value column. Channels without a table
+# are compensated but their raw values are not stored.
+CHANNELS = {
+    "GFP": ("ImportFlEx482Em510", "FlEx482Em510"),
+    "RFP": ("ImportFlEx587Em611", "FlEx587Em611"),
+    "mOrange": (None, None),
+}
+
+# Optional table (PlateID, WellID, Fluorophore, Value, RunID) for compensated values.
+COMPENSATED_TABLE = os.environ.get("CHAMPIONS_COMPENSATED_TABLE")
+
+
+# === Parsing ===
+def read_plate(paths):
+    """Read one export per channel and align them on the first channel's wells.
+
+    Args:
+        paths: ``{channel: path}`` in channel order
+
+    Returns:
+        Tuple ``(channels, wells, raw)`` with ``raw`` shaped (channels, wells)
+    """
+    channels = list(paths)
+    wells, first = read_export(paths[channels[0]])
+    plate = plate_array.geometry(plate_array.infer_format(wells))
+    index = plate.indices(wells)
+    raw = np.empty((len(channels), len(wells)), dtype=np.float64)
+    raw[0] = first
+    for i, channel in enumerate(channels[1:], 1):
+        other_wells, other = read_export(paths[channel])
+        if other_wells == wells:
+            raw[i] = other
+            continue
+        aligned = np.full(plate.n_wells, np.nan)
+        aligned[plate.indices(other_wells)] = other
+        raw[i] = aligned[index]
+        missing = np.isnan(raw[i])
+        if missing.any():
+            raise ExportFormatError(f"{channel} export lacks wells {plate.well_names(index[missing][:5])}")
+    return channels, wells, raw
+
+
+# === Compensation ===
+def mixing_matrix(params, channels):
+    """Build the channel-by-fluorophore mixing matrix from experiment parameters."""
+    n = len(channels)
+    matrix = np.zeros((n, n), dtype=np.float64)
+    for j, fluor in enumerate(channels):
+        for i, channel in enumerate(channels):
+            name = f"{fluor}_scale" if i == j else f"{fluor}_{channel}damping"
+            value = params.get(name)
+            if value is None:
+                if i == j:
+                    raise KeyError(f"Missing compensation parameter {name}")
+                value = 0.0
+            matrix[i, j] = float(value)
+    return matrix
+
+
+def compensate(raw, matrix):
+    """Unmix ``raw`` (channels, wells) or a stack (plates, channels, wells) in one solve."""
+    unmix = np.linalg.inv(matrix)
+    return np.matmul(unmix, raw)
+
+
+# === Loading ===
+def raw_rows(plate_id, run_id, wells, values):
+    return [(plate_id, w, float(v), run_id) for w, v in zip(wells, values)]
+
+
+def compensated_rows(plate_id, run_id, channels, wells, values):
+    return [(plate_id, w, fluor, float(v), run_id)
+            for fluor, row in zip(channels, values)
+            for w, v in zip(wells, row)]
+
+
+def ingest(conn, plate_id, run_id, paths, params, compensated_table=None):
+    """Parse, compensate and bulk-load one plate.
+
+    Returns:
+        Tuple ``(wells, raw, compensated)``
+    """
+    channels, wells, raw = read_plate(paths)
+    comp = compensate(raw, mixing_matrix(params, channels))
+    for channel, values in zip(channels, raw):
+        table = CHANNELS.get(channel, (None, None))[0]
+        if table:
+            bulk_load.load(conn, table, raw_rows(plate_id, run_id, wells, values))
+    compensated_table = compensated_table or COMPENSATED_TABLE
+    if compensated_table:
+        bulk_load.load(conn, compensated_table, compensated_rows(plate_id, run_id, channels, wells, comp))
+    return wells, raw, comp
+
+
+# === Command line ===
+log = runlog.logger("fluorescence")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: fluorescence.py PlateBarcode CHANNEL=export_file [CHANNEL=export_file ...]")
+        sys.exit(1)
+    barcode = sys.argv[1]
+    try:
+        paths = dict(arg.split("=", 1) for arg in sys.argv[2:])
+        conn = establish_connection()
+        cursor = conn.cursor()
+        ctx = run_context.load(cursor)
+        cursor.execute("SELECT PlateID FROM Plates WHERE BarCode = ?", (barcode,))
+        row = cursor.fetchone()
+        if not row:
+            log(f"ERROR: No PlateID found for barcode {barcode}.")
+            sys.exit(1)
+        telemetry.set_tags(barcode=barcode, plate_id=row[0])
+        params = experiment_parameters.load(cursor, ctx)
+        wells, raw, _ = ingest(conn, row[0], ctx.run_id, paths, params)
+        conn.close()
+        log(f"Ingested {len(wells)} wells x {len(raw)} channels for plate {barcode}.")
+        sys.exit(0)
+    except Exception as e:
+        log(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
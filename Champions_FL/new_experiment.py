@@ -0,0 +1,135 @@
+"""Validation and set-based creation of new experiments.
+
+Shared by the StartNewExperiment_1 form and the headless
+StartNewExperiment_Batch script. A ``NewExperiment`` is checked completely
+before anything is written; ``create`` then needs one round trip per table::
+
+    spec = new_experiment.NewExperiment(user_id, barcode1, barcode2, pattern, parameters)
+    problems = spec.problems()
+    result = new_experiment.create(conn, spec, run_id)   # caller commits
+    conn.commit()
+
+The ExperimentID comes back from the INSERT itself (``OUTPUT INSERTED``)
+instead of a ``SELECT ... WHERE UserDefinedID = ?`` lookup, the parameters
+go in one multi-row INSERT and the plate pattern in one batched insert.
+"""
+import bulk_load
+import experiment_parameters
+
+INSERT_EXPERIMENT_SQL = ("INSERT INTO Experiments (UserDefinedID, Note, ScheduledToRun) "
+                         "OUTPUT INSERTED.ExperimentID VALUES (?, ?, ?)")
+NEW_EXPERIMENT_SQL = "EXEC SpatialEvo_NewExperiment @UserExpID = ?, @NewPlateBC = ?, @ExpandPlateBC = ?"
+CYTOMAT_POSITION_SQL = "SELECT dbo.QueryCytomatPosition(?)"
+
+
+class ExperimentError(Exception):
+    """Raised when the database rejects a new experiment."""
+
+
+class NewExperiment:
+    """Everything needed to create one experiment."""
+
+    def __init__(self, user_id, barcode1, barcode2, pattern, parameters=None, note="", schedule="0"):
+        self.user_id = str(user_id).strip()
+        self.barcode1 = str(barcode1).strip()
+        self.barcode2 = str(barcode2).strip()
+        self.pattern = pattern
+        self.parameters = dict(experiment_parameters.DEFAULTS, **(parameters or {}))
+        self.note = str(note or "").strip()
+        self.schedule = str(schedule or "0").strip()
+
+    def problems(self):
+        """List of what is wrong with this experiment (empty when it can be created)."""
+        problems = []
+        if not self.user_id:
+            problems.append("UserDefinedID is required")
+        if not self.barcode1 or not self.barcode2:
+            problems.append("both plate barcodes are required")
+        elif self.barcode1 == self.barcode2:
+            problems.append(f"new and expansion plate have the same barcode {self.barcode1}")
+        if self.schedule not in ("0", "1"):
+            problems.append(f"ScheduleToRun must be 0 or 1, not {self.schedule!r}")
+        if self.pattern is None:
+            problems.append("no well-assignment workbook")
+        problems += parameter_problems(self.parameters)
+        return problems
+
+
+def parameter_problems(parameters):
+    """Unknown names and values that are not numbers, or not valid for the parameter."""
+    problems = []
+    for name, value in parameters.items():
+        if name not in experiment_parameters.DEFAULTS:
+            problems.append(f"unknown parameter {name}")
+            continue
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            problems.append(f"{name} = {value!r} is not a number")
+            continue
+        if name in experiment_parameters.INT_PARAMETERS and not number.is_integer():
+            problems.append(f"{name} = {value!r} must be a whole number")
+        if name == "TopFractionToPropagate" and number not in experiment_parameters.TOP_FRACTIONS:
+            problems.append(f"TopFractionToPropagate must be one of "
+                            f"{', '.join(map(str, experiment_parameters.TOP_FRACTIONS))}")
+    return problems
+
+
+def existing(cursor, column_sql, values):
+    """Subset of ``values`` already present, with one ``IN`` query per 2000 values."""
+    values = sorted(set(values))
+    found = set()
+    for start in range(0, len(values), 2000):
+        chunk = values[start:start + 2000]
+        cursor.execute(column_sql.format(",".join("?" * len(chunk))), chunk)
+        found.update(str(row[0]) for row in cursor.fetchall())
+    return found
+
+
+def existing_experiments(cursor, user_ids):
+    return existing(cursor, "SELECT UserDefinedID FROM Experiments WHERE UserDefinedID IN ({})", user_ids)
+
+
+def existing_barcodes(cursor, barcodes):
+    return existing(cursor, "SELECT BarCode FROM Plates WHERE BarCode IN ({})", barcodes)
+
+
+def create(conn, spec, run_id):
+    """Create ``spec`` on ``conn`` without committing.
+
+    Args:
+        conn: open EvoYeast connection; the caller commits or rolls back
+        spec: validated NewExperiment
+        run_id: RunGUID stored with the ImportPlatePattern rows
+
+    Returns:
+        dict with ExperimentID, PlateID, CytomatPos, ExpansionCytomatPos
+        (None when the expansion plate has no position) and PatternRows
+    """
+    cursor = conn.cursor()
+    cursor.execute(INSERT_EXPERIMENT_SQL, (spec.user_id, spec.note, spec.schedule))
+    experiment_id = cursor.fetchone()[0]
+
+    parameters = {name: float(value) for name, value in spec.parameters.items()}
+    experiment_parameters.insert_parameters(cursor, experiment_id, parameters)
+
+    cursor.execute(NEW_EXPERIMENT_SQL, spec.user_id, spec.barcode1, spec.barcode2)
+    result = cursor.fetchone()
+    if not result or "DATABASE ERROR" in str(result[0]):
+        raise ExperimentError(f"SpatialEvo_NewExperiment failed for {spec.user_id}: "
+                              f"{result[0] if result else 'no result'}")
+    plate_id, cytomat_pos = result
+
+    cursor.execute(CYTOMAT_POSITION_SQL, (spec.barcode2,))
+    row = cursor.fetchone()
+    expansion_pos = row[0] if row else None
+
+    rows = spec.pattern.well_assignments(plate_id, run_id)
+    bulk_load.load_executemany(conn, "ImportPlatePattern", rows)
+    return {
+        "ExperimentID": experiment_id,
+        "PlateID": plate_id,
+        "CytomatPos": cytomat_pos,
+        "ExpansionCytomatPos": expansion_pos,
+        "PatternRows": len(rows),
+    }
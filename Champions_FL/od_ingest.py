@@ -0,0 +1,104 @@
+"""OD ingestion for ``SHOU_READOD::ReadOD_384Well_nOlID`` exports.
+
+Replaces the VENUS ReadAndStoreODs loop (read a record, subtract
+``BackgroundOD``, multiply by ``ODConversionFactor``, write a line, bcp the
+file) with one vectorized pass and an in-process bulk load into
+ImportSpatialEvoOD (PlateID, WellID, OD, RunID).
+
+Read positions are mapped back to source-plate wells. By default the reader
+well is the source well, as in the VENUS loop; with ``quadrant`` set, the
+reads of that quadrant of a 384-well plate (0 = A1, 1 = A2, 2 = B1, 3 = B2)
+are mapped back onto the 96-well source plate they were stamped from.
+
+Usage from VENUS::
+
+    od_ingest.py PlateBarcode <OdExportPath> [quadrant]
+"""
+import sys
+
+import numpy as np
+
+import bulk_load
+import experiment_parameters
+import plate_array
+import run_context
+import runlog
+import telemetry
+from evo_db import establish_connection
+from plate_reader import read_export
+
+OD_TABLE = "ImportSpatialEvoOD"
+
+
+def correct(raw, background, factor):
+    """Background-subtract and scale ODs in one pass; works on any array shape."""
+    return (np.asarray(raw, dtype=np.float64) - background) * factor
+
+
+def map_to_source(wells, quadrant=None):
+    """Return ``(source_wells, keep)`` for the reader ``wells``.
+
+    ``keep`` is a boolean mask of the reads that belong to the source plate.
+    """
+    if quadrant is None:
+        return list(wells), np.ones(len(wells), dtype=bool)
+    plate = plate_array.geometry(max(plate_array.infer_format(wells), 384))
+    index = plate.indices(wells)
+    rows, cols = plate.rows[index], plate.cols[index]
+    q_row, q_col = divmod(int(quadrant), 2)
+    keep = (rows % 2 == q_row) & (cols % 2 == q_col)
+    source = plate_array.geometry(plate.n_wells // 4)
+    source_index = (cols[keep] // 2) * source.n_rows + rows[keep] // 2
+    return [source.names[i] for i in source_index.tolist()], keep
+
+
+def od_rows(plate_id, run_id, wells, ods):
+    return [(plate_id, w, float(od), run_id) for w, od in zip(wells, ods)]
+
+
+def ingest(conn, plate_id, run_id, path, params, quadrant=None):
+    """Parse, correct, map and bulk-load one OD export.
+
+    Returns:
+        Tuple ``(source_wells, ods)``
+    """
+    wells, raw = read_export(path)
+    ods = correct(raw, params["BackgroundOD"], params["ODConversionFactor"])
+    source_wells, keep = map_to_source(wells, quadrant)
+    ods = ods[keep]
+    bulk_load.load(conn, OD_TABLE, od_rows(plate_id, run_id, source_wells, ods))
+    return source_wells, ods
+
+
+# === Command line ===
+log = runlog.logger("od_ingest")
+
+
+def main():
+    if len(sys.argv) < 3:
+        print("Usage: od_ingest.py PlateBarcode export_file [quadrant]")
+        sys.exit(1)
+    barcode, path = sys.argv[1], sys.argv[2]
+    quadrant = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    try:
+        conn = establish_connection()
+        cursor = conn.cursor()
+        ctx = run_context.load(cursor)
+        cursor.execute("SELECT PlateID FROM Plates WHERE BarCode = ?", (barcode,))
+        row = cursor.fetchone()
+        if not row:
+            log(f"ERROR: No PlateID found for barcode {barcode}.")
+            sys.exit(1)
+        telemetry.set_tags(barcode=barcode, plate_id=row[0])
+        params = experiment_parameters.load(cursor, ctx, required=("BackgroundOD", "ODConversionFactor"))
+        wells, ods = ingest(conn, row[0], ctx.run_id, path, params, quadrant)
+        conn.close()
+        log(f"Ingested {len(wells)} ODs for plate {barcode} (mean {ods.mean():.4f}).")
+        sys.exit(0)
+    except Exception as e:
+        log(f"Fatal error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Fixed-geometry plate data backed by one NumPy array.
+
+A ``PlateGeometry`` holds the precomputed well index of a plate format
+(96, 384 or 1536 wells). Wells are numbered column-major, A1, B1, ... H1, A2,
+the order Hamilton numbers labware positions and the order the simulation
+scripts have always generated, so index ``i`` is Hamilton position ``i + 1``.
+
+A ``PlateArray`` is a float array with the well axis last, so one plate is
+shape (wells,) and a stack of plates is (plates, wells). Wells without data
+hold NaN. Selecting wells is indexing with an integer array or a boolean
+mask instead of matching strings::
+
+    plate = PlateArray.from_records(wells, values, 96)
+    mask = plate.geometry.mask(existing_wells)
+    rows = plate.records(plate_id, run_id, mask)
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from plate_reader import parse_well, well_name
+
+# Wells -> (rows, columns)
+FORMATS = {
+    96: (8, 12),
+    384: (16, 24),
+    1536: (32, 48),
+}
+
+
+class PlateGeometry:
+    """Well names, row/column arrays and name -> index lookup for one format."""
+
+    def __init__(self, n_wells):
+        if n_wells not in FORMATS:
+            raise ValueError(f"Unsupported plate format: {n_wells} wells")
+        self.n_wells = n_wells
+        self.n_rows, self.n_cols = FORMATS[n_wells]
+        index = np.arange(n_wells)
+        self.cols, self.rows = np.divmod(index, self.n_rows)
+        self.names = tuple(well_name(r, c) for r, c in zip(self.rows.tolist(), self.cols.tolist()))
+        self._lookup = {name: i for i, name in enumerate(self.names)}
+
+    def __len__(self):
+        return self.n_wells
+
+    def __repr__(self):
+        return f"PlateGeometry({self.n_wells})"
+
+    def index_of(self, well):
+        """Index of an ``A1``-style address or a 1-based Hamilton position."""
+        well = str(well).strip().upper()
+        i = self._lookup.get(well)
+        if i is not None:
+            return i
+        if well.isdigit():
+            i = int(well) - 1
+        else:
+            row, col = parse_well(well)
+            i = col * self.n_rows + row if row < self.n_rows and col < self.n_cols else -1
+        if not 0 <= i < self.n_wells:
+            raise ValueError(f"Well {well!r} is not on a {self.n_wells}-well plate")
+        return i
+
+    def indices(self, wells):
+        """Integer index array for ``wells``."""
+        return np.fromiter((self.index_of(w) for w in wells), dtype=np.intp)
+
+    def mask(self, wells):
+        """Boolean mask that is True at ``wells``."""
+        mask = np.zeros(self.n_wells, dtype=bool)
+        mask[self.indices(wells)] = True
+        return mask
+
+    def well_names(self, selection=None):
+        """``A1``-style names of the wells picked by an index array or mask."""
+        if selection is None:
+            return list(self.names)
+        return [self.names[i] for i in np.arange(self.n_wells)[selection].tolist()]
+
+    def hamilton_positions(self, selection=None):
+        """1-based Hamilton position strings of the wells picked by ``selection``."""
+        index = np.arange(self.n_wells) if selection is None else np.arange(self.n_wells)[selection]
+        return [str(i + 1) for i in index.tolist()]
+
+    def quadrant(self, q):
+        """Indices of this 384/1536 plate that quadrant ``q`` (0 = A1, 1 = A2,
+        2 = B1, 3 = B2) stamps from the next smaller format, in source order."""
+        source = geometry(self.n_wells // 4)
+        q_row, q_col = divmod(int(q), 2)
+        return (source.cols * 2 + q_col) * self.n_rows + source.rows * 2 + q_row
+
+
+@lru_cache(maxsize=None)
+def geometry(n_wells=96):
+    """Shared geometry instance for a plate format."""
+    return PlateGeometry(n_wells)
+
+
+def infer_format(wells):
+    """Smallest plate format that holds every well in ``wells``."""
+    positions = [parse_well(w) for w in wells]
+    max_row = max(r for r, _ in positions)
+    max_col = max(c for _, c in positions)
+    for n_wells, (n_rows, n_cols) in sorted(FORMATS.items()):
+        if max_row < n_rows and max_col < n_cols:
+            return n_wells
+    raise ValueError(f"Wells do not fit any plate format (row {max_row + 1}, column {max_col + 1})")
+
+
+class PlateArray:
+    """Per-well values of one plate or a stack of plates (well axis last)."""
+
+    def __init__(self, values, geometry_or_format=96):
+        self.geometry = (geometry_or_format if isinstance(geometry_or_format, PlateGeometry)
+                         else geometry(geometry_or_format))
+        self.values = np.asarray(values, dtype=np.float64)
+        if self.values.shape[-1:] != (self.geometry.n_wells,):
+            raise ValueError(f"Expected {self.geometry.n_wells} wells on the last axis, "
+                             f"got shape {self.values.shape}")
+
+    @classmethod
+    def empty(cls, n_wells=96, plates=None):
+        shape = (n_wells,) if plates is None else (plates, n_wells)
+        return cls(np.full(shape, np.nan), n_wells)
+
+    @classmethod
+    def from_records(cls, wells, values, n_wells=None):
+        """Place ``values`` at ``wells``; wells not listed stay NaN."""
+        wells = list(wells)
+        plate = cls.empty(n_wells or infer_format(wells))
+        plate.values[plate.geometry.indices(wells)] = np.asarray(values, dtype=np.float64)
+        return plate
+
+    def __len__(self):
+        return self.geometry.n_wells
+
+    def __getitem__(self, well):
+        return self.values[..., self.geometry.index_of(well)]
+
+    def __setitem__(self, well, value):
+        self.values[..., self.geometry.index_of(well)] = value
+
+    def filled(self):
+        """Mask of wells that hold a value."""
+        return ~np.isnan(self.values)
+
+    def select(self, mask=None):
+        """``(wells, values)`` for the wells in ``mask`` (default: all filled wells)."""
+        mask = self.filled() if mask is None else np.asarray(mask, dtype=bool) & self.filled()
+        if self.values.ndim != 1:
+            raise ValueError("select() works on a single plate; index the stack first")
+        return self.geometry.well_names(mask), self.values[mask]
+
+    def records(self, plate_id, run_id, mask=None):
+        """``(plate_id, well, value, run_id)`` rows, the layout of the Import tables."""
+        wells, values = self.select(mask)
+        return [(plate_id, w, v, run_id) for w, v in zip(wells, values.tolist())]
@@ -0,0 +1,154 @@
+"""Plate-chain retrieval and culture validation for the continue-experiment steps.
+
+``validate_chain`` checks every plate of the chain with
+``dbo.Competition_SelectCultures`` in one of three modes:
+
+- ``batch``: all EXECs go to the server as one batch (one round trip per
+  ``BATCH_SIZE`` plates); each result is preceded by a marker row naming the
+  barcode so the result sets can be matched back.
+- ``parallel``: the calls fan out over ``WORKERS`` pooled connections.
+- ``serial``: one call after another, as before.
+
+Results are returned in chain order. The fetched culture rows are kept in
+``<run_id>_Cultures.json`` so the platechain step can reuse them.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from evo_db import ProgrammingError, establish_connection
+
+MODE = os.environ.get("CHAMPIONS_VALIDATION_MODE", "batch")
+WORKERS = int(os.environ.get("CHAMPIONS_VALIDATION_WORKERS", "4"))
+BATCH_SIZE = 50
+CULTURES_FILE = "Cultures.json"
+
+SELECT_CULTURES_SQL = "EXEC dbo.Competition_SelectCultures @Barcode = ?, @RunID = ?"
+MARKER_COLUMN = "ChainBarcode"
+
+
+def retrieve_plate_chain(cursor):
+    """Return ``[[barcode, cytomat_pos], ...]`` from ``dbo.Evo_RetrievePlateChain``.
+
+    The ancestor comes from the first result set, descendants from the second.
+    """
+    cursor.execute("EXEC dbo.Evo_RetrievePlateChain")
+    chain = [[str(r[0]), str(r[1])] for r in cursor.fetchall() if r and r[0]]
+    if cursor.nextset():
+        chain += [[str(r[0]), str(r[1])] for r in cursor.fetchall() if r and r[0]]
+    return chain
+
+
+def _select_cultures(cursor, barcode, run_id):
+    cursor.execute(SELECT_CULTURES_SQL, [barcode, run_id])
+    try:
+        return [tuple(row) for row in cursor.fetchall()]
+    except ProgrammingError:
+        # The procedure returned no result set at all.
+        return []
+
+
+def _validate_serial(cursor, barcodes, run_id):
+    return [_select_cultures(cursor, bc, run_id) for bc in barcodes]
+
+
+def _validate_batch(cursor, barcodes, run_id):
+    results = {}
+    for start in range(0, len(barcodes), BATCH_SIZE):
+        chunk = barcodes[start:start + BATCH_SIZE]
+        sql = ["SET NOCOUNT ON;"]
+        params = []
+        for bc in chunk:
+            sql.append(f"SELECT ? AS {MARKER_COLUMN};")
+            sql.append(SELECT_CULTURES_SQL + ";")
+            params += [bc, bc, run_id]
+        cursor.execute("\n".join(sql), params)
+
+        current = None
+        while True:
+            if cursor.description is not None:
+                if cursor.description[0][0] == MARKER_COLUMN:
+                    current = str(cursor.fetchone()[0])
+                    results[current] = []
+                elif current is not None:
+                    results[current] += [tuple(row) for row in cursor.fetchall()]
+            if not cursor.nextset():
+                break
+    return [results.get(bc, []) for bc in barcodes]
+
+
+def _validate_one(barcode, run_id):
+    conn = establish_connection()
+    try:
+        return _select_cultures(conn.cursor(), barcode, run_id)
+    finally:
+        conn.close()
+
+
+def _validate_parallel(barcodes, run_id, workers):
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(barcodes)))) as pool:
+        # map() yields in submission order, which keeps the chain order.
+        return list(pool.map(lambda bc: _validate_one(bc, run_id), barcodes))
+
+
+def validate_chain(cursor, chain, run_id, mode=None, workers=None):
+    """Fetch the cultures of every plate in ``chain``.
+
+    Args:
+        cursor: open EvoYeast cursor (used by ``batch`` and ``serial``)
+        chain: ``[[barcode, cytomat_pos], ...]`` as from :func:`retrieve_plate_chain`
+        run_id: current RunGUID
+        mode: ``batch``, ``parallel`` or ``serial``; defaults to ``CHAMPIONS_VALIDATION_MODE``
+        workers: connections used by ``parallel``
+
+    Returns:
+        Tuple ``(valid_chain, cultures)``: the entries of ``chain`` that have
+        culture data, in chain order, and ``{barcode: rows}`` for all plates.
+    """
+    mode = mode or MODE
+    barcodes = [bc for bc, _ in chain]
+    if not barcodes:
+        return [], {}
+    if mode == "batch":
+        rows = _validate_batch(cursor, barcodes, run_id)
+    elif mode == "parallel":
+        rows = _validate_parallel(barcodes, run_id, workers or WORKERS)
+    elif mode == "serial":
+        rows = _validate_serial(cursor, barcodes, run_id)
+    else:
+        raise ValueError(f"Unknown validation mode: {mode}")
+
+    cultures = dict(zip(barcodes, rows))
+    valid = [entry for entry, found in zip(chain, rows) if found]
+    return valid, cultures
+
+
+# === Culture cache ===
+def _json_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def save_cultures(ctx, cultures):
+    """Store ``{barcode: rows}`` for the current run next to its task files."""
+    data = {bc: [[_json_value(v) for v in row] for row in rows] for bc, rows in cultures.items()}
+    path = ctx.task_file(CULTURES_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+    return path
+
+
+def load_cultures(ctx, barcode):
+    """Rows fetched for ``barcode`` earlier in this run, or None if not cached."""
+    try:
+        with open(ctx.task_file(CULTURES_FILE)) as f:
+            rows = json.load(f).get(barcode)
+    except (OSError, ValueError):
+        return None
+    return [tuple(row) for row in rows] if rows else None
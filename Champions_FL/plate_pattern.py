@@ -0,0 +1,218 @@
+"""Validated, content-addressed cache of well-assignment workbooks.
+
+Labs reuse a handful of workbooks, so the Destination/Source/Vol table of a
+workbook is parsed and validated once and stored under the SHA-256 of the
+file's bytes in ``<EVO_TASK_DIR>\\pattern_cache\\<digest>.json``::
+
+    pattern = plate_pattern.load(excel_file)        # raises PatternError
+    rows = pattern.well_assignments(plate_id, run_id)  # ImportPlatePattern
+    text = pattern.fluid_pattern_csv()                 # VENUS transfer loop
+
+The same bytes always give the same digest, so a renamed or copied workbook
+is a cache hit and an edited one is a miss. The cache keeps the
+``CHAMPIONS_PATTERN_CACHE_SIZE`` (default 32) most recently used entries.
+
+Validation happens before any database write: every row needs a
+Destination and a Source, Destination wells must be on the plate and appear
+once, and Vol must be a non-negative number (blank reads as 0, as in the
+VENUS loop).
+"""
+import hashlib
+import json
+import os
+import sys
+
+import task_files
+import xlsx_reader
+from run_context import TASK_DIR
+
+CACHE_DIR = os.environ.get("CHAMPIONS_PATTERN_CACHE", os.path.join(TASK_DIR, "pattern_cache"))
+CACHE_SIZE = int(os.environ.get("CHAMPIONS_PATTERN_CACHE_SIZE", "32"))
+# Bump when the parsing or validation rules change; older entries are re-parsed.
+FORMAT_VERSION = 1
+
+COLUMNS = ("Destination", "Source", "Vol")
+MEDIA_SOURCE = "T"
+
+
+class PatternError(ValueError):
+    """Raised when a workbook is not a valid well-assignment sheet."""
+
+
+class PlatePattern:
+    """Destination/Source/Vol table of one workbook."""
+
+    def __init__(self, digest, n_wells, destination, source, vol, source_file=None):
+        self.digest = digest
+        self.n_wells = n_wells
+        self.destination = tuple(destination)
+        self.source = tuple(source)
+        self.vol = tuple(vol)
+        self.source_file = source_file
+
+    def __len__(self):
+        return len(self.destination)
+
+    def well_assignments(self, plate_id, run_id):
+        """``(PlateID, WellID, RunID, WellAssign)`` rows for ImportPlatePattern."""
+        return [(plate_id, well, run_id, "MediaCtrl" if src == MEDIA_SOURCE else "Cells")
+                for well, src in zip(self.destination, self.source)]
+
+    def fluid_pattern_csv(self):
+        """The table as CSV with the Excel sheet's headers, for ``filFluidPatterns``."""
+        lines = [",".join(COLUMNS)]
+        lines += [f"{d},{s},{v:g}" for d, s, v in zip(self.destination, self.source, self.vol)]
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self):
+        return {
+            "version": FORMAT_VERSION,
+            "digest": self.digest,
+            "n_wells": self.n_wells,
+            "source_file": self.source_file,
+            "destination": list(self.destination),
+            "source": list(self.source),
+            "vol": list(self.vol),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["digest"], data["n_wells"], data["destination"], data["source"],
+                   data["vol"], data.get("source_file"))
+
+
+def file_digest(path):
+    """SHA-256 of the file's bytes."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def validate(rows, digest=None, source_file=None):
+    """Build a ``PlatePattern`` from ``(Destination, Source, Vol)`` rows or raise ``PatternError``."""
+    import plate_array
+
+    if not rows:
+        raise PatternError("Workbook has no Destination/Source rows")
+    destination, source, vol = [], [], []
+    for i, (dest, src, v) in enumerate(rows, start=1):
+        dest, src = str(dest).strip(), str(src).strip()
+        if v is None or v == "":
+            v = 0.0
+        try:
+            v = float(v)
+        except (TypeError, ValueError):
+            raise PatternError(f"Row {i} ({dest}): Vol {v!r} is not a number") from None
+        if v < 0:
+            raise PatternError(f"Row {i} ({dest}): Vol {v:g} is negative")
+        destination.append(dest)
+        source.append(src)
+        vol.append(v)
+
+    try:
+        n_wells = plate_array.infer_format(destination)
+        plate_array.geometry(n_wells).indices(destination)
+    except ValueError as e:
+        raise PatternError(str(e)) from None
+    seen = set()
+    duplicates = sorted({d for d in destination if d in seen or seen.add(d)})
+    if duplicates:
+        raise PatternError(f"Destination wells assigned more than once: {', '.join(duplicates)}")
+    return PlatePattern(digest, n_wells, destination, source, vol, source_file)
+
+
+# === Cache ===
+def _entry_path(digest, cache_dir):
+    return os.path.join(cache_dir, f"{digest}.json")
+
+
+def _read_entry(digest, cache_dir):
+    path = _entry_path(digest, cache_dir)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != FORMAT_VERSION or data.get("digest") != digest:
+        return None
+    try:
+        os.utime(path)  # LRU order is the files' mtime
+    except OSError:
+        pass
+    return PlatePattern.from_dict(data)
+
+
+def _evict(cache_dir, keep):
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(".json"):
+            path = os.path.join(cache_dir, name)
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+    entries.sort(reverse=True)
+    for _, path in entries[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load(path, cache_dir=None, cache_size=None):
+    """Validated pattern of the workbook at ``path``, from the cache when possible.
+
+    Args:
+        path: well-assignment workbook
+        cache_dir: cache folder (default ``CACHE_DIR``)
+        cache_size: entries to keep (default ``CACHE_SIZE``; 0 disables the cache)
+
+    Returns:
+        PlatePattern
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    cache_size = CACHE_SIZE if cache_size is None else cache_size
+    digest = file_digest(path)
+    if cache_size > 0:
+        cached = _read_entry(digest, cache_dir)
+        if cached is not None:
+            return cached
+
+    try:
+        rows = xlsx_reader.read_columns(path, list(COLUMNS), required=["Destination", "Source"])
+    except xlsx_reader.WorkbookError as e:
+        raise PatternError(str(e)) from None
+    pattern = validate(rows, digest, os.path.basename(path))
+
+    if cache_size > 0:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            task_files.write_atomic(_entry_path(digest, cache_dir),
+                                    json.dumps(pattern.to_dict(), separators=(",", ":")))
+            _evict(cache_dir, cache_size)
+        except OSError:
+            # A cache that cannot be written only costs the next parse.
+            pass
+    return pattern
+
+
+def main():
+    """``plate_pattern.py <workbook> [<out.csv>]``: validate and write the VENUS CSV."""
+    if len(sys.argv) < 2:
+        print("Usage: plate_pattern.py workbook [out.csv]")
+        sys.exit(1)
+    try:
+        pattern = load(sys.argv[1])
+    except (OSError, PatternError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    if len(sys.argv) > 2:
+        task_files.write_atomic(sys.argv[2], pattern.fluid_pattern_csv())
+    print(f"{len(pattern)} wells, {pattern.n_wells}-well plate, sha256 {pattern.digest}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Reader export parsing and well-address helpers shared by the ingestion stages.
+
+Gen5 exports written by the SHOU_READOD / SHOU_READFLUOESCENCE libraries hold
+a few header lines followed by one ``<well>\\t<value>`` record per well, which
+is what the VENUS import loops read (value after the last tab).
+"""
+
+
+class ExportFormatError(Exception):
+    """Raised when a reader export cannot be parsed."""
+
+
+def parse_well(well):
+    """Return zero-based ``(row, col)`` for an address like ``A1``, ``P24`` or ``AF48``."""
+    well = well.strip().upper()
+    split = 0
+    while split < len(well) and well[split].isalpha():
+        split += 1
+    if split == 0 or split == len(well) or not well[split:].isdigit():
+        raise ValueError(f"Invalid well address: {well!r}")
+    row = 0
+    for ch in well[:split]:
+        row = row * 26 + (ord(ch) - ord("A") + 1)
+    return row - 1, int(well[split:]) - 1
+
+
+def row_letters(row):
+    letters = ""
+    row += 1
+    while row:
+        row, rem = divmod(row - 1, 26)
+        letters = chr(ord("A") + rem) + letters
+    return letters
+
+
+def well_name(row, col):
+    """Inverse of :func:`parse_well`."""
+    return f"{row_letters(row)}{col + 1}"
+
+
+def read_export(path):
+    """Return ``(wells, values)`` from one export file.
+
+    Header lines and blank lines are skipped; every other line must end in
+    ``\\t<number>`` with the well address before the last tab.
+    """
+    import numpy as np
+
+    wells = []
+    values = []
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            well, sep, value = line.rstrip("\r\n").rpartition("\t")
+            if not sep or not well.strip():
+                continue
+            try:
+                values.append(float(value))
+            except ValueError:
+                continue
+            wells.append(well.strip())
+    if not wells:
+        raise ExportFormatError(f"No well readings found in {path}")
+    return wells, np.asarray(values, dtype=np.float64)
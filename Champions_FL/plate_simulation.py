@@ -0,0 +1,169 @@
+"""Seeded, vectorized simulation of plate-reader data.
+
+Whole plates (or stacks of thousands of plates) of OD, GFP and RFP reads are
+drawn in a few NumPy calls from one ``numpy.random.Generator``, so the same
+seed always gives the same data::
+
+    sim = plate_simulation.simulate(plates=1, n_wells=96, seed=42, culture=mask)
+    sim["GFP"][0]      # PlateArray-ready values of the first plate
+
+The model, per well:
+
+- growth: logistic OD after ``hours`` from ``od0`` towards ``capacity`` with a
+  log-normally distributed growth rate per well,
+- fluorescence: each culture carries GFP and RFP in a random ratio; the
+  signal is proportional to OD and mixed into both channels with the same
+  ``<F>_scale`` / ``<F>_<C>damping`` matrix the compensation uses,
+- media controls (``WellAssign == "MediaCtrl"``) and empty wells contain no
+  cells: their OD is the media blank and their fluorescence the background,
+- noise: multiplicative well-to-well variation plus additive reader noise.
+
+Wells that are not in the plate pattern are returned as NaN (not read).
+
+Bulk mode writes reader exports for load-testing ``od_ingest`` and
+``fluorescence``::
+
+    plate_simulation.py --plates 5000 --wells 384 --seed 1 --out D:\\SimExports
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+import plate_array
+from fluorescence import mixing_matrix
+
+CHANNELS = ("GFP", "RFP")
+
+DEFAULTS = {
+    "od0": 0.05,
+    "capacity": 1.2,
+    "growth_rate": 0.45,        # 1/h, median
+    "growth_rate_sigma": 0.25,  # log-normal spread between wells
+    "hours": 12.0,
+    "media_blank_od": 0.04,
+    "fluorescence_per_od": 400.0,
+    "fluorescence_background": 15.0,
+    "relative_noise": 0.05,
+    "od_read_noise": 0.005,
+    "fluorescence_read_noise": 3.0,
+    # Compensation parameters (see fluorescence.mixing_matrix)
+    "GFP_scale": 1.0,
+    "RFP_scale": 1.0,
+    "GFP_RFPdamping": 0.08,
+    "RFP_GFPdamping": 0.03,
+}
+
+PATTERN_SQL = "SELECT WellID, WellAssign FROM ImportPlatePattern WHERE PlateID = ?"
+
+
+def fetch_pattern(cursor, plate_id, n_wells=None):
+    """Culture and media-control masks from ImportPlatePattern.
+
+    The plate format is taken from the pattern unless ``n_wells`` is given. A
+    plate without pattern rows is treated as all culture wells (96 by default).
+    """
+    cursor.execute(PATTERN_SQL, (plate_id,))
+    rows = cursor.fetchall()
+    plate = plate_array.geometry(n_wells or (plate_array.infer_format(str(r[0]) for r in rows) if rows else 96))
+    if not rows:
+        return np.ones(plate.n_wells, dtype=bool), np.zeros(plate.n_wells, dtype=bool)
+    media = [str(r[0]).strip() for r in rows if str(r[1]).strip() == "MediaCtrl"]
+    cells = [str(r[0]).strip() for r in rows if str(r[1]).strip() != "MediaCtrl"]
+    return plate.mask(cells), plate.mask(media)
+
+
+def simulate(plates=1, n_wells=96, seed=None, culture=None, media=None, params=None, rng=None):
+    """Simulate ``plates`` plates in one pass.
+
+    Args:
+        plates: number of plates
+        n_wells: plate format (96, 384 or 1536)
+        seed: seed for ``numpy.random.default_rng``; ignored when ``rng`` is given
+        culture: mask of culture wells, (wells,) or (plates, wells); default all
+        media: mask of media-control wells
+        params: overrides for ``DEFAULTS``
+
+    Returns:
+        dict with "OD", "GFP" and "RFP" arrays shaped (plates, wells)
+    """
+    p = dict(DEFAULTS, **(params or {}))
+    rng = rng if rng is not None else np.random.default_rng(seed)
+    shape = (plates, plate_array.geometry(n_wells).n_wells)
+    culture = np.broadcast_to(np.ones(shape[1], dtype=bool) if culture is None
+                              else np.asarray(culture, dtype=bool), shape)
+    media = np.broadcast_to(np.zeros(shape[1], dtype=bool) if media is None
+                            else np.asarray(media, dtype=bool), shape)
+    culture = culture & ~media
+
+    # Growth
+    rate = p["growth_rate"] * rng.lognormal(0.0, p["growth_rate_sigma"], shape)
+    od0, cap = p["od0"], p["capacity"]
+    od = cap / (1.0 + (cap - od0) / od0 * np.exp(-rate * p["hours"]))
+    od = np.where(culture, od, 0.0)
+
+    # Fluorophore content, mixed into the reader channels
+    gfp_share = rng.beta(2.0, 2.0, shape)
+    fluor = np.stack([gfp_share, 1.0 - gfp_share]) * od * p["fluorescence_per_od"]
+    fluor *= rng.lognormal(0.0, p["relative_noise"], fluor.shape)
+    channels = np.einsum("ij,jpw->ipw", mixing_matrix(p, CHANNELS), fluor)
+    channels += p["fluorescence_background"]
+    channels += rng.normal(0.0, p["fluorescence_read_noise"], channels.shape)
+
+    od = (od * rng.lognormal(0.0, p["relative_noise"], shape) + p["media_blank_od"]
+          + rng.normal(0.0, p["od_read_noise"], shape))
+
+    # Wells outside the plate pattern are not read
+    read = culture | media
+    result = {"OD": np.where(read, np.maximum(od, 0.0), np.nan)}
+    for name, values in zip(CHANNELS, channels):
+        result[name] = np.where(read, np.maximum(values, 0.0), np.nan)
+    return result
+
+
+def iter_plates(total, n_wells=96, seed=None, chunk=500, **kwargs):
+    """Yield ``simulate`` results of at most ``chunk`` plates until ``total`` are made.
+
+    One generator is shared across chunks, so the plates depend only on the
+    seed and the chunk size.
+    """
+    rng = np.random.default_rng(seed)
+    done = 0
+    while done < total:
+        n = min(chunk, total - done)
+        yield simulate(n, n_wells, rng=rng, **kwargs)
+        done += n
+
+
+def write_export(path, wells, values):
+    """Write one reader export in the format ``plate_reader.read_export`` parses."""
+    lines = ["Simulated read", "Well\tValue"]
+    lines += [f"{w}\t{v:.6f}" for w, v in zip(wells, values) if not np.isnan(v)]
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write simulated reader exports for load tests.")
+    parser.add_argument("--plates", type=int, default=1000)
+    parser.add_argument("--wells", type=int, default=96, choices=sorted(plate_array.FORMATS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk", type=int, default=500)
+    parser.add_argument("--out", required=True, help="Folder for the export files")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    names = plate_array.geometry(args.wells).names
+    n = 0
+    for sim in iter_plates(args.plates, args.wells, args.seed, args.chunk):
+        for i in range(len(sim["OD"])):
+            n += 1
+            for channel, values in sim.items():
+                write_export(os.path.join(args.out, f"SIM{n:06d}_{channel}.txt"), names, values[i])
+    print(f"Wrote {n} plates x {len(CHANNELS) + 1} exports to {args.out}")
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
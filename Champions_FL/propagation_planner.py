@@ -0,0 +1,155 @@
+"""Local propagation planner mirroring ``dbo.Champions_CommencePropagationFl``.
+
+Given the ODs of a plate (or a stack of plates) and the experiment
+parameters, the planner
+
+1. ranks the valid culture wells by score and keeps the top
+   ``TopFractionToPropagate`` of them (at least one well); the "Fl" procedure
+   ranks by fluorescence, see ``fetch_plate_scores``,
+2. dilutes each kept culture to ``InoculationOD`` in ``TargetWellVolume``:
+   ``culture = InoculationOD * TargetWellVolume / OD``, capped at the volume
+   left after the ``V_OD_Sample`` was taken; ``media = TargetWellVolume - culture``.
+
+Everything is array arithmetic, so many plates are planned in one call::
+
+    plan = propagation_planner.plan_plates(ods, params, scores, valid=mask)
+
+``compare`` diffs a plan against the rows the stored procedure returned
+(``row[3]`` well, ``row[4]`` culture volume, ``row[5]`` media volume) so the
+planner can be checked in parity mode before it is trusted. Wells are matched
+by their position on the plate, so ``A1``, ``A01`` and Hamilton position ``1``
+are the same well.
+"""
+import math
+
+import numpy as np
+
+import plate_array
+from plate_array import PlateArray
+
+# ImportSpatialEvoOD as written by the VENUS OD import: PlateID, WellID, OD, RunID.
+PLATE_ODS_SQL = "SELECT WellID, OD FROM ImportSpatialEvoOD WHERE PlateID = ? AND RunID = ?"
+# The selection score: the GFP reading (Ex482/Em510) of the same run.
+PLATE_SCORES_SQL = "SELECT WellID, FlEx482Em510 FROM ImportFlEx482Em510 WHERE PlateID = ? AND RunID = ?"
+
+VOLUME_TOLERANCE = 0.5  # uL
+
+
+class PropagationPlan:
+    """Per-well plan for one or more plates; all arrays share the ODs' shape."""
+
+    def __init__(self, selected, culture_vol, media_vol, wells=None):
+        self.selected = selected
+        self.culture_vol = culture_vol
+        self.media_vol = media_vol
+        self.wells = wells
+
+    def rows(self, plate=None):
+        """``(well, culture_vol, media_vol)`` for the selected wells of one plate."""
+        selected = self.selected if plate is None else self.selected[plate]
+        culture = self.culture_vol if plate is None else self.culture_vol[plate]
+        media = self.media_vol if plate is None else self.media_vol[plate]
+        idx = np.flatnonzero(selected)
+        return [(self.wells[i] if self.wells is not None else int(i), float(culture[i]), float(media[i]))
+                for i in idx]
+
+
+def select_top_fraction(scores, valid, fraction):
+    """Boolean mask of the top ``fraction`` of valid wells along the last axis."""
+    scores = np.asarray(scores, dtype=np.float64)
+    valid = np.broadcast_to(np.asarray(valid, dtype=bool), scores.shape)
+    n_valid = valid.sum(axis=-1, keepdims=True)
+    keep = np.where(n_valid > 0, np.maximum(1, np.ceil(n_valid * fraction - 1e-9)), 0)
+    # Invalid wells sort last; a stable sort keeps plate order on ties.
+    ranked = np.where(valid, -scores, np.inf)
+    order = np.argsort(ranked, axis=-1, kind="stable")
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.arange(scores.shape[-1]), axis=-1)
+    return valid & (rank < keep)
+
+
+def dilution_volumes(ods, target_vol, inoculation_od, sample_vol=0.0):
+    """Culture and media volumes that bring each well to ``inoculation_od``."""
+    ods = np.asarray(ods, dtype=np.float64)
+    available = max(target_vol - sample_vol, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        culture = np.where(ods > 0, inoculation_od * target_vol / ods, available)
+    culture = np.clip(culture, 0.0, min(available, target_vol))
+    return culture, target_vol - culture
+
+
+def plan_plates(ods, params, scores, valid=None, correction=None, wells=None):
+    """Plan propagation for ``ods`` shaped (wells,) or (plates, wells).
+
+    Args:
+        ods: measured ODs (already background-corrected and converted)
+        params: experiment parameters (TargetWellVolume, InoculationOD,
+            TopFractionToPropagate, V_OD_Sample)
+        scores: ranking values, e.g. from ``fetch_plate_scores``; wells
+            without a score (NaN) are never selected
+        valid: mask of culture wells; NaN ODs are never valid
+        correction: per-well correction factor applied to the ODs
+        wells: well names matching the last axis
+
+    Returns:
+        PropagationPlan
+    """
+    ods = np.asarray(ods, dtype=np.float64)
+    if correction is not None:
+        ods = ods * np.asarray(correction, dtype=np.float64)
+    scores = np.asarray(scores, dtype=np.float64)
+    mask = ~np.isnan(ods) & ~np.isnan(scores)
+    if valid is not None:
+        mask &= np.asarray(valid, dtype=bool)
+
+    selected = select_top_fraction(scores, mask, float(params["TopFractionToPropagate"]))
+    culture, media = dilution_volumes(np.where(selected, ods, np.nan),
+                                      float(params["TargetWellVolume"]),
+                                      float(params["InoculationOD"]),
+                                      float(params.get("V_OD_Sample") or 0.0))
+    culture = np.where(selected, culture, 0.0)
+    media = np.where(selected, media, 0.0)
+    return PropagationPlan(selected, culture, media, wells)
+
+
+def fetch_plate_ods(cursor, plate_id, run_id, n_wells=None):
+    """Return the ODs of one plate of the current run as a PlateArray (NaN = not read)."""
+    cursor.execute(PLATE_ODS_SQL, (plate_id, run_id))
+    rows = cursor.fetchall()
+    return PlateArray.from_records([str(r[0]).strip() for r in rows], [float(r[1]) for r in rows], n_wells)
+
+
+def fetch_plate_scores(cursor, plate_id, run_id, geometry):
+    """Return the selection scores of one plate aligned on ``geometry`` (NaN = not read).
+
+    Returns None when the plate has no fluorescence reading in the run.
+    """
+    cursor.execute(PLATE_SCORES_SQL, (plate_id, run_id))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    scores = np.full(geometry.n_wells, np.nan)
+    scores[geometry.indices(str(r[0]).strip() for r in rows)] = [float(r[1]) for r in rows]
+    return scores
+
+
+def compare(plan, sp_rows, tolerance=VOLUME_TOLERANCE):
+    """Differences between a one-plate ``plan`` and the stored procedure's rows.
+
+    Returns:
+        list of human-readable difference strings; empty when they agree
+    """
+    geometry = plate_array.geometry(plan.selected.shape[-1])
+    local = {int(i): (float(plan.culture_vol[i]), float(plan.media_vol[i]))
+             for i in np.flatnonzero(plan.selected)}
+    remote = {geometry.index_of(r[3]): (float(r[4]), float(r[5])) for r in sp_rows}
+    diffs = []
+    for i in sorted(set(remote) - set(local)):
+        diffs.append(f"{geometry.names[i]}: selected by SP only")
+    for i in sorted(set(local) - set(remote)):
+        diffs.append(f"{geometry.names[i]}: selected by planner only")
+    for i in sorted(set(local) & set(remote)):
+        (lc, lm), (rc, rm) = local[i], remote[i]
+        if not (math.isclose(lc, rc, abs_tol=tolerance) and math.isclose(lm, rm, abs_tol=tolerance)):
+            diffs.append(f"{geometry.names[i]}: culture {lc:.2f} vs {rc:.2f}, media {lm:.2f} vs {rm:.2f}")
+    return diffs
@@ -0,0 +1,195 @@
+"""Run context shared by all Champions_FL scripts of one VENUS run.
+
+The latest RunGUID is resolved once, either from VENUS (``CHAMPIONS_RUN_ID``,
+the method's ``Run_id``) or from ``HamiltonVectorDB.dbo.HxRun``, and stored in
+``C:\\EvoTaskFiles\\current_run.json`` together with the task-file paths
+derived from it. Later scripts read that file instead of scanning HxRun::
+
+    ctx = run_context.load(cursor)
+    run_id = ctx.run_id
+    path = ctx.task_file("PlateChainChecked.txt")
+
+A cached context is checked against HxRun with a ``StartTime >`` probe, which
+only touches rows newer than the cached run, so a new VENUS run is picked up
+without reading the whole table. With ``CHAMPIONS_RUN_ID`` set there is no
+probe at all. ``CHAMPIONS_RUN_RECHECK=<seconds>`` (default 0) skips the probe
+for that long after the run was resolved; only use it when runs cannot start
+back to back.
+"""
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+import common_path  # noqa: F401  (shared modules)
+import runlog
+import telemetry
+
+TASK_DIR = os.environ.get("EVO_TASK_DIR", r"C:\EvoTaskFiles")
+CONTEXT_FILE = "current_run.json"
+RUN_ID_ENV = "CHAMPIONS_RUN_ID"
+
+# A VENUS run never lasts this long; older contexts are always re-resolved.
+MAX_AGE = 24 * 3600
+# Seconds after resolving a run during which the HxRun probe is skipped (0 = always probe).
+RECHECK_AFTER = float(os.environ.get("CHAMPIONS_RUN_RECHECK", "0"))
+
+LATEST_RUN_SQL = "SELECT TOP 1 RunGUID, StartTime FROM HamiltonVectorDB.dbo.HxRun ORDER BY StartTime DESC"
+NEWER_RUN_SQL = ("SELECT TOP 1 RunGUID, StartTime FROM HamiltonVectorDB.dbo.HxRun "
+                 "WHERE StartTime > ? ORDER BY StartTime DESC")
+
+# Per-run files the scripts and the VENUS method exchange.
+TASK_FILES = (
+    "PlateID.txt",
+    "CytomatPos.txt",
+    "ExpansionCytomatPos.txt",
+    "PlateChainChecked.txt",
+    "CultureVol.txt",
+    "MediaVol.txt",
+    "SpillOverPlate_Positions.txt",
+    "SpatialOverPlate_Positions.txt",
+    "AddPlate.txt",
+    "FluidPattern.csv",
+)
+
+
+class RunContextError(Exception):
+    """Raised when no run can be resolved."""
+
+
+class RunContext:
+    """RunGUID of the current VENUS run plus its derived task-file paths."""
+
+    def __init__(self, run_id, start_time=None, source="HxRun", resolved_at=None,
+                 task_dir=TASK_DIR, extra=None):
+        self.run_id = str(run_id)
+        self.start_time = start_time
+        self.source = source
+        self.resolved_at = resolved_at if resolved_at is not None else time.time()
+        self.task_dir = task_dir
+        # Run-scoped values other modules cache alongside the run id.
+        self.extra = extra if extra is not None else {}
+
+    def task_file(self, name):
+        return os.path.join(self.task_dir, f"{self.run_id}_{name}")
+
+    @property
+    def paths(self):
+        return {name: self.task_file(name) for name in TASK_FILES}
+
+    def to_dict(self):
+        return {
+            "run_id": self.run_id,
+            "start_time": self.start_time,
+            "source": self.source,
+            "resolved_at": self.resolved_at,
+            "task_dir": self.task_dir,
+            "paths": self.paths,
+            "extra": self.extra,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["run_id"], data.get("start_time"), "cache", data.get("resolved_at"),
+                   data.get("task_dir", TASK_DIR), data.get("extra"))
+
+    def save(self):
+        """Write the context atomically so concurrent readers never see half a file."""
+        os.makedirs(self.task_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.task_dir, prefix=".current_run_", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.to_dict(), f, indent=1)
+            os.replace(tmp, context_path(self.task_dir))
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+
+
+def context_path(task_dir=TASK_DIR):
+    return os.path.join(task_dir, CONTEXT_FILE)
+
+
+def read_cached(task_dir=TASK_DIR):
+    """Return the persisted context, or None if there is none or it is unreadable."""
+    try:
+        with open(context_path(task_dir)) as f:
+            return RunContext.from_dict(json.load(f))
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _start_time_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    return None if value is None else str(value)
+
+
+def _start_time_param(text):
+    try:
+        return datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return text
+
+
+def resolve_latest(cursor, task_dir=TASK_DIR):
+    """Look up the latest run in HxRun, persist it and return it."""
+    cursor.execute(LATEST_RUN_SQL)
+    row = cursor.fetchone()
+    if not row:
+        raise RunContextError("No RunGUID found in HxRun.")
+    ctx = RunContext(row[0], _start_time_text(row[1]), "HxRun", task_dir=task_dir)
+    ctx.save()
+    return ctx
+
+
+def is_stale(ctx, cursor=None, max_age=MAX_AGE, recheck_after=RECHECK_AFTER):
+    """True if ``ctx`` is too old or HxRun holds a run started after it."""
+    now = time.time()
+    if now - ctx.resolved_at > max_age:
+        return True
+    if cursor is None or ctx.start_time is None or now - ctx.resolved_at < recheck_after:
+        return False
+    cursor.execute(NEWER_RUN_SQL, (_start_time_param(ctx.start_time),))
+    return cursor.fetchone() is not None
+
+
+def load(cursor=None, run_id=None, task_dir=TASK_DIR, max_age=MAX_AGE):
+    """Return the context of the current run.
+
+    Args:
+        cursor: open EvoYeast cursor; needed to resolve or re-check the run
+        run_id: RunGUID handed over by VENUS; defaults to ``CHAMPIONS_RUN_ID``
+        task_dir: folder holding the per-run files
+        max_age: seconds after which a cached context is resolved again
+
+    Returns:
+        RunContext
+    """
+    ctx = _load(cursor, run_id, task_dir, max_age)
+    telemetry.set_tags(run_id=ctx.run_id)
+    runlog.set_run(ctx.run_id)
+    return ctx
+
+
+def _load(cursor, run_id, task_dir, max_age):
+    run_id = run_id or os.environ.get(RUN_ID_ENV)
+    cached = read_cached(task_dir)
+
+    if run_id:
+        # VENUS knows its own run; trust it and only rewrite on a change.
+        if cached is not None and cached.run_id.lower() == str(run_id).lower():
+            return cached
+        ctx = RunContext(run_id, source="VENUS", task_dir=task_dir)
+        ctx.save()
+        return ctx
+
+    if cached is not None and not is_stale(cached, cursor, max_age):
+        return cached
+    if cursor is None:
+        raise RunContextError("No current run context and no database cursor to resolve one.")
+    return resolve_latest(cursor, task_dir)
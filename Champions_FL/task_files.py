@@ -0,0 +1,143 @@
+"""Buffered, atomic writer for the per-run files VENUS reads from C:\\EvoTaskFiles.
+
+A step collects all of its outputs first and writes them at the end; each
+file is written with a single ``write`` to a temp file that is then renamed
+over the target, so VENUS never opens a half-written file::
+
+    out = task_files.TaskFileWriter(ctx)
+    out.add_lines("CultureVol.txt", culture_vol)
+    out.add_sequence("SpillOverPlate_Positions.txt", positions, labware, "seqSpillOverPlate")
+    out.commit()
+
+``commit(manifest=True)`` additionally writes ``<run_id>_<step>_Manifest.json``
+holding every output of the step in one file.
+
+``prune`` archives per-run files older than the retention period into one
+zip per month (or deletes them), so the folder stays small.
+"""
+import json
+import os
+import re
+import tempfile
+import time
+import zipfile
+
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+
+RETENTION_DAYS = int(os.environ.get("CHAMPIONS_TASKFILE_RETENTION_DAYS", "30"))
+MANIFEST = os.environ.get("CHAMPIONS_TASKFILE_MANIFEST", "0") == "1"
+
+# Layout every Hamilton sequence file refers to.
+LAYOUT_PATH = r"C:\PROGRAM FILES\HAMILTON\METHODS\LABPROTOCOLS\EXPERIMENTS\DECKS\SPATIALEVOLUTION3OD384WELL.LAY"
+SEQUENCE_HEADER = "Id,Layout,Sequence,Labware,Position\n"
+
+# Per-run files start with the RunGUID.
+_RUN_FILE = re.compile(r"^[0-9A-Fa-f]{8}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{4}-?[0-9A-Fa-f]{12}_")
+
+
+def write_atomic(path, text, newline=None):
+    """Write ``text`` to ``path`` in one call via temp file + rename.
+
+    ``newline`` is passed to ``open``: the default writes platform line
+    endings, ``""`` writes ``text`` unchanged (Hamilton sequence files).
+    """
+    directory = os.path.dirname(path) or "."
+    with telemetry.span("file_write"):
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".txt")
+        try:
+            with os.fdopen(fd, "w", newline=newline) as f:
+                f.write(text)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+    telemetry.count("file.bytes_written", len(text))
+
+
+def hamilton_sequence(positions, labware, sequence, layout=LAYOUT_PATH):
+    """Text of a Hamilton sequence import file (Id,Layout,Sequence,Labware,Position)."""
+    prefix = f"{layout},{sequence},{labware},"
+    return SEQUENCE_HEADER + "".join(f"{i},{prefix}{pos}\n" for i, pos in enumerate(positions, 1))
+
+
+class TaskFileWriter:
+    """Collects a step's output files and writes them together."""
+
+    def __init__(self, ctx, step=None):
+        self.ctx = ctx
+        self.step = step
+        self.outputs = {}
+        self.newlines = {}
+
+    def add(self, name, text, newline=None):
+        self.outputs[name] = text
+        self.newlines[name] = newline
+
+    def add_lines(self, name, values):
+        self.add(name, "\n".join(str(v) for v in values))
+
+    def add_sequence(self, name, positions, labware, sequence):
+        self.add(name, hamilton_sequence(positions, labware, sequence), newline="")
+
+    def commit(self, manifest=None):
+        """Write every buffered file; returns ``{name: path}``."""
+        manifest = MANIFEST if manifest is None else manifest
+        os.makedirs(self.ctx.task_dir, exist_ok=True)
+        written = {}
+        for name, text in self.outputs.items():
+            path = self.ctx.task_file(name)
+            write_atomic(path, text, self.newlines[name])
+            written[name] = path
+        if manifest:
+            name = f"{self.step}_Manifest.json" if self.step else "Manifest.json"
+            path = self.ctx.task_file(name)
+            write_atomic(path, json.dumps({"run_id": self.ctx.run_id, "step": self.step,
+                                           "files": self.outputs}, indent=1))
+            written[name] = path
+        self.outputs = {}
+        self.newlines = {}
+        return written
+
+
+def prune(task_dir, keep_days=None, compress=True, keep_run=None):
+    """Archive or delete per-run files older than ``keep_days``.
+
+    Args:
+        task_dir: the EvoTaskFiles folder
+        keep_days: retention in days; defaults to ``CHAMPIONS_TASKFILE_RETENTION_DAYS``
+        compress: add files to ``archive/EvoTaskFiles_<YYYYMM>.zip`` before removing them
+        keep_run: RunGUID whose files are never touched (the current run)
+
+    Returns:
+        number of files removed from ``task_dir``
+    """
+    keep_days = RETENTION_DAYS if keep_days is None else keep_days
+    cutoff = time.time() - keep_days * 86400
+    archives = {}
+    removed = 0
+    try:
+        with os.scandir(task_dir) as entries:
+            old = [e for e in entries
+                   if e.is_file() and _RUN_FILE.match(e.name)
+                   and not (keep_run and e.name.lower().startswith(str(keep_run).lower()))
+                   and e.stat().st_mtime < cutoff]
+        for entry in old:
+            if compress:
+                month = time.strftime("%Y%m", time.localtime(entry.stat().st_mtime))
+                if month not in archives:
+                    archive_dir = os.path.join(task_dir, "archive")
+                    os.makedirs(archive_dir, exist_ok=True)
+                    archives[month] = zipfile.ZipFile(
+                        os.path.join(archive_dir, f"EvoTaskFiles_{month}.zip"), "a", zipfile.ZIP_DEFLATED,
+                        strict_timestamps=False)
+                archives[month].write(entry.path, entry.name)
+            os.remove(entry.path)
+            removed += 1
+    finally:
+        for archive in archives.values():
+            archive.close()
+    return removed
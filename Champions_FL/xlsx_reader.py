@@ -0,0 +1,191 @@
+"""Streaming, read-only .xlsx reader for the well-assignment workbooks.
+
+StartNewExperiment_1 needs three columns (Destination, Source, Vol) of one
+sheet. Reading them with ``zipfile`` and ``xml.etree.iterparse`` avoids
+importing pandas/openpyxl, which dominated the script's start-up and the size
+of its frozen build::
+
+    rows = xlsx_reader.read_columns(path, ["Destination", "Source", "Vol"])
+    # [("A1", "T", 150.0), ("B1", "1", 150.0), ...]
+
+Only what the workbooks use is supported: shared, inline and formula
+strings, numbers and booleans. Rows are yielded as they are parsed, one
+``<row>`` element in memory at a time. Legacy ``.xls`` files fall back to
+``pandas.read_excel``; ``CHAMPIONS_EXCEL_READER=pandas`` forces that path.
+"""
+import os
+import posixpath
+import zipfile
+from xml.etree.ElementTree import iterparse, parse
+
+EXCEL_READER = os.environ.get("CHAMPIONS_EXCEL_READER", "stream").lower()
+
+_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_DOC_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+class WorkbookError(ValueError):
+    """Raised when a workbook cannot be read or lacks the requested columns."""
+
+
+def _column_index(ref):
+    """Zero-based column of a cell reference such as ``C12``."""
+    col = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        col = col * 26 + (ord(ch.upper()) - ord("A") + 1)
+    return col - 1
+
+
+def _text(element):
+    """Concatenated ``<t>`` text of a shared or inline string, without phonetic runs."""
+    if element is None:
+        return ""
+    plain = element.find(_MAIN + "t")
+    if plain is not None:
+        return plain.text or ""
+    return "".join(run.findtext(_MAIN + "t") or "" for run in element.findall(_MAIN + "r"))
+
+
+def _number(text):
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+
+def _sheet_path(archive, sheet):
+    with archive.open("xl/workbook.xml") as f:
+        sheets = parse(f).getroot().find(_MAIN + "sheets")
+    entries = list(sheets) if sheets is not None else []
+    if isinstance(sheet, int):
+        if sheet >= len(entries):
+            raise WorkbookError(f"Workbook has no sheet {sheet}")
+        entry = entries[sheet]
+    else:
+        entry = next((e for e in entries if e.get("name") == sheet), None)
+        if entry is None:
+            raise WorkbookError(f"Workbook has no sheet {sheet!r}")
+    rel_id = entry.get(_DOC_REL + "id")
+    with archive.open("xl/_rels/workbook.xml.rels") as f:
+        for rel in parse(f).getroot().iter(_PKG_REL + "Relationship"):
+            if rel.get("Id") == rel_id:
+                target = rel.get("Target")
+                return target.lstrip("/") if target.startswith("/") else posixpath.normpath(
+                    posixpath.join("xl", target))
+    raise WorkbookError(f"Sheet {entry.get('name')!r} has no part in the workbook")
+
+
+def _shared_strings(archive):
+    try:
+        f = archive.open("xl/sharedStrings.xml")
+    except KeyError:
+        return []
+    with f:
+        strings = []
+        for _, element in iterparse(f):
+            if element.tag == _MAIN + "si":
+                strings.append(_text(element))
+                element.clear()
+        return strings
+
+
+def iter_rows(path, sheet=0):
+    """Yield ``(row_number, values)`` for every row of a worksheet.
+
+    Args:
+        path: .xlsx file
+        sheet: sheet index or name
+
+    Returns:
+        iterator of 1-based row numbers and lists of cell values (``str``,
+        ``int``, ``float``, ``bool`` or ``None`` for empty cells)
+    """
+    try:
+        archive = zipfile.ZipFile(path)
+    except (zipfile.BadZipFile, OSError) as e:
+        raise WorkbookError(f"Cannot open workbook {path}: {e}") from e
+    with archive:
+        strings = _shared_strings(archive)
+        with archive.open(_sheet_path(archive, sheet)) as f:
+            number = 0
+            for _, element in iterparse(f):
+                if element.tag != _MAIN + "row":
+                    continue
+                number = int(element.get("r", number + 1))
+                values = []
+                for cell in element.iter(_MAIN + "c"):
+                    ref = cell.get("r")
+                    col = _column_index(ref) if ref else len(values)
+                    values.extend([None] * (col - len(values)))
+                    values.append(_cell_value(cell, strings))
+                yield number, values
+                element.clear()
+
+
+def _cell_value(cell, strings):
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        return _text(cell.find(_MAIN + "is"))
+    raw = cell.findtext(_MAIN + "v")
+    if raw is None:
+        return None
+    if kind == "s":
+        return strings[int(raw)]
+    if kind in ("str", "e"):
+        return raw
+    if kind == "b":
+        return raw == "1"
+    return _number(raw)
+
+
+def read_columns(path, columns, header_row=2, sheet=0, required=None):
+    """Rows of ``columns`` below the header row, like ``pd.read_excel(header=1)``.
+
+    Args:
+        path: workbook (.xlsx, or .xls through pandas)
+        columns: header names to return, in this order
+        header_row: 1-based sheet row holding the headers
+        sheet: sheet index or name
+        required: columns that must be filled; rows missing one are skipped
+            (default: none)
+
+    Returns:
+        list of tuples, one value per column (``None`` for empty cells)
+    """
+    required = list(required or ())
+    if EXCEL_READER == "pandas" or str(path).lower().endswith(".xls"):
+        return _read_columns_pandas(path, columns, header_row, sheet, required)
+
+    positions = None
+    rows = []
+    for number, values in iter_rows(path, sheet):
+        if number < header_row:
+            continue
+        if positions is None:
+            header = [str(v).strip() if v is not None else None for v in values]
+            missing = [c for c in columns if c not in header]
+            if missing:
+                raise WorkbookError(f"Excel file missing required columns: {', '.join(missing)}")
+            positions = [header.index(c) for c in columns]
+            checks = [columns.index(c) for c in required]
+            continue
+        row = tuple(values[i] if i < len(values) else None for i in positions)
+        if any(row[i] is None or row[i] == "" for i in checks):
+            continue
+        rows.append(row)
+    if positions is None:
+        raise WorkbookError(f"No header row {header_row} in {path}")
+    return rows
+
+
+def _read_columns_pandas(path, columns, header_row, sheet, required):
+    import pandas as pd
+
+    df = pd.read_excel(path, sheet_name=sheet, header=header_row - 1)
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        raise WorkbookError(f"Excel file missing required columns: {', '.join(missing)}")
+    df = df.dropna(subset=required)
+    df = df[list(columns)].astype(object).where(df[list(columns)].notna(), None)
+    return list(df.itertuples(index=False, name=None))
@@ -0,0 +1,230 @@
+"""Queued log files shared by Champions_FL and Teleshake.
+
+``log()`` only puts the record on an in-memory queue; one background thread
+writes the queue out in batches, so a script (or the Teleshake serial loop)
+never waits for the disk::
+
+    import runlog
+
+    log = runlog.logger("ContinueOnGoingExperiment_ConditionCheck")
+    log("=== Script started ===")
+    ctx = run_context.load(cursor)   # calls runlog.set_run(ctx.run_id)
+
+All scripts of one VENUS run write to ``<CHAMPIONS_LOG_DIR>\\run_<RunGUID>.log``
+instead of one timestamped file per call. Records logged before the RunGUID is
+known are held back and go to the run file once ``set_run`` is called. Without
+a run they go to ``<script>_<YYYYMMDD>.log``. A file is rotated to ``.1`` ...
+``.<BACKUPS>`` when it would grow past ``MAX_BYTES``.
+
+The queue is drained at exit, including exit through an unhandled exception.
+Records still queued when the process is killed are lost, at most
+``BATCH_SECONDS`` worth.
+"""
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+LOG_DIR = os.environ.get("CHAMPIONS_LOG_DIR", r"C:\Python Log")
+MAX_BYTES = int(os.environ.get("CHAMPIONS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+BACKUPS = 5
+BATCH_SECONDS = 0.25
+# Held records are released to the daily file beyond this many.
+HOLD_LIMIT = 1000
+
+_queue = queue.SimpleQueue()
+_lock = threading.Lock()
+_run_id = os.environ.get("CHAMPIONS_RUN_ID") or None
+_held = []        # records waiting for set_run(): (ts, script, message)
+_last_script = None
+_writer = None
+_registered = False
+_STOP = object()
+
+
+# === Producer side ===
+def logger(script, hold=True):
+    """``log(message)`` function for ``script``.
+
+    Args:
+        script: name written in front of every line and used for the daily file
+        hold: keep records until the RunGUID is known (False for processes
+            that may never learn one, e.g. Teleshake or the resident service)
+    """
+    global _last_script, _registered
+    _last_script = script
+    with _lock:
+        if not _registered:
+            atexit.register(_shutdown)
+            _install_excepthook()
+            _registered = True
+
+    def log(message):
+        _emit(script, str(message), hold)
+    return log
+
+
+def _emit(script, message, hold):
+    record = (time.time(), script, message)
+    with _lock:
+        if _run_id is None and hold:
+            _held.append(record)
+            if len(_held) < HOLD_LIMIT:
+                return
+            records, _held[:] = _held[:], []
+        else:
+            records = [record]
+        run_id = _run_id
+    _ensure_writer()
+    for r in records:
+        _queue.put((run_id, r))
+
+
+def set_run(run_id):
+    """Route this process's records to the run file of ``run_id``.
+
+    Held records go to that file too. ``None`` ends the run: held records go
+    to their daily file and new records are held again.
+    """
+    global _run_id
+    with _lock:
+        _run_id = str(run_id) if run_id is not None else None
+        records, _held[:] = _held[:], []
+        run_id = _run_id
+    if records:
+        _ensure_writer()
+        for r in records:
+            _queue.put((run_id, r))
+
+
+def current_path(script):
+    """File the next record of ``script`` is written to."""
+    return _target(_run_id, script, time.time())
+
+
+def flush(timeout=5.0):
+    """Block until everything queued so far is on disk (not for hot paths)."""
+    if _writer is None or not _writer.is_alive():
+        return
+    done = threading.Event()
+    _queue.put(done)
+    done.wait(timeout)
+
+
+# === Writer thread ===
+def _ensure_writer():
+    global _writer
+    if _writer is not None:
+        return
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="runlog-writer", daemon=True)
+            _writer.start()
+
+
+def _target(run_id, script, ts):
+    if run_id:
+        return os.path.join(LOG_DIR, f"run_{run_id}.log")
+    return os.path.join(LOG_DIR, f"{script}_{time.strftime('%Y%m%d', time.localtime(ts))}.log")
+
+
+def _format(record):
+    ts, script, message = record
+    return f"[{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))}] {script}: {message}\n"
+
+
+def _rotate(path):
+    for i in range(BACKUPS - 1, 0, -1):
+        if os.path.exists(f"{path}.{i}"):
+            os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+    os.replace(path, f"{path}.1")
+
+
+def _write(path, text):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    data = text.encode("utf-8")
+    if size and size + len(data) > MAX_BYTES:
+        _rotate(path)
+    with open(path, "ab") as f:
+        f.write(data)
+
+
+def _write_batch(batch):
+    groups = {}
+    for run_id, record in batch:
+        groups.setdefault(_target(run_id, record[1], record[0]), []).append(_format(record))
+    try:
+        os.makedirs(LOG_DIR, exist_ok=True)
+    except OSError:
+        return
+    for path, lines in groups.items():
+        try:
+            _write(path, "".join(lines))
+        except OSError:
+            # Logging never takes a script down.
+            pass
+
+
+def _write_loop():
+    while True:
+        batch, events, stop = [], [], False
+        item = _queue.get()
+        deadline = time.monotonic() + BATCH_SECONDS
+        while True:
+            if item is _STOP:
+                stop = True
+            elif isinstance(item, threading.Event):
+                events.append(item)
+            else:
+                batch.append(item)
+            if stop or events:
+                # Drain what is already queued, then write without waiting.
+                try:
+                    item = _queue.get_nowait()
+                    continue
+                except queue.Empty:
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = _queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+        if batch:
+            _write_batch(batch)
+        for event in events:
+            event.set()
+        if stop:
+            return
+
+
+def _shutdown():
+    # Held records never saw a RunGUID; keep them in the daily file.
+    with _lock:
+        records, _held[:] = _held[:], []
+    if records:
+        _ensure_writer()
+        for r in records:
+            _queue.put((_run_id, r))
+    if _writer is not None:
+        _queue.put(_STOP)
+        _writer.join(5.0)
+
+
+def _install_excepthook():
+    previous = sys.excepthook
+
+    def hook(exc_type, exc, tb):
+        if _last_script is not None and not issubclass(exc_type, KeyboardInterrupt):
+            text = "".join(traceback.format_exception(exc_type, exc, tb)).rstrip()
+            _emit(_last_script, f"UNHANDLED {text}", hold=False)
+        previous(exc_type, exc, tb)
+
+    sys.excepthook = hook
@@ -0,0 +1,266 @@
+"""Lightweight timing spans and counters shared by Champions_FL and Teleshake.
+
+Off unless ``CHAMPIONS_METRICS`` names a sink, so the hot paths pay one
+attribute check when nobody is looking::
+
+    import telemetry
+
+    telemetry.set_tags(run_id=ctx.run_id)
+    with telemetry.span("db.execute", kind="procedure"):
+        cursor.execute(sql, params)
+    telemetry.count("db.rows_read", len(rows))
+
+Sinks (``CHAMPIONS_METRICS``, comma-separated):
+
+- ``jsonl``: every span and counter as one JSON line in
+  ``<CHAMPIONS_METRICS_DIR>\\metrics_<YYYYMMDD>.jsonl`` with a wall-clock
+  timestamp, the duration in ns and all tags (RunGUID, PlateID, ...).
+  This is the per-iteration history for charting a multi-week run.
+- ``prom``: Prometheus text exposition in
+  ``<CHAMPIONS_METRICS_DIR>\\champions.prom`` for the node_exporter textfile
+  collector: per span name ``_seconds_sum`` / ``_seconds_count``, per counter
+  ``_total``. Each process adds its values to the file under a lock file
+  (``champions.prom.lock``), so the numbers are cumulative across script
+  runs and concurrent writers (service, scripts, Teleshake daemon). Only the low-cardinality tags in
+  ``PROM_LABELS`` become labels.
+
+Durations use ``time.perf_counter_ns`` (monotonic). Records are kept in
+memory and written when ``FLUSH_EVERY`` of them are pending and at exit.
+"""
+import atexit
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+SINKS = {s.strip().lower() for s in os.environ.get("CHAMPIONS_METRICS", "").split(",") if s.strip()}
+METRICS_DIR = os.environ.get("CHAMPIONS_METRICS_DIR", os.path.join(r"C:\Python Log", "metrics"))
+PROM_FILE = "champions.prom"
+PROM_PREFIX = "champions_"
+PROM_LABELS = ("script", "kind", "table", "command", "port")
+FLUSH_EVERY = 500
+
+_lock = threading.Lock()
+_tags = {"script": os.path.splitext(os.path.basename(sys.argv[0]))[0]} if sys.argv and sys.argv[0] else {}
+_pending = []
+_span_totals = {}     # (name, labels) -> [count, sum_ns]
+_counter_totals = {}  # (name, labels) -> value
+_registered = False
+
+
+def enabled():
+    return bool(SINKS)
+
+
+def configure(sinks=None, metrics_dir=None):
+    """Override the environment, e.g. from a benchmark or a test."""
+    global SINKS, METRICS_DIR
+    if sinks is not None:
+        SINKS = {s.lower() for s in sinks}
+    if metrics_dir is not None:
+        METRICS_DIR = metrics_dir
+
+
+def set_tags(**tags):
+    """Tags attached to every following record of this process (``None`` removes one)."""
+    with _lock:
+        for key, value in tags.items():
+            if value is None:
+                _tags.pop(key, None)
+            else:
+                _tags[key] = str(value)
+
+
+def _labels(tags):
+    return tuple((k, tags[k]) for k in PROM_LABELS if k in tags)
+
+
+def _record(kind, name, value, tags):
+    global _registered
+    merged = dict(_tags, **{k: str(v) for k, v in tags.items()})
+    entry = {"ts": time.time(), "type": kind, "name": name, "value": value, "tags": merged}
+    key = (name, _labels(merged))
+    with _lock:
+        if kind == "span":
+            total = _span_totals.setdefault(key, [0, 0])
+            total[0] += 1
+            total[1] += value
+        else:
+            _counter_totals[key] = _counter_totals.get(key, 0) + value
+        _pending.append(entry)
+        flush_now = len(_pending) >= FLUSH_EVERY
+        if not _registered:
+            atexit.register(flush)
+            _registered = True
+    if flush_now:
+        flush(prom=False)
+
+
+@contextmanager
+def _span(name, tags):
+    start = time.perf_counter_ns()
+    ok = True
+    try:
+        yield
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        duration = time.perf_counter_ns() - start
+        if not ok:
+            tags = dict(tags, error="1")
+        _record("span", name, duration, tags)
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, **tags):
+    """Time the ``with`` block; a no-op when metrics are off."""
+    if not SINKS:
+        return _NULL_SPAN
+    return _span(name, tags)
+
+
+def timed(name, **tags):
+    """Decorator form of :func:`span`."""
+    def decorate(func):
+        def wrapper(*args, **kwargs):
+            with span(name, **tags):
+                return func(*args, **kwargs)
+        wrapper.__name__ = func.__name__
+        wrapper.__doc__ = func.__doc__
+        return wrapper
+    return decorate
+
+
+def count(name, value=1, **tags):
+    """Add ``value`` to counter ``name`` (rows read/written, bytes sent, ...)."""
+    if SINKS:
+        _record("counter", name, value, tags)
+
+
+# === Sinks ===
+def _write_jsonl(entries):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, f"metrics_{time.strftime('%Y%m%d')}.jsonl")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in entries))
+
+
+def _prom_name(name):
+    return PROM_PREFIX + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _prom_key(metric, labels):
+    if not labels:
+        return metric
+    text = ",".join(f'{k}="{v}"' for k, v in labels)
+    return f"{metric}{{{text}}}"
+
+
+_PROM_LINE = re.compile(r"^(\S+(?:\{.*\})?)\s+(\S+)$")
+
+
+def _prom_number(text):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _prom_value(value):
+    # Counters stay exact integers; repr keeps every digit of a float.
+    return str(value) if isinstance(value, int) else repr(float(value))
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock on ``path`` across processes (created if missing)."""
+    with open(path, "a+") as f:
+        if os.name == "nt":
+            f.seek(0)
+            # LK_LOCK retries for about 10 s before raising OSError.
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _write_prom(spans, counters):
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    path = os.path.join(METRICS_DIR, PROM_FILE)
+    # Read, merge and replace as one step, or concurrent flushes drop each other's increments.
+    with _file_lock(path + ".lock"):
+        _merge_prom(path, spans, counters)
+
+
+def _merge_prom(path, spans, counters):
+    values = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                match = _PROM_LINE.match(line.strip())
+                if match and not line.startswith("#"):
+                    values[match.group(1)] = _prom_number(match.group(2))
+    except OSError:
+        pass
+    for (name, labels), (n, total_ns) in spans.items():
+        base = _prom_name(name) + "_seconds"
+        for suffix, value in (("_count", n), ("_sum", total_ns / 1e9)):
+            key = _prom_key(base + suffix, labels)
+            values[key] = values.get(key, 0) + value
+    for (name, labels), value in counters.items():
+        key = _prom_key(_prom_name(name) + "_total", labels)
+        values[key] = values.get(key, 0) + value
+
+    text = "".join(f"{key} {_prom_value(value)}\n" for key, value in sorted(values.items()))
+    fd, tmp = tempfile.mkstemp(dir=METRICS_DIR, prefix=".prom_", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def flush(prom=True):
+    """Write pending records; with ``prom`` also fold the totals into the .prom file."""
+    with _lock:
+        entries = _pending[:]
+        del _pending[:]
+        spans = counters = None
+        if prom:
+            spans, counters = dict(_span_totals), dict(_counter_totals)
+            _span_totals.clear()
+            _counter_totals.clear()
+    try:
+        if entries and "jsonl" in SINKS:
+            _write_jsonl(entries)
+        if prom and "prom" in SINKS and (spans or counters):
+            _write_prom(spans, counters)
+    except OSError:
+        # Telemetry never takes a script down.
+        pass
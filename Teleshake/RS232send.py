@@ -2,32 +2,59 @@ import sys
 import serial
 import time
 
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+import teleshake_protocol
 
-def main():
-    if len(sys.argv) < 4:
+
+def parse_args(argv):
+    """``(response_file, com_port, bytes_to_send, output_file)`` from the command line, or None.
+
+    ``com_port`` is zero-based, as in the original C helper.
+    """
+    if len(argv) < 4:
         print("Usage: python sendbytes.py response_file COMport# byte1 byte2 ... [>> output_file]")
-        return
+        return None
 
     # Check if output redirection is included
-    if '>>' in sys.argv:
-        redirection_index = sys.argv.index('>>')
-        output_file = sys.argv[redirection_index + 1]
-        sys.argv = sys.argv[:redirection_index]
+    if '>>' in argv:
+        redirection_index = argv.index('>>')
+        output_file = argv[redirection_index + 1]
+        argv = argv[:redirection_index]
     else:
         output_file = None
 
-    response_file = sys.argv[1]
+    response_file = argv[1]
     try:
-        com_port = int(sys.argv[2]) - 1
+        com_port = int(argv[2]) - 1
     except ValueError:
         print("Invalid COM port number. Please provide a valid integer.")
-        return
+        return None
 
     try:
-        bytes_to_send = [int(byte) for byte in sys.argv[3:] if byte.isdigit()]
+        bytes_to_send = [int(byte) for byte in argv[3:] if byte.isdigit()]
     except ValueError as e:
         print(f"Invalid byte value. Please provide valid integers for bytes. Error: {e}")
+        return None
+    return response_file, com_port, bytes_to_send, output_file
+
+
+def append_output(response_file, output_file):
+    try:
+        with open(output_file, 'a') as out_file:
+            with open(response_file, 'r') as res_file:
+                data_to_append = res_file.read()
+                out_file.write(data_to_append)
+                print(f"Appended data to {output_file}: {data_to_append}")
+    except Exception as e:
+        print(f"Error during file operations: {e}")
+
+
+def main():
+    args = parse_args(sys.argv)
+    if args is None:
         return
+    response_file, com_port, bytes_to_send, output_file = args
 
     print(f"Response file: {response_file}")
     print(f"COM port: {com_port + 1}")
@@ -42,39 +69,40 @@ def main():
             bytesize=serial.EIGHTBITS,
             parity=serial.PARITY_NONE,
             stopbits=serial.STOPBITS_ONE,
-            timeout=1
+            timeout=teleshake_protocol.RESPONSE_TIMEOUT
         )
     except serial.SerialException as e:
         print(f"Cannot open COM port: {e}")
         return
 
+    link = teleshake_protocol.TeleshakeLink(ser, name=f"COM{com_port + 1}")
+    sent = teleshake_protocol.FrameBuffer().feed(bytes(b & 0xFF for b in bytes_to_send))
+    # One reply per telegram; broadcasts (and anything that is not a whole
+    # telegram) are answered by an unknown number of devices, so those are
+    # read until the line goes quiet.
+    if sent and len(sent) * teleshake_protocol.FRAME_LENGTH == len(bytes_to_send) \
+            and all(f.address != teleshake_protocol.BROADCAST for f in sent):
+        expected = len(sent)
+    else:
+        expected = None
+
     with open(response_file, 'w') as file:
         try:
-            # Send bytes
-            for byte in bytes_to_send:
-                ser.write(byte.to_bytes(1, 'little'))
-                print(f"Sent byte {byte}")
-
-            # Give some time for the response to be ready
-            # If the _teleshake.txt is empty this is the place to add more delays
-            time.sleep(0.5)
-
-            # Read response
-            start_time = time.time()
-            while True:
-                bytes_in_buffer = ser.in_waiting
-                if bytes_in_buffer > 0:
-                    response = ser.read(bytes_in_buffer)
-                    for byte in response:
-                        print(f"{byte:03}", end=' ')
-                        file.write(f"{byte:03} ")
-                    print("\nReceived bytes:", bytes_in_buffer)
-                else:
-                    time.sleep(0.1)
-
-                # Exit loop after 5 seconds of no new data
-                if time.time() - start_time > 5:
-                    break
+            with telemetry.span("serial.command", port=link.name):
+                link.discard_input()
+                start = time.monotonic()
+                link.send(bytes_to_send)
+                print(f"Sent bytes {bytes_to_send}")
+
+                # Blocking read of whole frames: returns as soon as the replies are in,
+                # at the latest after TELESHAKE_RESPONSE_TIMEOUT seconds.
+                replies = link.read_frames(start + link.response_timeout, expected)
+            for reply in replies:
+                print(reply, end=' ')
+                file.write(f"{reply} ")
+            print(f"\nReceived {len(replies)} frame(s) in {time.monotonic() - start:.3f}s")
+            if link.frames.dropped:
+                print(f"Discarded {link.frames.dropped} byte(s) that were not part of a valid frame")
 
         except Exception as e:
             print(f"Error during serial communication: {e}")
@@ -83,14 +111,7 @@ def main():
             print("Closed serial port.")
 
     if output_file:
-        try:
-            with open(output_file, 'a') as out_file:
-                with open(response_file, 'r') as res_file:
-                    data_to_append = res_file.read()
-                    out_file.write(data_to_append)
-                    print(f"Appended data to {output_file}: {data_to_append}")
-        except Exception as e:
-            print(f"Error during file operations: {e}")
+        append_output(response_file, output_file)
 
 
 if __name__ == "__main__":
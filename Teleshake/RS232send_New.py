@@ -1,115 +1,85 @@
-import builtins
-import logging
 import os
 import sys
+import threading
 import time
-from enum import IntEnum
 from typing import List, Tuple, Optional
 
 import serial
 
-LOG_DIRECTORY = r"C:\Python Log"
-_LOGGER_INITIALIZED = False
-_LOG_FILE_PATH: Optional[str] = None
-_ORIGINAL_PRINT = builtins.print
+import common_path  # noqa: F401  (shared modules)
+import runlog
+import shake_program
+import teleshake_protocol
+from teleshake_protocol import ProtocolError, TeleshakeCommand, TeleshakeLink  # noqa: F401  (re-export)
 
+_file_log = runlog.logger("Teleshake", hold=False)
 
-def setup_logging() -> str:
-    """Configure logging to file and mirror standard output."""
-    global _LOGGER_INITIALIZED, _LOG_FILE_PATH
-
-    if _LOGGER_INITIALIZED and _LOG_FILE_PATH:
-        return _LOG_FILE_PATH
-
-    os.makedirs(LOG_DIRECTORY, exist_ok=True)
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    log_path = os.path.join(LOG_DIRECTORY, f"Teleshake_{timestamp}.log")
-
-    file_handler = logging.FileHandler(log_path, encoding="utf-8")
-    file_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+# How often the watchdog checks that the main thread is still alive (s).
+WATCHDOG_POLL = float(os.environ.get("TELESHAKE_WATCHDOG_POLL", "0.5"))
+STOP_ATTEMPTS = 3
 
-    root_logger = logging.getLogger()
-    root_logger.handlers.clear()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-
-    def print_and_log(*args, **kwargs):
-        sep = kwargs.get("sep", " ")
-        message = sep.join(str(arg) for arg in args)
-        target = kwargs.get("file", sys.stdout)
-
-        if target is sys.stderr:
-            logging.error(message)
-        else:
-            logging.info(message)
 
-        _ORIGINAL_PRINT(*args, **kwargs)
+def log(message: str) -> None:
+    """Print ``message`` and queue it for the log file.
 
-    builtins.print = print_and_log
+    The file write happens on the runlog writer thread, so logging from
+    inside the serial exchange does not stretch its timing.
+    """
+    print(message)
+    _file_log(message)
 
-    _LOGGER_INITIALIZED = True
-    _LOG_FILE_PATH = log_path
-    logging.info("Logging initialized.")
-    return log_path
 
-
-class TeleshakeCommand(IntEnum):
-    """Teleshake protocol commands"""
-    QUERY_ALL = 0x20
-    RESET_ALL = 0x21
-    RESET_DEVICE = 0x22
-    GET_INFO = 0x23
-    GET_LAST_ERROR = 0x25
-    START_DEVICE = 0x30
-    STOP_DEVICE = 0x31
-    GET_CYCLE_TIME = 0x32
-    SET_CYCLE_TIME = 0x33
+def setup_logging() -> str:
+    """Return the file this process logs to."""
+    return runlog.current_path("Teleshake")
 
 
 class TeleshakeController:
     """Controller for H+P Labortechnik Teleshake device"""
 
-    def __init__(self, com_port: str, device_address: int = 1):
+    def __init__(self, com_port: str, device_address: int = 1, response_timeout: float = None):
         """
         Initialize Teleshake controller
 
         Args:
             com_port: COM port (e.g., 'COM6')
             device_address: Device address (1-14, 15 is broadcast)
+            response_timeout: latency budget per reply in seconds
+                (default ``TELESHAKE_RESPONSE_TIMEOUT``)
         """
         self.com_port = com_port
         self.device_address = device_address
+        self.response_timeout = response_timeout
         self.serial_port = None
+        self.link = None
         self.is_connected = False
+        # The shake watchdog sends from its own thread.
+        self._lock = threading.RLock()
+        self._active_shake = None
 
     def connect(self) -> bool:
         """Establish serial connection"""
         try:
-            self.serial_port = serial.Serial(
-                port=self.com_port,
-                baudrate=9600,
-                bytesize=serial.EIGHTBITS,
-                parity=serial.PARITY_NONE,
-                stopbits=serial.STOPBITS_ONE,
-                timeout=2.0
-            )
-            print(f"Connected to {self.com_port}")
+            self.serial_port = teleshake_protocol.open_port(self.com_port)
+            self.link = TeleshakeLink(self.serial_port, response_timeout=self.response_timeout,
+                                      name=self.com_port)
+            log(f"Connected to {self.com_port}")
             self.is_connected = True
             return True
         except serial.SerialException as e:
-            print(f"Failed to connect to {self.com_port}: {e}")
+            log(f"Failed to connect to {self.com_port}: {e}")
             return False
 
     def disconnect(self):
         """Close serial connection"""
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
-            print(f"Disconnected from {self.com_port}")
+            log(f"Disconnected from {self.com_port}")
             self.is_connected = False
 
     def calculate_checksum(self, bytes_data: List[int]) -> int:
         """Calculate modulo-256 checksum for first 5 bytes"""
-        return sum(bytes_data[:5]) % 256
+        return teleshake_protocol.checksum(bytes_data)
 
     def create_control_byte(self, address: int, init_mode: bool = False,
                             dirty: bool = True, error: bool = False) -> int:
@@ -123,15 +93,7 @@ class TeleshakeController:
         - Bit 6: Mode (0=normal, 1=init)
         - Bit 7: Length (0=6 bytes)
         """
-        byte = address & 0x0F  # Bits 0-3
-        if error:
-            byte |= 0x10  # Bit 4
-        if dirty:
-            byte |= 0x20  # Bit 5
-        if init_mode:
-            byte |= 0x40  # Bit 6
-        # Bit 7 stays 0 for 6-byte telegram
-        return byte
+        return teleshake_protocol.control_byte(address, init_mode, dirty, error)
 
     def speed_to_cycle_time(self, speed: int) -> Tuple[int, int, int]:
         """
@@ -143,30 +105,15 @@ class TeleshakeController:
         Returns:
             Tuple of (high_byte, mid_byte, low_byte) for 24-bit cycle time
         """
-        # Convert speed to cycle time in microseconds
-        # Assuming speed is in shakes/minute or RPM
-        if speed < 1000:
-            raise ValueError("Speed must be at least 1000 shakes per minute.")
-
-        # 60,000,000 microseconds per minute / speed = cycle time
-        cycle_time_us = int(60_000_000 / speed)
-
-        if cycle_time_us > 0xFFFFFF:
-            raise ValueError(
-                f"Speed {speed} results in a cycle time exceeding the 24-bit limit."
-            )
-
-        # Split into 3 bytes (24-bit value)
-        high_byte = (cycle_time_us >> 16) & 0xFF
-        mid_byte = (cycle_time_us >> 8) & 0xFF
-        low_byte = cycle_time_us & 0xFF
-
-        return high_byte, mid_byte, low_byte
+        return teleshake_protocol.speed_to_cycle_time(speed)
 
     def send_command(self, command: int, data: List[int] = None) -> Optional[List[int]]:
         """
         Send 6-byte command and receive response
 
+        The telegram goes out in one write and the call returns as soon as
+        the device's reply frame is in, or after the latency budget.
+
         Args:
             command: Command byte
             data: Optional 3 bytes of data [data2, data1, data0]
@@ -175,85 +122,38 @@ class TeleshakeController:
             Response bytes or None if error
         """
         if not self.is_connected:
-            print("Not connected to device")
+            log("Not connected to device")
             return None
 
-        # Prepare data bytes
-        if data is None:
-            data = [0, 0, 0]
-        elif len(data) < 3:
-            data = data + [0] * (3 - len(data))
-
-        # Create telegram
-        control_byte = self.create_control_byte(self.device_address)
-        telegram = [control_byte, command] + data[:3]
-        checksum = self.calculate_checksum(telegram)
-        telegram.append(checksum)
-
-        # Send command
-        print(f"Sending: {' '.join(f'{b:03d}' for b in telegram)}")
-        for byte in telegram:
-            self.serial_port.write(bytes([byte]))
-
-        # Wait for response
-        time.sleep(0.5)
-
-        # Read response (6 bytes)
-        response = []
-        bytes_to_read = 6
-        timeout_start = time.time()
-
-        while len(response) < bytes_to_read and time.time() - timeout_start < 2:
-            if self.serial_port.in_waiting > 0:
-                byte_data = self.serial_port.read(1)
-                if byte_data:
-                    response.append(byte_data[0])
-
-        if len(response) == 6:
-            print(f"Received: {' '.join(f'{b:03d}' for b in response)}")
-
-            # Verify checksum
-            calc_checksum = self.calculate_checksum(response)
-            if calc_checksum != response[5]:
-                print(f"Checksum error! Expected {calc_checksum}, got {response[5]}")
-                return None
-
-            # Check if dirty bit was cleared (successful execution)
-            if response[0] & 0x20 == 0:
-                print("Command executed successfully")
-            else:
-                print("Command may not have been executed")
+        log(f"Sending: {teleshake_protocol.encode(self.device_address, command, data or ())}")
+        try:
+            with self._lock:
+                reply = self.link.transact(self.device_address, command, data or ())
+        except ProtocolError as e:
+            log(f"No valid response: {e}")
+            return None
+        log(f"Received: {reply} ({self.link.last_latency * 1000:.0f} ms)")
 
-            return response
+        # Check if dirty bit was cleared (successful execution)
+        if not reply.dirty:
+            log("Command executed successfully")
         else:
-            print(f"Incomplete response: received {len(response)} bytes")
-            return None
+            log("Command may not have been executed")
+        if reply.error:
+            log("Device reports an error (see GET_LAST_ERROR)")
+        return reply.to_list()
 
     def initialize_device(self) -> bool:
         """Initialize device with QueryAll command"""
-        print("\n--- Initializing Device ---")
-        control_byte = self.create_control_byte(0x0F, init_mode=True)  # Broadcast address
-        telegram = [control_byte, TeleshakeCommand.QUERY_ALL, 0, 0, 0]
-        checksum = self.calculate_checksum(telegram)
-        telegram.append(checksum)
-
-        print(f"Sending QueryAll: {' '.join(f'{b:03d}' for b in telegram)}")
-        for byte in telegram:
-            self.serial_port.write(bytes([byte]))
-
-        time.sleep(0.5)
-
-        # Read response
-        response = []
-        while self.serial_port.in_waiting > 0:
-            byte_data = self.serial_port.read(1)
-            if byte_data:
-                response.append(byte_data[0])
-
-        if response:
-            print(f"Initialization response: {' '.join(f'{b:03d}' for b in response)}")
-            return True
-        return False
+        log("\n--- Initializing Device ---")
+        request = teleshake_protocol.encode(teleshake_protocol.BROADCAST, TeleshakeCommand.QUERY_ALL,
+                                            init_mode=True)
+        log(f"Sending QueryAll: {request}")
+        with self._lock:
+            replies = self.link.broadcast(TeleshakeCommand.QUERY_ALL, init_mode=True)
+        for reply in replies:
+            log(f"Initialization response from address {reply.address}: {reply}")
+        return bool(replies)
 
     def set_speed(self, speed: int) -> bool:
         """
@@ -265,66 +165,174 @@ class TeleshakeController:
         Returns:
             True if successful
         """
-        print(f"\n--- Setting Speed to {speed} ---")
+        log(f"\n--- Setting Speed to {speed} ---")
         try:
             high, mid, low = self.speed_to_cycle_time(speed)
         except ValueError as exc:
-            print(f"Invalid speed: {exc}")
+            log(f"Invalid speed: {exc}")
             return False
-        print(f"Cycle time bytes: high={high}, mid={mid}, low={low}")
+        log(f"Cycle time bytes: high={high}, mid={mid}, low={low}")
 
         response = self.send_command(TeleshakeCommand.SET_CYCLE_TIME, [high, mid, low])
         return response is not None
 
     def start_device(self) -> bool:
         """Start the device"""
-        print("\n--- Starting Device ---")
+        log("\n--- Starting Device ---")
         response = self.send_command(TeleshakeCommand.START_DEVICE)
         return response is not None
 
     def stop_device(self) -> bool:
         """Stop the device"""
-        print("\n--- Stopping Device ---")
+        log("\n--- Stopping Device ---")
         response = self.send_command(TeleshakeCommand.STOP_DEVICE)
         return response is not None
 
-    def shake_for_duration(self, speed: int, duration: float):
+    def shake(self, speed: int, duration: float) -> Optional["ShakeHandle"]:
         """
-        Shake at specified speed for given duration
+        Start shaking and return at once; a watchdog thread stops the device after ``duration``
 
         Args:
             speed: Speed in RPM or shakes/minute
             duration: Duration in seconds
+
+        Returns:
+            ShakeHandle, or None if the device did not start
         """
-        print(f"\n=== Shaking at speed {speed} for {duration} seconds ===")
+        log(f"\n=== Shaking at speed {speed} for {duration} seconds ===")
+        # Holding the lock keeps a running shake's watchdog from stopping the
+        # device between our SET_CYCLE_TIME and START. The old shake is handed
+        # over only once START is acknowledged; on failure it stays armed.
+        with self._lock:
+            previous = self._active_shake
+            # Set speed
+            if not self.set_speed(speed):
+                log("Failed to set speed")
+                return None
 
-        # Set speed
-        if not self.set_speed(speed):
-            print("Failed to set speed")
-            return False
+            # Start shaking
+            if not self.start_device():
+                log("Failed to start device")
+                return None
+
+            if previous is not None:
+                previous._supersede()
+            handle = self._active_shake = ShakeHandle(self, speed, duration)
+        if previous is not None:
+            # Its watchdog needs the lock to finish, so wait outside it.
+            previous.wait()
+        return handle
+
+    def shake_for_duration(self, speed: int, duration: float):
+        """
+        Shake at specified speed for given duration
 
-        # Start shaking
-        if not self.start_device():
-            print("Failed to start device")
+        Args:
+            speed: Speed in RPM or shakes/minute
+            duration: Duration in seconds
+        """
+        handle = self.shake(speed, duration)
+        if handle is None:
             return False
 
         # Wait for specified duration
-        print(f"Shaking for {duration} seconds...")
-        time.sleep(duration)
+        log(f"Shaking for {duration} seconds...")
+        try:
+            handle.wait()
+        except BaseException:
+            handle.cancel()
+            raise
 
-        # Stop shaking
-        if not self.stop_device():
-            print("Failed to stop device")
+        if not handle.stopped:
+            log("Failed to stop device")
             return False
 
         return True
 
 
+class ShakeHandle:
+    """A running shake; its watchdog thread sends STOP_DEVICE at the deadline.
+
+    The watchdog is not a daemon thread, so the interpreter waits for it:
+    the device is stopped at the deadline even when the calling code raises.
+    If the main thread ends before the deadline, the watchdog stops the
+    device right away.
+    """
+
+    def __init__(self, controller: TeleshakeController, speed: int, duration: float):
+        self.controller = controller
+        self.speed = speed
+        self.duration = duration
+        self.deadline = time.monotonic() + duration
+        self.stopped = False  # True once STOP_DEVICE was acknowledged
+        self.cancelled = False
+        self._wake = threading.Event()
+        self._done = threading.Event()
+        self._superseded = False
+        self._thread = threading.Thread(target=self._watch, name="teleshake-watchdog", daemon=False)
+        self._thread.start()
+
+    @property
+    def remaining(self) -> float:
+        """Seconds until the watchdog stops the device (0 once done)."""
+        if self._done.is_set():
+            return 0.0
+        return max(0.0, self.deadline - time.monotonic())
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until the shake has ended (or ``timeout``); True if it has."""
+        return self._done.wait(timeout)
+
+    def cancel(self) -> bool:
+        """Stop the device now; returns ``stopped``."""
+        if not self._done.is_set():
+            self.cancelled = True
+            self._wake.set()
+            self._done.wait()
+        return self.stopped
+
+    def _supersede(self) -> None:
+        """Hand the device to a newer shake (called with the controller lock held)."""
+        self._superseded = True
+        self._wake.set()
+
+    def _watch(self) -> None:
+        main = threading.main_thread()
+        try:
+            while not self._wake.is_set():
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if self._wake.wait(min(remaining, WATCHDOG_POLL)):
+                    break
+                if not main.is_alive():
+                    log("Main thread ended before the shake did - stopping device")
+                    break
+            # A shake() in progress holds the lock until its START is answered,
+            # and supersedes this one only if the START succeeded.
+            with self.controller._lock:
+                if self._superseded:
+                    return
+                for attempt in range(STOP_ATTEMPTS):
+                    if self.controller.stop_device():
+                        self.stopped = True
+                        break
+                    log(f"Stop attempt {attempt + 1} of {STOP_ATTEMPTS} failed")
+        finally:
+            if self.controller._active_shake is self:
+                self.controller._active_shake = None
+            self._done.set()
+
+
 def main():
-    """Execute the specified shaking sequence"""
+    """Execute the shake program (``RS232send_New.py [COM6] [program.json]``)"""
 
     log_path = setup_logging()
-    print(f"Log file: {log_path}")
+    log(f"Log file: {log_path}")
 
     # Configuration
     if len(sys.argv) > 1:
@@ -332,61 +340,50 @@ def main():
     else:
         com_port = 'COM6'  # Default from your logs
 
-    print(f"Using COM port: {com_port}")
+    log(f"Using COM port: {com_port}")
+
+    try:
+        if len(sys.argv) > 2:
+            program = shake_program.load(sys.argv[2])
+        else:
+            program = shake_program.parse(shake_program.DEFAULT_PROGRAM)
+    except (OSError, shake_program.ShakeProgramError) as e:
+        log(f"Invalid shake program: {e}")
+        return
+    log(str(program))
 
     # Create controller
     controller = TeleshakeController(com_port, device_address=1)
 
     # Connect to device
     if not controller.connect():
-        print("Failed to establish connection")
+        log("Failed to establish connection")
         return
 
     try:
         # Initialize device
         controller.initialize_device()
-        time.sleep(1)
-
-        print("\n" + "=" * 60)
-        print("STARTING SHAKE SEQUENCE")
-        print("=" * 60)
-
-        # Sequence 1: Speed 1200 for 5 seconds, repeat 10 times
-        print("\n### PHASE 1: Speed 1200, 5 seconds x 10 repetitions ###")
-        for i in range(10):
-            print(f"\n--- Repetition {i + 1}/10 ---")
-            if not controller.shake_for_duration(speed=1200, duration=5):
-                print("Aborting sequence: failed to complete repetition.")
-                return
-
-            if i < 9:  # Don't wait after last repetition
-                print("Waiting 2 seconds before next repetition...")
-                time.sleep(2)
-
-        print("\n### PHASE 1 COMPLETE ###")
-        print("Waiting 5 seconds before Phase 2...")
-        time.sleep(5)
-
-        # Sequence 2: Speed 1300 for 30 seconds
-        print("\n### PHASE 2: Speed 1300, 30 seconds ###")
-        if not controller.shake_for_duration(speed=1300, duration=30):
-            print("Aborting sequence: failed to complete Phase 2.")
-            return
-
-        print("\n" + "=" * 60)
-        print("SHAKE SEQUENCE COMPLETE")
-        print("=" * 60)
+
+        log("\n" + "=" * 60)
+        log(f"STARTING SHAKE PROGRAM {program.name}")
+        log("=" * 60)
+
+        timings = shake_program.run(program, controller)
+
+        log("\n" + "=" * 60)
+        log("SHAKE PROGRAM COMPLETE")
+        log("=" * 60)
+        log(shake_program.report(timings))
 
     except KeyboardInterrupt:
-        print("\n\nInterrupted by user - stopping device...")
-        controller.stop_device()
+        log("\n\nInterrupted by user - stopping device...")
+    except shake_program.ShakeProgramError as e:
+        log(f"\nAborting program: {e}")
     except Exception as e:
-        print(f"\nError during execution: {e}")
-        controller.stop_device()
+        log(f"\nError during execution: {e}")
     finally:
         # Ensure device is stopped and connection closed
         controller.stop_device()
-        time.sleep(1)
         controller.disconnect()
 
 
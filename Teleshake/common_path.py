@@ -0,0 +1,11 @@
+"""Put the repository's shared ``Common`` folder (telemetry, logging) on ``sys.path``.
+
+Frozen executables bundle those modules; from source they are found next to
+this package.
+"""
+import os
+import sys
+
+COMMON_DIR = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "Common"))
+if os.path.isdir(COMMON_DIR) and COMMON_DIR not in sys.path:
+    sys.path.append(COMMON_DIR)
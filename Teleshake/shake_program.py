@@ -0,0 +1,284 @@
+"""Declarative shake programs and a deadline-driven executor.
+
+A program is JSON with a list of steps::
+
+    {"name": "default",
+     "steps": [
+        {"repeat": 10, "gap": 2, "steps": [{"shake": 1200, "seconds": 5}]},
+        {"pause": 5},
+        {"ramp": [1300, 1600], "seconds": 10, "interval": 1},
+        {"shake": 1300, "seconds": 30}
+     ]}
+
+- ``shake``: run at a speed (shakes/min) for ``seconds``
+- ``pause``: stand still for ``seconds``
+- ``ramp``: go from the first to the second speed in ``interval`` (default 1 s) steps
+- ``repeat``: run ``steps`` n times with an optional ``gap`` pause between repetitions
+- every step may have a ``label`` used in the timing report
+
+``parse`` turns the steps into a flat list of actions (set speed, start,
+stop), each with its planned offset from the start of the program. A speed
+that is already set is not written again. The device keeps its cycle time
+across a stop, so the 10 repetitions above write SET_CYCLE_TIME once.
+
+``run`` executes the actions against absolute deadlines on
+``time.monotonic()``, so command overhead does not add up across steps. Each
+telegram is sent ahead of its deadline by the measured command round-trip
+time (starting from ``TELESHAKE_SEND_LEAD``), so it lands on time. The
+returned timings compare the actual time of every action with the plan::
+
+    program = shake_program.load("program.json")
+    timings = shake_program.run(program, controller)
+    print(shake_program.report(timings))
+"""
+import json
+import os
+import sys
+import threading
+import time
+from typing import List, NamedTuple, Optional
+
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+import teleshake_protocol
+
+# Initial guess of one command round trip (s); refined by measurement during a run.
+SEND_LEAD = float(os.environ.get("TELESHAKE_SEND_LEAD", "0.05"))
+
+DEFAULT_PROGRAM = {
+    "name": "default",
+    "steps": [
+        {"label": "phase 1", "repeat": 10, "gap": 2, "steps": [{"shake": 1200, "seconds": 5}]},
+        {"pause": 5},
+        {"label": "phase 2", "shake": 1300, "seconds": 30},
+    ],
+}
+
+
+class ShakeProgramError(ValueError):
+    """Raised for an invalid program or a command the device did not accept."""
+
+
+class Action(NamedTuple):
+    at: float
+    kind: str  # "speed", "start" or "stop"
+    speed: Optional[int]
+    label: str
+
+
+class Timing(NamedTuple):
+    label: str
+    kind: str
+    speed: Optional[int]
+    planned: float
+    actual: float
+    latency: float
+
+    @property
+    def error(self) -> float:
+        return self.actual - self.planned
+
+
+class ShakeProgram:
+    """Compiled program: actions on a planned timeline."""
+
+    def __init__(self, name: str, actions: List[Action], duration: float):
+        self.name = name
+        self.actions = actions
+        self.duration = duration
+
+    def __str__(self) -> str:
+        lines = [f"{self.name}: {len(self.actions)} actions, {self.duration:.1f} s"]
+        lines += [f"{a.at:8.2f}s  {a.kind:5} {a.speed or '':>5}  {a.label}" for a in self.actions]
+        return "\n".join(lines)
+
+
+# === Parsing ===
+def _number(step, key, minimum=0.0):
+    try:
+        value = float(step[key])
+    except (KeyError, TypeError, ValueError):
+        raise ShakeProgramError(f"Step {step}: {key!r} must be a number") from None
+    if value < minimum:
+        raise ShakeProgramError(f"Step {step}: {key!r} must be at least {minimum:g}")
+    return value
+
+
+def _speed(step, value):
+    try:
+        teleshake_protocol.speed_to_cycle_time(int(value))
+    except (TypeError, ValueError) as e:
+        raise ShakeProgramError(f"Step {step}: {e}") from None
+    return int(value)
+
+
+class _Compiler:
+    def __init__(self):
+        self.t = 0.0
+        self.speed = None
+        self.running = False
+        self.actions: List[Action] = []
+
+    def emit(self, kind, label, speed=None):
+        self.actions.append(Action(round(self.t, 6), kind, speed, label))
+
+    def set_speed(self, speed, label):
+        if speed != self.speed:
+            self.emit("speed", label, speed)
+            self.speed = speed
+
+    def run_at(self, speed, label):
+        self.set_speed(speed, label)
+        if not self.running:
+            self.emit("start", label)
+            self.running = True
+
+    def halt(self, label):
+        if self.running:
+            self.emit("stop", label)
+            self.running = False
+
+    def steps(self, steps, path):
+        if not isinstance(steps, list):
+            raise ShakeProgramError(f"{path}: 'steps' must be a list")
+        for n, step in enumerate(steps, start=1):
+            label = step.get("label") if isinstance(step, dict) else None
+            self.step(step, label or f"{path}{n}")
+
+    def step(self, step, label):
+        if not isinstance(step, dict):
+            raise ShakeProgramError(f"Step {label}: expected an object, got {step!r}")
+        if "repeat" in step:
+            count = int(_number(step, "repeat", 1))
+            gap = _number(step, "gap") if "gap" in step else 0.0
+            for i in range(count):
+                if i and gap:
+                    self.halt(label)
+                    self.t += gap
+                self.steps(step.get("steps"), f"{label} #{i + 1}.")
+        elif "shake" in step:
+            self.run_at(_speed(step, step["shake"]), label)
+            self.t += _number(step, "seconds")
+        elif "pause" in step:
+            self.halt(label)
+            self.t += _number(step, "pause")
+        elif "ramp" in step:
+            if not isinstance(step["ramp"], list) or len(step["ramp"]) != 2:
+                raise ShakeProgramError(f"Step {label}: 'ramp' must be [from, to]")
+            start, end = (_speed(step, v) for v in step["ramp"])
+            seconds = _number(step, "seconds")
+            interval = _number(step, "interval", 0.1) if "interval" in step else 1.0
+            n = max(1, round(seconds / interval))
+            for i in range(n):
+                speed = end if n == 1 else round(start + (end - start) * i / (n - 1))
+                self.run_at(speed, label)
+                self.t += seconds / n
+        else:
+            raise ShakeProgramError(f"Step {label}: needs one of shake, pause, ramp or repeat")
+
+
+def parse(data: dict) -> ShakeProgram:
+    """Turn a program dict (see module docstring) into a ``ShakeProgram``."""
+    if not isinstance(data, dict):
+        raise ShakeProgramError("A shake program must be an object with 'steps'")
+    c = _Compiler()
+    c.steps(data.get("steps"), "step ")
+    c.halt("end")
+    return ShakeProgram(str(data.get("name", "program")), c.actions, round(c.t, 6))
+
+
+def load(path: str) -> ShakeProgram:
+    with open(path, encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except ValueError as e:
+            raise ShakeProgramError(f"{path}: {e}") from None
+    return parse(data)
+
+
+# === Execution ===
+def _execute(device, action: Action) -> bool:
+    if action.kind == "speed":
+        return device.set_speed(action.speed)
+    if action.kind == "start":
+        return device.start_device()
+    return device.stop_device()
+
+
+def run(program: ShakeProgram, device, cancel: threading.Event = None, lead: float = None) -> List[Timing]:
+    """Execute ``program`` on ``device`` against a monotonic deadline schedule.
+
+    Args:
+        program: compiled program
+        device: object with ``set_speed(speed)``, ``start_device()`` and
+            ``stop_device()`` returning True on success (``TeleshakeController``)
+        cancel: set it to abort the program; the device is stopped
+        lead: initial send lead in seconds (default ``TELESHAKE_SEND_LEAD``)
+
+    Returns:
+        one Timing per action (planned/actual offsets from the program start)
+
+    Raises:
+        ShakeProgramError: a command failed or the program was cancelled
+            (the device is stopped first)
+    """
+    cancel = cancel or threading.Event()
+    lead = SEND_LEAD if lead is None else lead
+    timings: List[Timing] = []
+    # Actions due at the same time go out back to back, the first one earliest.
+    queued = [1] * len(program.actions)
+    for i in range(len(program.actions) - 2, -1, -1):
+        if program.actions[i].at == program.actions[i + 1].at:
+            queued[i] = queued[i + 1] + 1
+    t0 = time.monotonic() + lead * (queued[0] if queued else 1)
+    try:
+        with telemetry.span("shake.program", program=program.name):
+            for action, ahead in zip(program.actions, queued):
+                wait = t0 + action.at - lead * ahead - time.monotonic()
+                if wait > 0 and cancel.wait(wait):
+                    raise ShakeProgramError(f"{program.name} cancelled at {action.label}")
+                sent = time.monotonic()
+                ok = _execute(device, action)
+                done = time.monotonic()
+                if not ok:
+                    raise ShakeProgramError(f"{program.name}: {action.kind} failed at {action.label}")
+                # Follow the link's actual round trip, weighted towards recent commands.
+                lead = 0.7 * lead + 0.3 * (done - sent)
+                timings.append(Timing(action.label, action.kind, action.speed, action.at, done - t0,
+                                      done - sent))
+            wait = t0 + program.duration - time.monotonic()
+            if wait > 0 and cancel.wait(wait):
+                raise ShakeProgramError(f"{program.name} cancelled at the end")
+    except BaseException:
+        if not timings or timings[-1].kind != "stop":
+            device.stop_device()
+        raise
+    return timings
+
+
+def report(timings: List[Timing]) -> str:
+    """Planned-versus-actual table of a run, with the worst deviation."""
+    lines = [f"{'planned':>9} {'actual':>9} {'error':>8} {'rtt':>7}  action"]
+    for t in timings:
+        action = f"{t.kind} {t.speed}" if t.speed else t.kind
+        lines.append(f"{t.planned:8.3f}s {t.actual:8.3f}s {t.error * 1000:+7.1f}ms {t.latency * 1000:6.1f}ms"
+                     f"  {action} ({t.label})")
+    if timings:
+        worst = max(timings, key=lambda t: abs(t.error))
+        lines.append(f"Finished at {timings[-1].actual:.3f}s (planned {timings[-1].planned:.3f}s); "
+                     f"worst deviation {worst.error * 1000:+.1f}ms at {worst.label}")
+    return "\n".join(lines)
+
+
+def main():
+    """``shake_program.py [program.json]``: print the compiled action list."""
+    try:
+        program = load(sys.argv[1]) if len(sys.argv) > 1 else parse(DEFAULT_PROGRAM)
+    except (OSError, ShakeProgramError) as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
+    print(program)
+
+
+if __name__ == "__main__":
+    main()
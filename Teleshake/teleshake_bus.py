@@ -0,0 +1,332 @@
+"""One owner per COM port, many Teleshake devices per port.
+
+The protocol addresses up to 14 devices (1-14) on one RS232 line, plus 15 for
+broadcast. ``TeleshakeBus`` owns a port and its ``TeleshakeLink``. Callers on
+any thread queue commands per device address and get a ``Future`` back; a
+single worker thread puts them on the half-duplex line and matches each reply
+to its request by address. The worker takes one command per address in
+turn, so a long program on one shaker does not hold up the others. A
+broadcast waits for the commands queued before it and then goes out as one
+telegram, so a group start or stop reaches every shaker on the line at the
+same instant::
+
+    with TeleshakeBus("COM6") as bus:
+        bus.discover()                      # QUERY_ALL init -> [1, 2, 3]
+        bus.set_speeds({1: 1200, 2: 1200, 3: 1500})
+        bus.start()                         # one broadcast START_DEVICE
+        ...
+        bus.stop()
+
+``TeleshakeDeck`` runs one bus per COM port, each on its own thread, so
+shakers on different ports are driven concurrently::
+
+    deck = TeleshakeDeck.from_spec("COM6:1,2,3;COM7:1")
+
+    teleshake_bus.py COM6:1,2,3 COM7:1 --speed 1200 --seconds 30
+"""
+import argparse
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import common_path  # noqa: F401  (shared modules)
+import runlog
+import telemetry
+import teleshake_protocol
+from teleshake_protocol import BROADCAST, Frame, ProtocolError, TeleshakeCommand, TeleshakeLink
+
+log = runlog.logger("TeleshakeBus", hold=False)
+
+
+def collect_replies(targets: Iterable[int], futures: Dict[int, Future],
+                    name: str = "") -> Dict[int, Optional[Frame]]:
+    """Reply frame per target address, from ``{address: future}`` (15 = broadcast); None where none arrived.
+
+    A failed command (timeout, serial error) is logged and leaves its devices
+    at None, so the replies of the other devices are still returned.
+    """
+    replies: Dict[int, Optional[Frame]] = {a: None for a in targets}
+    for address, future in futures.items():
+        try:
+            result = future.result()
+        except Exception as e:
+            who = "broadcast" if address == BROADCAST else f"address {address}"
+            log(f"{name} {who}: {type(e).__name__}: {e}")
+            continue
+        for frame in result if isinstance(result, list) else [result]:
+            replies[frame.address] = frame
+    return replies
+
+
+class _Request:
+    __slots__ = ("seq", "address", "command", "data", "init_mode", "future")
+
+    def __init__(self, seq, address, command, data, init_mode):
+        self.seq = seq
+        self.address = address
+        self.command = command
+        self.data = tuple(data)
+        self.init_mode = init_mode
+        self.future = Future()
+
+
+class TeleshakeBus:
+    """Command queues for every device on one COM port, served by one worker thread."""
+
+    def __init__(self, port, devices: Iterable[int] = (), response_timeout: float = None):
+        """
+        Args:
+            port: port name (e.g. ``COM6``) or an already open serial port
+            devices: addresses expected on the line (filled in by ``discover``)
+            response_timeout: latency budget per reply (default ``TELESHAKE_RESPONSE_TIMEOUT``)
+        """
+        self.port = port
+        self.name = port if isinstance(port, str) else getattr(port, "port", None) or "serial"
+        self.devices: List[int] = sorted(set(devices))
+        self.response_timeout = response_timeout
+        self.link: Optional[TeleshakeLink] = None
+        self._queues: Dict[int, deque] = {}
+        self._cv = threading.Condition()
+        self._seq = 0
+        self._last = 0
+        self._closed = True
+        self._worker = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # === Port ownership ===
+    def open(self) -> "TeleshakeBus":
+        if not self._closed:
+            return self
+        serial_port = teleshake_protocol.open_port(self.port) if isinstance(self.port, str) else self.port
+        self.link = TeleshakeLink(serial_port, response_timeout=self.response_timeout, name=self.name)
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name=f"teleshake-{self.name}", daemon=True)
+        self._worker.start()
+        return self
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the worker after the queued commands, then close the port."""
+        with self._cv:
+            if self._closed:
+                return
+            self._closed = True
+            self._cv.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        with self._cv:
+            for queue in self._queues.values():
+                while queue:
+                    queue.popleft().future.set_exception(ProtocolError(f"{self.name} closed"))
+        close = getattr(self.link.port, "close", None)
+        if close is not None:
+            close()
+
+    # === Queueing ===
+    def submit(self, address: int, command: int, data: Sequence[int] = (), init_mode: bool = False) -> Future:
+        """Queue a command for ``address``.
+
+        Returns:
+            Future of the reply ``Frame``, or of the list of reply frames for a
+            broadcast (address 15); a missing reply sets ``ResponseTimeout``
+        """
+        if not 1 <= address <= BROADCAST:
+            raise ValueError(f"Device address must be 1-15, not {address}")
+        with self._cv:
+            if self._closed:
+                raise ProtocolError(f"{self.name} is not open")
+            self._seq += 1
+            request = _Request(self._seq, address, command, data, init_mode)
+            self._queues.setdefault(address, deque()).append(request)
+            self._cv.notify()
+        return request.future
+
+    def command(self, address: int, command: int, data: Sequence[int] = (), init_mode: bool = False):
+        """``submit`` and wait for the reply."""
+        return self.submit(address, command, data, init_mode).result()
+
+    def pending(self) -> int:
+        with self._cv:
+            return sum(len(q) for q in self._queues.values())
+
+    def _next_request(self) -> Optional[_Request]:
+        heads = {a: q[0] for a, q in self._queues.items() if q}
+        if not heads:
+            return None
+        barrier = heads.pop(BROADCAST, None)
+        # A broadcast goes out once everything queued before it has been sent.
+        ready = [a for a, r in heads.items() if barrier is None or r.seq < barrier.seq]
+        if not ready:
+            return self._queues[BROADCAST].popleft()
+        # Round robin over device addresses
+        address = min(ready, key=lambda a: (a <= self._last, a))
+        self._last = address
+        return self._queues[address].popleft()
+
+    def _run(self) -> None:
+        while True:
+            with self._cv:
+                request = self._next_request()
+                while request is None:
+                    if self._closed:
+                        return
+                    self._cv.wait()
+                    request = self._next_request()
+            if not request.future.set_running_or_notify_cancel():
+                continue
+            try:
+                if request.address == BROADCAST:
+                    result = self.link.broadcast(request.command, request.data, request.init_mode,
+                                                 expected=len(self.devices) or None)
+                else:
+                    result = self.link.transact(request.address, request.command, request.data,
+                                                request.init_mode)
+            except Exception as e:
+                request.future.set_exception(e)
+            else:
+                request.future.set_result(result)
+
+    # === Device operations ===
+    def discover(self) -> List[int]:
+        """Initialize every device on the line (QUERY_ALL) and remember their addresses."""
+        with telemetry.span("bus.discover", port=self.name):
+            replies = self.submit(BROADCAST, TeleshakeCommand.QUERY_ALL, init_mode=True).result()
+        self.devices = sorted({f.address for f in replies if f.address != BROADCAST})
+        return self.devices
+
+    def set_speeds(self, speeds: Dict[int, int]) -> Dict[int, Frame]:
+        """Queue SET_CYCLE_TIME for every device at once and wait for all replies."""
+        futures = {a: self.submit(a, TeleshakeCommand.SET_CYCLE_TIME,
+                                  teleshake_protocol.speed_to_cycle_time(speed))
+                   for a, speed in speeds.items()}
+        return {a: f.result() for a, f in futures.items()}
+
+    def start(self, addresses: Iterable[int] = None) -> Dict[int, Optional[Frame]]:
+        """Start ``addresses`` (default: every device) - one broadcast when that is the whole line."""
+        return self._group(TeleshakeCommand.START_DEVICE, addresses)
+
+    def stop(self, addresses: Iterable[int] = None) -> Dict[int, Optional[Frame]]:
+        """Stop ``addresses`` (default: every device)."""
+        return self._group(TeleshakeCommand.STOP_DEVICE, addresses)
+
+    def group_submit(self, command: int, addresses: Iterable[int] = None) -> Dict[int, Future]:
+        """Queue ``command`` for a group: a broadcast for the whole line, else one per address.
+
+        Returns:
+            ``{address: future}``; a single ``{15: future}`` for the broadcast
+        """
+        targets = sorted(set(self.devices if addresses is None else addresses))
+        if addresses is None or (self.devices and targets == self.devices):
+            return {BROADCAST: self.submit(BROADCAST, command)}
+        return {a: self.submit(a, command) for a in targets}
+
+    def _group(self, command: int, addresses: Optional[Iterable[int]]) -> Dict[int, Optional[Frame]]:
+        targets = sorted(set(self.devices if addresses is None else addresses))
+        with telemetry.span("bus.group", command=teleshake_protocol.command_name(command), port=self.name):
+            futures = self.group_submit(command, addresses)
+            return collect_replies(targets, futures, self.name)
+
+
+class TeleshakeDeck:
+    """Every Teleshake on the deck: one ``TeleshakeBus`` (and worker thread) per COM port."""
+
+    def __init__(self, layout: Dict[str, Iterable[int]], response_timeout: float = None):
+        """
+        Args:
+            layout: COM port -> device addresses on it (empty: discover them)
+        """
+        self.buses = {port: TeleshakeBus(port, addresses, response_timeout)
+                      for port, addresses in layout.items()}
+
+    @classmethod
+    def from_spec(cls, spec: str, response_timeout: float = None) -> "TeleshakeDeck":
+        """``"COM6:1,2,3;COM7:1"`` (addresses may be left out: ``"COM6;COM7"``)."""
+        layout = {}
+        for part in filter(None, (p.strip() for p in spec.replace(" ", ";").split(";"))):
+            port, _, addresses = part.partition(":")
+            layout[port] = [int(a) for a in addresses.split(",") if a.strip()]
+        return cls(layout, response_timeout)
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def open(self) -> "TeleshakeDeck":
+        for bus in self.buses.values():
+            bus.open()
+        return self
+
+    def close(self) -> None:
+        for bus in self.buses.values():
+            bus.close()
+
+    @property
+    def devices(self) -> List[Tuple[str, int]]:
+        return [(port, a) for port, bus in self.buses.items() for a in bus.devices]
+
+    def discover(self) -> List[Tuple[str, int]]:
+        """QUERY_ALL on every port concurrently; ports with a configured layout keep it."""
+        futures = {port: bus.submit(BROADCAST, TeleshakeCommand.QUERY_ALL, init_mode=True)
+                   for port, bus in self.buses.items()}
+        for port, future in futures.items():
+            found = sorted({f.address for f in future.result() if f.address != BROADCAST})
+            if not self.buses[port].devices:
+                self.buses[port].devices = found
+        return self.devices
+
+    def set_speeds(self, speeds: Dict[Tuple[str, int], int]) -> Dict[Tuple[str, int], Frame]:
+        futures = {(port, a): self.buses[port].submit(a, TeleshakeCommand.SET_CYCLE_TIME,
+                                                      teleshake_protocol.speed_to_cycle_time(speed))
+                   for (port, a), speed in speeds.items()}
+        return {key: f.result() for key, f in futures.items()}
+
+    def start(self) -> Dict[Tuple[str, int], Optional[Frame]]:
+        """Broadcast START_DEVICE on every port at once."""
+        return self._everywhere(TeleshakeCommand.START_DEVICE)
+
+    def stop(self) -> Dict[Tuple[str, int], Optional[Frame]]:
+        return self._everywhere(TeleshakeCommand.STOP_DEVICE)
+
+    def _everywhere(self, command: int) -> Dict[Tuple[str, int], Optional[Frame]]:
+        # Queue on all ports first so the workers send in parallel, then wait.
+        futures = {port: bus.group_submit(command) for port, bus in self.buses.items()}
+        replies = {}
+        for port, port_futures in futures.items():
+            for a, frame in collect_replies(self.buses[port].devices, port_futures, port).items():
+                replies[(port, a)] = frame
+        return replies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run every Teleshake on one or more ports at one speed.")
+    parser.add_argument("ports", nargs="+", help="PORT[:addr,addr...], e.g. COM6:1,2,3 COM7")
+    parser.add_argument("--speed", type=int, required=True, help="shakes per minute")
+    parser.add_argument("--seconds", type=float, required=True, help="shake duration")
+    args = parser.parse_args()
+
+    with TeleshakeDeck.from_spec(";".join(args.ports)) as deck:
+        devices = deck.discover()
+        print(f"Devices: {', '.join(f'{p}/{a}' for p, a in devices) or 'none'}")
+        try:
+            deck.set_speeds({d: args.speed for d in devices})
+            started = deck.start()
+            print(f"Started: {sorted(f'{p}/{a}' for (p, a), f in started.items() if f is not None)}")
+            time.sleep(args.seconds)
+        finally:
+            stopped = deck.stop()
+            missing = [f"{p}/{a}" for (p, a), f in stopped.items() if f is None]
+            print(f"Stopped{'; no reply from ' + ', '.join(missing) if missing else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Drop-in replacement for RS232send.py that goes through the Teleshake daemon.
+
+Same arguments and response file as RS232send.py::
+
+    teleshake_client.py response_file COMport# byte1 byte2 ... [>> output_file]
+
+The telegrams are handed to ``teleshake_daemon.py``, which already has the
+port open and the devices initialized. If the daemon is not running (the
+connection is refused) the call falls back to RS232send.py's direct serial
+exchange, so VENUS keeps working either way. Any other failure, e.g. the
+daemon not answering in time, is reported like a failed exchange in
+RS232send.py (empty response file, error in the output): the telegram may
+already be on the wire, and the daemon holds the port.
+"""
+import sys
+
+import common_path  # noqa: F401  (shared modules)
+import RS232send
+import teleshake_daemon
+
+
+def main():
+    args = RS232send.parse_args(sys.argv)
+    if args is None:
+        return
+    response_file, com_port, bytes_to_send, output_file = args
+    port = f"COM{com_port + 1}"
+
+    try:
+        response = teleshake_daemon.request({"op": "send", "port": port, "bytes": bytes_to_send})
+    except ConnectionRefusedError as e:
+        print(f"Teleshake daemon not available ({e}); using {port} directly")
+        RS232send.main()
+        return
+    except OSError as e:
+        response = {"ok": False, "error": f"Teleshake daemon did not answer: {e or type(e).__name__}"}
+
+    reply = response.get("reply") or []
+    with open(response_file, 'w') as file:
+        file.write("".join(f"{byte:03} " for byte in reply))
+    if response.get("ok"):
+        print(f"{port}: sent {bytes_to_send}, received {' '.join(f'{b:03}' for b in reply)} "
+              f"in {response.get('ms')} ms")
+    else:
+        print(f"Error during serial communication: {response.get('error')}")
+
+    if output_file:
+        RS232send.append_output(response_file, output_file)
+
+
+if __name__ == "__main__":
+    main()
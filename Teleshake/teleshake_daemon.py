@@ -0,0 +1,195 @@
+"""Resident Teleshake service: keeps the COM ports open and initialized.
+
+The SHOU_TELESHAKE library starts RS232send.py once per command. Each start
+opens the port, waits for the reply and closes the port again. The daemon
+opens each port once, initializes the devices on it (QUERY_ALL) and serves
+telegrams from a local socket through a ``TeleshakeBus``, so one command
+costs the device round trip::
+
+    teleshake_daemon.py --ports COM6            # leave running on the VENUS PC
+    teleshake_client.py resp.txt 6 33 48 0 0 0 81   # same arguments as RS232send.py
+
+The socket listens on ``127.0.0.1:TELESHAKE_DAEMON_PORT`` (default 50600)
+only. Requests and replies are one JSON object per line:
+
+- ``{"op": "send", "port": "COM6", "bytes": [33, 48, 0, 0, 0, 81]}`` ->
+  ``{"ok": true, "reply": [1, 48, 0, 0, 0, 49], "ms": 12.3}``
+- ``{"op": "ping"}``, ``{"op": "status"}``, ``{"op": "shutdown"}``
+
+Ports are opened on first use when they were not given with ``--ports``.
+``--map COM6=/dev/pts/3`` points a COM name elsewhere (e.g. the emulator).
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Dict, List
+
+import common_path  # noqa: F401  (shared modules)
+import runlog
+import telemetry
+import teleshake_protocol
+from teleshake_bus import TeleshakeBus
+from teleshake_protocol import BROADCAST, FRAME_LENGTH, FrameBuffer, ProtocolError
+
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("TELESHAKE_DAEMON_PORT", "50600"))
+# Longest a client waits for the daemon before giving up on it.
+CLIENT_TIMEOUT = float(os.environ.get("TELESHAKE_DAEMON_TIMEOUT", "10"))
+
+log = runlog.logger("TeleshakeDaemon", hold=False)
+
+
+class TeleshakeService:
+    """One initialized ``TeleshakeBus`` per COM port, shared by all clients."""
+
+    def __init__(self, aliases: Dict[str, str] = None, response_timeout: float = None):
+        self.aliases = {k.upper(): v for k, v in (aliases or {}).items()}
+        self.response_timeout = response_timeout
+        self.buses: Dict[str, TeleshakeBus] = {}
+        self.requests = 0
+        self.errors = 0
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def bus(self, port: str) -> TeleshakeBus:
+        port = port.upper()
+        with self._lock:
+            bus = self.buses.get(port)
+            if bus is None:
+                bus = TeleshakeBus(self.aliases.get(port, port), response_timeout=self.response_timeout)
+                bus.name = port
+                bus.open()
+                devices = bus.discover()
+                log(f"Opened {port}; devices {devices or 'none found'}")
+                self.buses[port] = bus
+            return bus
+
+    def send(self, port: str, raw: List[int]) -> List[int]:
+        """Pass the telegrams in ``raw`` to the devices and return the reply bytes."""
+        data = bytes(b & 0xFF for b in raw)
+        frames = FrameBuffer().feed(data)
+        if not frames or len(frames) * FRAME_LENGTH != len(data):
+            raise ProtocolError(f"Not a sequence of valid telegrams: {list(data)}")
+        bus = self.bus(port)
+        futures = [bus.submit(f.address, f.command, f.data, f.init_mode) for f in frames]
+        reply = []
+        for frame, future in zip(frames, futures):
+            result = future.result()
+            for r in result if frame.address == BROADCAST else [result]:
+                reply += r.to_list()
+            if frame.command == teleshake_protocol.TeleshakeCommand.QUERY_ALL and frame.address == BROADCAST:
+                bus.devices = sorted({r.address for r in result}) or bus.devices
+        return reply
+
+    def status(self) -> dict:
+        return {
+            "uptime_s": round(time.time() - self.started, 1),
+            "requests": self.requests,
+            "errors": self.errors,
+            "ports": {port: {"devices": bus.devices, "pending": bus.pending(),
+                             "last_latency_ms": None if bus.link.last_latency is None
+                             else round(bus.link.last_latency * 1000, 1)}
+                      for port, bus in self.buses.items()},
+        }
+
+    def handle(self, request: dict) -> dict:
+        op = request.get("op", "send")
+        if op == "ping":
+            return {"ok": True}
+        if op == "status":
+            return dict(self.status(), ok=True)
+        if op != "send":
+            return {"ok": False, "error": f"unknown op {op!r}"}
+        with self._lock:
+            self.requests += 1
+        start = time.monotonic()
+        try:
+            with telemetry.span("daemon.request", port=str(request.get("port"))):
+                reply = self.send(str(request["port"]), request.get("bytes") or [])
+        except (KeyError, ValueError, OSError, ProtocolError) as e:
+            with self._lock:
+                self.errors += 1
+            log(f"{request.get('port')} {request.get('bytes')}: {e}")
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, "reply": reply, "ms": round((time.monotonic() - start) * 1000, 1)}
+
+    def close(self) -> None:
+        for port, bus in self.buses.items():
+            bus.close()
+            log(f"Closed {port}")
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                response = {"ok": False, "error": "request is not JSON"}
+            else:
+                if request.get("op") == "shutdown":
+                    self._send({"ok": True})
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                    return
+                response = self.server.service.handle(request)
+            self._send(response)
+
+    def _send(self, response):
+        self.wfile.write(json.dumps(response).encode() + b"\n")
+
+
+class TeleshakeServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, service: TeleshakeService, host: str = HOST, port: int = PORT):
+        super().__init__((host, port), _Handler)
+        self.service = service
+
+
+# === Client ===
+def request(message: dict, host: str = HOST, port: int = PORT, timeout: float = None) -> dict:
+    """Send one request to the daemon and return its reply.
+
+    Raises:
+        OSError: the daemon is not running or did not answer in time
+    """
+    with socket.create_connection((host, port), timeout=CLIENT_TIMEOUT if timeout is None else timeout) as s:
+        s.sendall(json.dumps(message).encode() + b"\n")
+        with s.makefile("rb") as f:
+            line = f.readline()
+    if not line:
+        raise OSError("Teleshake daemon closed the connection")
+    return json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keep Teleshake COM ports open and serve telegrams locally.")
+    parser.add_argument("--ports", nargs="*", default=[], help="ports to open and initialize at start")
+    parser.add_argument("--map", action="append", default=[], metavar="COMn=DEVICE",
+                        help="open DEVICE when COMn is requested")
+    parser.add_argument("--listen", type=int, default=PORT, help="local TCP port")
+    args = parser.parse_args()
+
+    aliases = dict(m.split("=", 1) for m in args.map)
+    service = TeleshakeService(aliases)
+    for port in args.ports:
+        service.bus(port)
+    with TeleshakeServer(service, HOST, args.listen) as server:
+        log(f"Teleshake daemon listening on {HOST}:{args.listen}")
+        print(f"Teleshake daemon listening on {HOST}:{args.listen}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+            log("Teleshake daemon stopped")
+
+
+if __name__ == "__main__":
+    main()
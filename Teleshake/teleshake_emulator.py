@@ -0,0 +1,270 @@
+"""Virtual Teleshake devices on a Linux pseudo-terminal.
+
+Speaks the 6-byte telegram protocol of ``teleshake_protocol`` so the
+controllers can be run, timed and broken without an instrument::
+
+    teleshake_emulator.py --addresses 1,2,3 --latency 0.02 --jitter 0.005
+    # Teleshake emulator on /dev/pts/7 (addresses 1, 2, 3)
+    RS232send_New.py /dev/pts/7
+
+    teleshake_emulator.py --bench 500 --drop 0.01 --corrupt 0.01
+
+Each emulated device keeps the state the real one reports: it must be
+initialized with a broadcast QUERY_ALL in init mode before it takes other
+commands, SET/GET_CYCLE_TIME store and return the 24-bit cycle time, START
+needs a cycle time, and GET_LAST_ERROR returns and clears the last error
+code. A reply clears the dirty bit when the command was executed and sets
+the error bit when it was refused. Host telegrams with a bad checksum are
+ignored, as the device does.
+
+Faults are injected on the reply path: ``--latency`` / ``--jitter`` delay the
+reply, ``--drop`` loses individual bytes, ``--corrupt`` breaks the checksum
+and ``--noise`` puts a stray byte in front of a reply. ``--bench N`` runs N
+GET_CYCLE_TIME round trips through ``TeleshakeLink`` against the emulator and
+prints latency percentiles and throughput.
+"""
+import argparse
+import os
+import random
+import select
+import threading
+import time
+import tty
+from typing import Dict, Iterable, List, Optional
+
+import common_path  # noqa: F401  (shared modules)
+import teleshake_protocol
+from teleshake_protocol import BROADCAST, DIRTY_BIT, ERROR_BIT, Frame, FrameBuffer, TeleshakeCommand
+
+# GET_LAST_ERROR codes
+NO_ERROR = 0
+NOT_INITIALIZED = 1
+UNKNOWN_COMMAND = 2
+INVALID_CYCLE_TIME = 3
+NO_CYCLE_TIME = 4
+
+# Cycle time accepted by SET_CYCLE_TIME: 1000 to 6000 shakes/min.
+MIN_CYCLE_TIME = 60_000_000 // 6000
+MAX_CYCLE_TIME = 60_000_000 // 1000
+FIRMWARE = (1, 0, 0)
+
+
+class VirtualTeleshake:
+    """State of one emulated device."""
+
+    def __init__(self, address: int):
+        self.address = address
+        self.reset()
+
+    def reset(self) -> None:
+        self.initialized = False
+        self.running = False
+        self.cycle_time = 0
+        self.last_error = NO_ERROR
+
+    def handle(self, frame: Frame) -> Frame:
+        """Execute ``frame`` and return the reply telegram."""
+        command, data, ok = frame.command, frame.data, True
+        if command == TeleshakeCommand.QUERY_ALL and frame.init_mode:
+            self.initialized = True
+        elif command == TeleshakeCommand.RESET_ALL or command == TeleshakeCommand.RESET_DEVICE:
+            self.reset()
+        elif not self.initialized:
+            ok = self._refuse(NOT_INITIALIZED)
+        elif command == TeleshakeCommand.QUERY_ALL:
+            data = (int(self.running), 0, 0)
+        elif command == TeleshakeCommand.GET_INFO:
+            data = FIRMWARE
+        elif command == TeleshakeCommand.GET_LAST_ERROR:
+            data, self.last_error = (0, 0, self.last_error), NO_ERROR
+        elif command == TeleshakeCommand.SET_CYCLE_TIME:
+            if MIN_CYCLE_TIME <= frame.value <= MAX_CYCLE_TIME:
+                self.cycle_time = frame.value
+            else:
+                ok = self._refuse(INVALID_CYCLE_TIME)
+        elif command == TeleshakeCommand.GET_CYCLE_TIME:
+            data = ((self.cycle_time >> 16) & 0xFF, (self.cycle_time >> 8) & 0xFF, self.cycle_time & 0xFF)
+        elif command == TeleshakeCommand.START_DEVICE:
+            if self.cycle_time:
+                self.running = True
+            else:
+                ok = self._refuse(NO_CYCLE_TIME)
+        elif command == TeleshakeCommand.STOP_DEVICE:
+            self.running = False
+        else:
+            ok = self._refuse(UNKNOWN_COMMAND)
+
+        control = (frame.control & ~0x0F & ~DIRTY_BIT & ~ERROR_BIT) | self.address
+        if not ok:
+            control |= DIRTY_BIT | ERROR_BIT
+        head = [control, command, *data]
+        return Frame(control, command, tuple(data), teleshake_protocol.checksum(head))
+
+    def _refuse(self, error: int) -> bool:
+        self.last_error = error
+        return False
+
+
+class TeleshakeEmulator:
+    """Devices behind one pty; the slave side is the 'COM port' for the controllers."""
+
+    def __init__(self, addresses: Iterable[int] = (1,), latency: float = 0.01, jitter: float = 0.0,
+                 drop: float = 0.0, corrupt: float = 0.0, noise: float = 0.0, seed: Optional[int] = None):
+        self.devices: Dict[int, VirtualTeleshake] = {a: VirtualTeleshake(a) for a in sorted(set(addresses))}
+        self.latency = latency
+        self.jitter = jitter
+        self.drop = drop
+        self.corrupt = corrupt
+        self.noise = noise
+        self.random = random.Random(seed)
+        self.stats = {"received": 0, "ignored": 0, "replies": 0, "dropped_bytes": 0,
+                      "corrupted": 0, "noise_bytes": 0}
+        self.master = self.slave = None
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self) -> str:
+        """Open the pty, serve it on a thread and return the slave path."""
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        # Keeping the slave open lets controllers open and close it repeatedly.
+        self.path = os.ttyname(self.slave)
+        self._thread = threading.Thread(target=self.serve, name="teleshake-emulator", daemon=True)
+        self._thread.start()
+        return self.path
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1.0)
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                os.close(fd)
+        self.master = self.slave = None
+
+    def serve(self) -> None:
+        frames = FrameBuffer()
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self.master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            before = frames.dropped
+            for frame in frames.feed(data):
+                self.stats["received"] += 1
+                self._answer(frame)
+            self.stats["ignored"] += frames.dropped - before
+
+    def _answer(self, frame: Frame) -> None:
+        if frame.address == BROADCAST:
+            targets = list(self.devices.values())
+        else:
+            targets = [self.devices[frame.address]] if frame.address in self.devices else []
+        replies = [device.handle(frame) for device in targets]
+        if not replies:
+            return
+        delay = self.latency + self.random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        out = bytearray()
+        for reply in replies:
+            out += self._faults(reply.to_bytes())
+        self.stats["replies"] += len(replies)
+        os.write(self.master, bytes(out))
+
+    def _faults(self, raw: bytes) -> bytes:
+        raw = bytearray(raw)
+        if self.corrupt and self.random.random() < self.corrupt:
+            raw[5] = (raw[5] + 1) % 256
+            self.stats["corrupted"] += 1
+        if self.drop:
+            kept = bytearray(b for b in raw if self.random.random() >= self.drop)
+            self.stats["dropped_bytes"] += len(raw) - len(kept)
+            raw = kept
+        if self.noise and self.random.random() < self.noise:
+            raw[:0] = bytes([self.random.randrange(256)])
+            self.stats["noise_bytes"] += 1
+        return bytes(raw)
+
+
+# === Benchmark ===
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def bench(emulator: TeleshakeEmulator, count: int, address: int, response_timeout: float = None) -> Dict:
+    """Round-trip ``count`` GET_CYCLE_TIME telegrams through ``TeleshakeLink``."""
+    port = teleshake_protocol.open_port(emulator.path)
+    link = teleshake_protocol.TeleshakeLink(port, response_timeout=response_timeout, retries=0, name="emulator")
+    try:
+        link.broadcast(TeleshakeCommand.QUERY_ALL, init_mode=True, expected=len(emulator.devices))
+        latencies, timeouts = [], 0
+        start = time.monotonic()
+        for _ in range(count):
+            t = time.monotonic()
+            try:
+                link.transact(address, TeleshakeCommand.GET_CYCLE_TIME)
+            except teleshake_protocol.ResponseTimeout:
+                timeouts += 1
+                continue
+            latencies.append(time.monotonic() - t)
+        elapsed = time.monotonic() - start
+    finally:
+        port.close()
+    return {
+        "commands": count,
+        "timeouts": timeouts,
+        "resync_bytes": link.frames.dropped,
+        "seconds": elapsed,
+        "per_second": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+        "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+        "max_ms": max(latencies) * 1000 if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emulate Teleshake devices on a pseudo-terminal.")
+    parser.add_argument("--addresses", default="1", help="device addresses, e.g. 1,2,3")
+    parser.add_argument("--latency", type=float, default=0.01, help="reply delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- random delay in seconds")
+    parser.add_argument("--drop", type=float, default=0.0, help="probability of losing a reply byte")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="probability of a bad reply checksum")
+    parser.add_argument("--noise", type=float, default=0.0, help="probability of a stray byte before a reply")
+    parser.add_argument("--seed", type=int, help="random seed for repeatable faults")
+    parser.add_argument("--bench", type=int, metavar="N", help="run N round trips and report, then exit")
+    parser.add_argument("--timeout", type=float, help="reply timeout for --bench (default TELESHAKE_RESPONSE_TIMEOUT)")
+    args = parser.parse_args()
+
+    addresses = [int(a) for a in args.addresses.split(",") if a.strip()]
+    emulator = TeleshakeEmulator(addresses, args.latency, args.jitter, args.drop, args.corrupt,
+                                 args.noise, args.seed)
+    with emulator:
+        if args.bench:
+            result = bench(emulator, args.bench, addresses[0], args.timeout)
+            print(" ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+            print(" ".join(f"{k}={v}" for k, v in emulator.stats.items()))
+            return
+        print(f"Teleshake emulator on {emulator.path} (addresses {', '.join(map(str, addresses))})")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        print(" ".join(f"{k}={v}" for k, v in emulator.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
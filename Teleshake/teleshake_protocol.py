@@ -0,0 +1,316 @@
+"""Teleshake RS232 telegram protocol: framing, validation and one-shot transactions.
+
+A telegram is 6 bytes in both directions::
+
+    [control, command, data2, data1, data0, checksum]
+
+- control: bits 0-3 device address (15 = broadcast), bit 4 error, bit 5 dirty
+  (set by the host, cleared by the device once the command is executed),
+  bit 6 init mode, bit 7 length (0 = 6-byte telegram)
+- checksum: sum of the first five bytes modulo 256
+
+``TeleshakeLink`` sends a telegram with a single ``write`` and reads exactly
+one reply frame with a blocking read. There are no fixed sleeps and no
+``in_waiting`` polling: the call returns as soon as the device answers. It
+gives up after ``RESPONSE_TIMEOUT`` seconds, the latency budget set by
+``TELESHAKE_RESPONSE_TIMEOUT``. Bytes that do not start a valid frame (line
+noise, a partial frame from an earlier exchange) are dropped one at a time
+until a frame with a valid checksum lines up::
+
+    link = TeleshakeLink(serial_port)
+    reply = link.transact(1, TeleshakeCommand.START_DEVICE)
+    if reply.dirty:
+        ...  # device received but did not execute the command
+"""
+import os
+import time
+from enum import IntEnum
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+import common_path  # noqa: F401  (shared modules)
+import telemetry
+
+FRAME_LENGTH = 6
+BROADCAST = 0x0F
+
+ADDRESS_MASK = 0x0F
+ERROR_BIT = 0x10
+DIRTY_BIT = 0x20
+INIT_BIT = 0x40
+LENGTH_BIT = 0x80
+
+# Latency budget: longest wait for a reply, not a fixed delay.
+RESPONSE_TIMEOUT = float(os.environ.get("TELESHAKE_RESPONSE_TIMEOUT", "2.0"))
+# Broadcast replies (one per device) are collected until the line is quiet this long.
+QUIET_GAP = float(os.environ.get("TELESHAKE_QUIET_GAP", "0.15"))
+RETRIES = int(os.environ.get("TELESHAKE_RETRIES", "1"))
+
+
+class TeleshakeCommand(IntEnum):
+    """Teleshake protocol commands"""
+    QUERY_ALL = 0x20
+    RESET_ALL = 0x21
+    RESET_DEVICE = 0x22
+    GET_INFO = 0x23
+    GET_LAST_ERROR = 0x25
+    START_DEVICE = 0x30
+    STOP_DEVICE = 0x31
+    GET_CYCLE_TIME = 0x32
+    SET_CYCLE_TIME = 0x33
+
+
+def command_name(command: int) -> str:
+    try:
+        return TeleshakeCommand(command).name
+    except ValueError:
+        return f"0x{command:02X}"
+
+
+class ProtocolError(Exception):
+    """Raised when no valid reply frame arrives within the latency budget."""
+
+
+class ResponseTimeout(ProtocolError):
+    """No complete frame before the deadline."""
+
+
+# === Framing ===
+def checksum(data: Sequence[int]) -> int:
+    """Modulo-256 checksum of the first 5 bytes"""
+    return sum(data[:5]) % 256
+
+
+def control_byte(address: int, init_mode: bool = False, dirty: bool = True, error: bool = False) -> int:
+    """Control byte for ``address`` (bit 7 stays 0 for a 6-byte telegram)."""
+    byte = address & ADDRESS_MASK
+    if error:
+        byte |= ERROR_BIT
+    if dirty:
+        byte |= DIRTY_BIT
+    if init_mode:
+        byte |= INIT_BIT
+    return byte
+
+
+def speed_to_cycle_time(speed: int) -> Tuple[int, int, int]:
+    """
+    Convert speed (RPM or shakes/min) to the 24-bit cycle time in microseconds
+
+    Returns:
+        Tuple of (high_byte, mid_byte, low_byte)
+    """
+    if speed < 1000:
+        raise ValueError("Speed must be at least 1000 shakes per minute.")
+    cycle_time_us = int(60_000_000 / speed)
+    if cycle_time_us > 0xFFFFFF:
+        raise ValueError(f"Speed {speed} results in a cycle time exceeding the 24-bit limit.")
+    return (cycle_time_us >> 16) & 0xFF, (cycle_time_us >> 8) & 0xFF, cycle_time_us & 0xFF
+
+
+def cycle_time_to_speed(data: Sequence[int]) -> Optional[float]:
+    """Inverse of :func:`speed_to_cycle_time` (None for a zero cycle time)."""
+    cycle_time_us = (data[0] << 16) | (data[1] << 8) | data[2]
+    return 60_000_000 / cycle_time_us if cycle_time_us else None
+
+
+class Frame(NamedTuple):
+    """One 6-byte telegram."""
+    control: int
+    command: int
+    data: Tuple[int, int, int]
+    checksum: int
+
+    @property
+    def address(self) -> int:
+        return self.control & ADDRESS_MASK
+
+    @property
+    def error(self) -> bool:
+        return bool(self.control & ERROR_BIT)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.control & DIRTY_BIT)
+
+    @property
+    def init_mode(self) -> bool:
+        return bool(self.control & INIT_BIT)
+
+    @property
+    def value(self) -> int:
+        """The three data bytes as one 24-bit number."""
+        return (self.data[0] << 16) | (self.data[1] << 8) | self.data[2]
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.control, self.command, *self.data, self.checksum])
+
+    def to_list(self) -> List[int]:
+        return list(self.to_bytes())
+
+    def __str__(self) -> str:
+        return " ".join(f"{b:03d}" for b in self.to_bytes())
+
+
+def encode(address: int, command: int, data: Sequence[int] = (), init_mode: bool = False) -> Frame:
+    """Host telegram for ``command`` (data padded to 3 bytes, dirty bit set)."""
+    data = (list(data) + [0, 0, 0])[:3]
+    head = [control_byte(address, init_mode=init_mode), int(command)] + data
+    return Frame(head[0], head[1], tuple(data), checksum(head))
+
+
+def is_frame(raw: Sequence[int]) -> bool:
+    """True when ``raw`` (6 bytes) has a valid checksum and the 6-byte length bit."""
+    return (len(raw) == FRAME_LENGTH and not raw[0] & LENGTH_BIT
+            and checksum(raw) == raw[5])
+
+
+def decode(raw: Sequence[int]) -> Frame:
+    if not is_frame(raw):
+        raise ProtocolError(f"Invalid frame: {' '.join(f'{b:03d}' for b in raw)}")
+    return Frame(raw[0], raw[1], (raw[2], raw[3], raw[4]), raw[5])
+
+
+class FrameBuffer:
+    """Byte buffer that yields valid frames and drops bytes that cannot start one."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.dropped = 0
+
+    def feed(self, data: bytes) -> List[Frame]:
+        self.buffer.extend(data)
+        frames = []
+        while len(self.buffer) >= FRAME_LENGTH:
+            candidate = self.buffer[:FRAME_LENGTH]
+            if is_frame(candidate):
+                frames.append(decode(candidate))
+                del self.buffer[:FRAME_LENGTH]
+            else:
+                # Resynchronize: slide by one byte
+                del self.buffer[0]
+                self.dropped += 1
+        return frames
+
+
+# === Transport ===
+def open_port(name: str, timeout: float = None):
+    """Open ``name`` (e.g. ``COM6``) with the Teleshake line settings, 9600 8N1."""
+    import serial
+
+    return serial.Serial(
+        port=name,
+        baudrate=9600,
+        bytesize=serial.EIGHTBITS,
+        parity=serial.PARITY_NONE,
+        stopbits=serial.STOPBITS_ONE,
+        timeout=RESPONSE_TIMEOUT if timeout is None else timeout
+    )
+
+
+class TeleshakeLink:
+    """Request/response on an open serial port (pyserial ``Serial`` or alike)."""
+
+    def __init__(self, port, response_timeout: float = None, retries: int = None,
+                 quiet_gap: float = None, name: str = None):
+        self.port = port
+        self.response_timeout = RESPONSE_TIMEOUT if response_timeout is None else response_timeout
+        self.retries = RETRIES if retries is None else retries
+        self.quiet_gap = QUIET_GAP if quiet_gap is None else quiet_gap
+        self.name = name or getattr(port, "port", None) or "serial"
+        self.frames = FrameBuffer()
+        self.last_latency = None
+
+    def _read(self, n: int, timeout: float) -> bytes:
+        # Blocking read: returns as soon as n bytes are there or the timeout passes.
+        self.port.timeout = max(timeout, 0.0)
+        data = self.port.read(n)
+        if data:
+            telemetry.count("serial.bytes_received", len(data), port=self.name)
+        return data
+
+    def send(self, frame) -> None:
+        """Write a telegram (``Frame`` or raw bytes) in a single call."""
+        raw = frame.to_bytes() if isinstance(frame, Frame) else bytes(frame)
+        self.port.write(raw)
+        telemetry.count("serial.bytes_sent", len(raw), port=self.name)
+
+    def read_frames(self, deadline: float, count: Optional[int] = 1,
+                    quiet_gap: float = None) -> List[Frame]:
+        """Read frames until ``count`` arrived (or, with ``count=None``, until the line is quiet).
+
+        Args:
+            deadline: ``time.monotonic()`` value after which reading stops
+            count: frames wanted; None collects everything until ``quiet_gap``
+            quiet_gap: silence that ends a ``count=None`` read
+        """
+        quiet_gap = self.quiet_gap if quiet_gap is None else quiet_gap
+        frames: List[Frame] = []
+        while count is None or len(frames) < count:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if count is None and frames:
+                remaining = min(remaining, quiet_gap)
+            missing = FRAME_LENGTH - len(self.frames.buffer) % FRAME_LENGTH
+            data = self._read(missing, remaining)
+            if not data:
+                if count is None and frames:
+                    break
+                continue
+            dropped = self.frames.dropped
+            frames += self.frames.feed(data)
+            if self.frames.dropped != dropped:
+                telemetry.count("serial.resync_bytes", self.frames.dropped - dropped, port=self.name)
+        return frames
+
+    def transact(self, address: int, command: int, data: Sequence[int] = (),
+                 init_mode: bool = False) -> Frame:
+        """Send one command and return the reply from ``address``.
+
+        Raises:
+            ResponseTimeout: no valid reply within the latency budget (after retries)
+        """
+        request = encode(address, command, data, init_mode)
+        tags = {"command": command_name(command), "port": self.name}
+        for attempt in range(self.retries + 1):
+            with telemetry.span("serial.command", **tags):
+                self.discard_input()
+                start = time.monotonic()
+                self.send(request)
+                deadline = start + self.response_timeout
+                while True:
+                    frames = self.read_frames(deadline, 1)
+                    if not frames:
+                        break
+                    reply = frames[0]
+                    if address == BROADCAST or reply.address == address:
+                        self.last_latency = time.monotonic() - start
+                        return reply
+            telemetry.count("serial.retries", 1, **tags)
+        raise ResponseTimeout(f"No reply to {command_name(command)} from address {address} on "
+                              f"{self.name} within {self.response_timeout:.3f}s")
+
+    def broadcast(self, command: int, data: Sequence[int] = (), init_mode: bool = False,
+                  timeout: float = None, expected: Optional[int] = None) -> List[Frame]:
+        """Send to address 15 and collect the replies.
+
+        Args:
+            expected: number of devices on the bus; reading stops once that many
+                replied (default: read until the line goes quiet)
+        """
+        request = encode(BROADCAST, command, data, init_mode)
+        with telemetry.span("serial.command", command=command_name(command), port=self.name):
+            self.discard_input()
+            start = time.monotonic()
+            self.send(request)
+            frames = self.read_frames(start + (self.response_timeout if timeout is None else timeout),
+                                      expected or None)
+        self.last_latency = time.monotonic() - start if frames else None
+        return frames
+
+    def discard_input(self) -> None:
+        """Drop stale bytes so the next frame read belongs to the next request."""
+        reset = getattr(self.port, "reset_input_buffer", None)
+        if reset is not None:
+            reset()
+        self.frames.buffer.clear()